@@ -1,21 +1,35 @@
-from typing import Callable, List, Optional
-
-from google.genai import types
+import asyncio
+import inspect
+import json
+import logging
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional
 
 from utils.llm import LLM
+from utils.projection import TokenBudget
+from utils.request_context import memoized, prefetched, time_left
 
 
 class Agent:
     """
     Base class for agents using Google Gemini with automatic function calling (Python only).
     Pass Python functions directly as tools; the SDK will handle invocation, execution, and response composition.
+
+    With parallel_tool_calls the agent runs the function-calling loop itself instead: every function call of a
+    model turn is executed concurrently, async tools on the event loop and sync tools on a thread pool, and all
+    results are returned to the model in a single follow-up turn.
     """
 
     def __init__(
             self,
-            llm: LLM = LLM(),
+            llm: LLM,
             tools: Optional[List[Callable]] = None,
             automatic_function_calling: bool = True,
+            call_site: Optional[str] = None,
+            parallel_tool_calls: bool = False,
+            tool_timeout: float = 20.0,
+            max_turns: int = 5,
+            tool_token_budget: Optional[int] = 8000,
     ):
         """
         Initialize the Agent.
@@ -24,22 +38,68 @@ class Agent:
             llm: An instance of the LLM wrapper for Gemini.
             tools: A list of Python functions (with type hints and docstrings) to expose to the model.
             automatic_function_calling: Whether the SDK should auto-execute those functions.
+            call_site: Name used to select the LLM cache TTL for this agent's responses.
+            parallel_tool_calls: Run the function-calling loop here, executing each turn's calls concurrently.
+            tool_timeout: Seconds a single tool call may take in the parallel loop.
+            max_turns: Maximum model turns requesting tools in the parallel loop before an answer is forced.
+            tool_token_budget: Estimated tokens of tool results passed to the model per invocation in the parallel
+                loop, results are projected to the fields prompts use and shrunk to fit. None for no limit.
         """
         self.llm = llm
-        self.client = llm.client
         self.model_name = llm.model_name
         self.tools = tools or []
+        self.call_site = call_site
+        self.automatic_function_calling = automatic_function_calling and not parallel_tool_calls
+        self.parallel_tool_calls = parallel_tool_calls
+        self.tool_timeout = tool_timeout
+        self.max_turns = max_turns
+        self.tool_token_budget = tool_token_budget
+        self._tool_map: Dict[str, Callable] = {tool.__name__: tool for tool in self.tools}
+        self._config = None
+        self._final_config = None
+        self.logger = logging.getLogger(__name__)
 
-        # Configure automatic function calling
-        func_call_config = types.AutomaticFunctionCallingConfig(
-            disable=not automatic_function_calling
-        )
-        self.config = types.GenerateContentConfig(
-            tools=self.tools,
-            automatic_function_calling=func_call_config,
-        )
+    @property
+    def client(self):
+        return self.llm.client
+
+    @property
+    def config(self):
+        """Generation config with the tool declarations, built on first use to keep the Gemini SDK out of startup"""
+        if self._config is None:
+            from google.genai import types
+
+            # Configure automatic function calling
+            func_call_config = types.AutomaticFunctionCallingConfig(
+                disable=not self.automatic_function_calling
+            )
+            self._config = types.GenerateContentConfig(
+                tools=self.tools,
+                automatic_function_calling=func_call_config,
+            )
+        return self._config
+
+    @property
+    def final_config(self):
+        """Generation config that forbids further function calls, used once max_turns is reached"""
+        if self._final_config is None:
+            from google.genai import types
 
-    async def invoke(self, prompt: str, system: Optional[str] = None) -> str:
+            self._final_config = self.config.model_copy(update={
+                "tool_config": types.ToolConfig(
+                    function_calling_config=types.FunctionCallingConfig(mode=types.FunctionCallingConfigMode.NONE)
+                )
+            })
+        return self._final_config
+
+    async def invoke(
+            self,
+            prompt: str,
+            system: Optional[str] = None,
+            use_cache: bool = True,
+            budget: Optional[TokenBudget] = None,
+            call_site: Optional[str] = None,
+    ) -> str:
         """
         Execute the agent: send a user prompt and return the final text response.
         The SDK will detect and invoke any function calls as needed.
@@ -47,18 +107,233 @@ class Agent:
         Args:
             prompt: The user prompts to the agent.
             system: Optional system instruction.
+            use_cache: Set to False to bypass the LLM cache when freshness matters.
+            budget: Token budget of this invocation, already charged with the prefetched data of the prompt.
+            call_site: Overrides the agent's call site, e.g. to run background work at a lower Gemini priority.
 
         Returns:
             The final text response from the model, with any tool results incorporated.
         """
+        contents = self._contents(prompt, system)
+        call_site = call_site or self.call_site
+
+        async def request(model: str) -> str:
+            response = await self.client.aio.models.generate_content(
+                model=model,
+                contents=contents,
+                config=self.config,
+            )
+            return response.text or ""
+
+        async def compute() -> str:
+            if self.parallel_tool_calls and self.tools:
+                return await self._run_tool_loop(contents, budget, call_site)
+            return await self.llm.call(call_site, request)
+
+        return await self.llm.cached(call_site, use_cache, ("agent", *self._key_parts(prompt, system)), compute)
+
+    async def stream(
+            self,
+            prompt: str,
+            system: Optional[str] = None,
+            use_cache: bool = True,
+            budget: Optional[TokenBudget] = None,
+    ) -> AsyncGenerator[str, None]:
+        """
+        Execute the agent like invoke, yielding the final answer in chunks as the model generates it.
+        The text of a tool loop turn is yielded once the turn turns out to call no tools, so preambles of tool
+        calling turns never reach the client; the forced last turn cannot call tools and streams as generated.
+        With SDK automatic function calling the answer arrives as a single chunk.
+
+        Args:
+            prompt: The user prompts to the agent.
+            system: Optional system instruction.
+            use_cache: Set to False to bypass the LLM cache when freshness matters.
+            budget: Token budget of this invocation, already charged with the prefetched data of the prompt.
+
+        Yields:
+            Chunks of the final text response.
+        """
+        contents = self._contents(prompt, system)
+
+        async def produce() -> AsyncGenerator[str, None]:
+            if self.tools and not self.parallel_tool_calls:
+                # The base implementation, subclasses override invoke with signatures of their own
+                yield await Agent.invoke(self, prompt, system, use_cache=False)
+                return
+            async with aclosing(self._stream_tool_loop(contents, budget)) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+
+        async with aclosing(self.llm.cached_stream(
+                self.call_site,
+                use_cache,
+                ("agent_stream", *self._key_parts(prompt, system)),
+                produce,
+        )) as chunks:
+            async for chunk in chunks:
+                yield chunk
+
+    def _contents(self, prompt: str, system: Optional[str]) -> List[Any]:
+        from google.genai import types
+
         contents = []
         if system:
             contents.append(types.Content(role="model", parts=[types.Part(text=system)]))
         contents.append(types.Content(role="user", parts=[types.Part(text=prompt)]))
+        return contents
+
+    def _key_parts(self, prompt: str, system: Optional[str]) -> tuple:
+        """Everything that determines this agent's answer, for the LLM cache"""
+        return self.model_name, system, prompt, [tool.__name__ for tool in self.tools]
+
+    def token_budget(self) -> TokenBudget:
+        """A fresh budget for the tool results of one invocation, prefetched ones included"""
+        return TokenBudget(self.tool_token_budget)
+
+    async def prefetched_data(self, budget: Optional[TokenBudget] = None) -> str:
+        """
+        Prompt section with the results of this agent's tools prefetched for the current request, so the model
+        can skip calling them.
+
+        Args:
+            budget: Budget of the invocation the prompt is for, so prefetched and called tools share one cap
 
-        response = self.client.models.generate_content(
-            model=self.model_name,
-            contents=contents,
-            config=self.config,
+        Returns:
+            The section, or an empty string when nothing was prefetched
+        """
+        results = await prefetched(self._tool_map)
+        if not results:
+            return ""
+        budget = budget or self.token_budget()
+        lines = [
+            f"{tool}({', '.join(f'{k}={v!r}' for k, v in args.items())}) returned:\n"
+            f"{json.dumps(budget.fit(tool, result), default=str)}"
+            for tool, args, result in results
+        ]
+        return (
+            "\n\nThe following data has already been retrieved for you. Use it directly and do NOT call these "
+            "tools again with the same arguments:\n\n" + "\n\n".join(lines)
         )
+
+    async def _run_tool_loop(
+            self,
+            contents: List[Any],
+            budget: Optional[TokenBudget] = None,
+            call_site: Optional[str] = None,
+    ) -> str:
+        """
+        Alternate model turns and concurrent tool execution until the model answers in text.
+
+        Each model turn goes through the LLM call policy on its own, so tool execution never holds a
+        Gemini concurrency slot.
+        """
+        contents = list(contents)
+        budget = budget or self.token_budget()
+        for turn in range(self.max_turns + 1):
+            config = self.config if turn < self.max_turns else self.final_config
+
+            async def request(model: str):
+                return await self.client.aio.models.generate_content(
+                    model=model,
+                    contents=contents,
+                    config=config,
+                )
+
+            response = await self.llm.call(call_site or self.call_site, request)
+            calls = response.function_calls
+            if not calls:
+                return response.text or ""
+
+            contents.append(response.candidates[0].content)
+            contents.append(await self._tool_responses(calls, budget))
+
         return response.text or ""
+
+    async def _stream_tool_loop(
+            self,
+            contents: List[Any],
+            budget: Optional[TokenBudget] = None,
+    ) -> AsyncGenerator[str, None]:
+        """Streaming counterpart of _run_tool_loop, yielding the text of the turn answering without tools"""
+        from google.genai import types
+
+        contents = list(contents)
+        budget = budget or self.token_budget()
+        for turn in range(self.max_turns + 1):
+            final = turn == self.max_turns
+            config = self.config if not final else self.final_config
+
+            async def open_stream(model: str):
+                return await self.client.aio.models.generate_content_stream(
+                    model=model,
+                    contents=contents,
+                    config=config,
+                )
+
+            calls, parts, texts = [], [], []
+            # Holds a Gemini concurrency slot until the turn is fully streamed, not during tool execution
+            async with aclosing(self.llm.call_stream(self.call_site, open_stream)) as chunks:
+                async for chunk in chunks:
+                    content = chunk.candidates[0].content if chunk.candidates else None
+                    for part in (content.parts if content else None) or []:
+                        parts.append(part)
+                        if part.function_call:
+                            calls.append(part.function_call)
+                        elif part.text and not part.thought:
+                            if final:
+                                yield part.text
+                            else:
+                                # Held back until the turn is known to be the answer rather than a tool call
+                                texts.append(part.text)
+
+            if not calls:
+                for text in texts:
+                    yield text
+                return
+            contents.append(types.Content(role="model", parts=parts))
+            contents.append(await self._tool_responses(calls, budget))
+
+    async def _tool_responses(self, calls: List[Any], budget: TokenBudget) -> Any:
+        """Execute a turn's function calls concurrently, returning the content answering them"""
+        from google.genai import types
+
+        results = await asyncio.gather(*(self._execute_tool(call.name, call.args or {}) for call in calls))
+        # Charged in call order once all are done, so the budget is spent deterministically
+        results = [
+            result if "error" in result and len(result) == 1 else budget.fit(call.name, result)
+            for call, result in zip(calls, results)
+        ]
+        return types.Content(role="user", parts=[
+            types.Part.from_function_response(name=call.name, response=result)
+            for call, result in zip(calls, results)
+        ])
+
+    async def _execute_tool(self, name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run one tool call with the tool timeout, bounded by the request deadline, returning errors to the model
+        instead of raising.
+        Results are memoized for the current request, so agents asking for the same data share one call.
+        """
+        tool = self._tool_map.get(name)
+        if tool is None:
+            return {"error": f"Unknown tool {name}"}
+
+        def call():
+            if inspect.iscoroutinefunction(tool):
+                return tool(**args)
+            # Blocking tools run on the default thread pool so calls of one turn overlap
+            return asyncio.to_thread(tool, **args)
+
+        # Never outlive the request's deadline
+        timeout = time_left(self.tool_timeout)
+        try:
+            result = await asyncio.wait_for(memoized(name, args, call), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"Tool {name}({args}) timed out after {timeout:.1f}s")
+            return {"error": f"{name} timed out after {timeout:.1f} seconds"}
+        except Exception as e:
+            self.logger.warning(f"Tool {name}({args}) failed: {e}")
+            return {"error": f"{name} failed: {e}"}
+
+        return result if isinstance(result, dict) else {"result": result}
@@ -1,11 +1,11 @@
 import asyncio
-from typing import Dict, Optional
-
-import requests
+from typing import AsyncGenerator, Dict, Optional, Tuple
 
 from agents.base.agent import Agent
+from finance_query import FinanceQuery
 from tavily_search import TavilySearch
 from utils.llm import LLM
+from utils.projection import TokenBudget
 
 
 class FundamentalsAgent(Agent):
@@ -16,37 +16,23 @@ class FundamentalsAgent(Agent):
 
     def __init__(
             self,
-            llm: LLM = LLM(),
-            tavily: TavilySearch = TavilySearch(),
+            llm: LLM,
+            tavily: TavilySearch,
+            finance: FinanceQuery,
             automatic_function_calling: bool = True,
+            parallel_tool_calls: bool = True,
     ):
         """
         Initialize the FundamentalsAgent with quote and technical data tools.
         """
 
-        def get_quotes(symbol: str) -> Dict:
+        async def get_quotes(symbol: str) -> Dict:
             """Fetch detailed quote data for given stock symbol."""
-            response = requests.get(
-                "https://finance-query.onrender.com/v1/quotes",
-                params={"symbols": symbol}
-            )
-            response.raise_for_status()
-            data = response.json()
-            if isinstance(data, list):
-                return {"quotes": data}
-            return data
+            return await finance.get_quotes(symbol)
 
-        def get_technicals(symbol: str) -> Dict:
+        async def get_technicals(symbol: str) -> Dict:
             """Fetch technical indicators for a given symbol."""
-            response = requests.get(
-                "https://finance-query.onrender.com/v1/indicators",
-                params={"symbol": symbol, "interval": "1d"}
-            )
-            response.raise_for_status()
-            data = response.json()
-            if isinstance(data, list):
-                return {"indicators": data}
-            return data
+            return await finance.get_technicals(symbol)
 
         def get_search(query: str) -> Dict:
             """ Perform a search of information that is not available in the quotes or technicals. """
@@ -62,6 +48,8 @@ class FundamentalsAgent(Agent):
             llm=llm,
             tools=[get_quotes, get_technicals, get_search],
             automatic_function_calling=automatic_function_calling,
+            call_site="fundamentals",
+            parallel_tool_calls=parallel_tool_calls,
         )
 
     async def analyze(
@@ -81,6 +69,29 @@ class FundamentalsAgent(Agent):
         Returns:
             Detailed answer to the question based on fundamental and technical data.
         """
+        budget = self.token_budget()
+        prompt, system_instruction = await self._prompts(ticker, question, system, budget)
+        return await super().invoke(prompt=prompt, system=system_instruction, budget=budget)
+
+    async def analyze_stream(
+            self,
+            ticker: str,
+            question: str,
+            system: Optional[str] = None,
+    ) -> AsyncGenerator[str, None]:
+        """Stream version of analyze that yields the answer as it's generated."""
+        budget = self.token_budget()
+        prompt, system_instruction = await self._prompts(ticker, question, system, budget)
+        async for chunk in super().stream(prompt=prompt, system=system_instruction, budget=budget):
+            yield chunk
+
+    async def _prompts(
+            self,
+            ticker: str,
+            question: str,
+            system: Optional[str],
+            budget: TokenBudget,
+    ) -> Tuple[str, str]:
         prompt = (
             f"I need information about the stock {ticker}. Here's my question:\n\n{question}\n\n"
             f"To answer this question, first use the get_quotes function for {ticker} to retrieve current "
@@ -91,7 +102,7 @@ class FundamentalsAgent(Agent):
             f"If the question can't be answered with the available data, use the get_search function."
             f"Always try to provide a data-driven answer based on the metrics retrieved."
             f"Do NOT try to continue the conversation or ask follow-up questions."
-        )
+        ) + await self.prefetched_data(budget)
 
         # Use system prompt to focus on objective financial analysis
         system_instruction = system or (
@@ -101,11 +112,11 @@ class FundamentalsAgent(Agent):
             "Use precise numbers and cite specific metrics when answering questions."
         )
 
-        return await super().invoke(prompt=prompt, system=system_instruction)
+        return prompt, system_instruction
 
 
 if __name__ == "__main__":
-    agent = FundamentalsAgent()
+    agent = FundamentalsAgent(llm=LLM(), tavily=TavilySearch(), finance=FinanceQuery())
 
     # Example questions
     questions = [
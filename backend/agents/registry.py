@@ -0,0 +1,59 @@
+import os
+
+from agents.fundamentals_agent import FundamentalsAgent
+from agents.search_agent import SearchAgent
+from agents.sentiment_agent import SentimentAgent
+from agents.supervisor_agent import SupervisorAgent
+from agents.trading_strategy_agent import TradingStrategyAgent
+from finance_query import FinanceQuery
+from rds import RedisHandler
+from tavily_search import TavilySearch
+from utils.llm import LLM
+from utils.router import LocalRouter
+from utils.sessions import SessionStore
+from utils.tickers import Popularity, TickerValidator
+
+
+class AgentRegistry:
+    """
+    Every agent of the app, built once in the lifespan hook and shared by all requests.
+
+    Clients are created by the lifespan hook and passed in explicitly, so each one exists once per process:
+    the Gemini LLM, the Tavily and finance-query HTTP clients and the Redis handler, which the app also injects
+    into endpoints.
+    """
+
+    def __init__(self, llm: LLM, rds: RedisHandler, tavily: TavilySearch, finance: FinanceQuery):
+        """
+        Build the agents.
+
+        Args:
+            llm: Gemini LLM shared by every agent
+            rds: Redis handler used by agents reading stored posts
+            tavily: Tavily client used by agents searching the web
+            finance: finance-query client shared by every agent tool
+        """
+        self.llm = llm
+        self.rds = rds
+        self.tavily = tavily
+        self.finance = finance
+        # Shared so every endpoint and agent benefits from the same negative cache and popularity counts
+        self.popularity = Popularity()
+        self.tickers = TickerValidator(finance.get_quotes, popularity=self.popularity)
+
+        self.fundamentals = FundamentalsAgent(llm=llm, tavily=tavily, finance=finance)
+        self.sentiment = SentimentAgent(llm=llm, finance=finance, tickers=self.tickers)
+        self.trading = TradingStrategyAgent(rds=rds, llm=llm, finance=finance)
+        self.search = SearchAgent(llm=llm, tavily=tavily, finance=finance)
+        self.supervisor = SupervisorAgent(
+            llm=llm,
+            fundamentals=self.fundamentals,
+            sentiment=self.sentiment,
+            trading=self.trading,
+            search=self.search,
+            finance=finance,
+            tickers=self.tickers,
+            router=LocalRouter() if os.getenv("LOCAL_ROUTING", "true").lower() != "false" else None,
+            summarize_single_agent=os.getenv("SUMMARIZE_SINGLE_AGENT", "false").lower() == "true",
+            sessions=SessionStore(rds, llm),
+        )
@@ -1,9 +1,10 @@
 import asyncio
-from typing import List, Dict, Optional
+from typing import AsyncGenerator, Dict, Optional
 from agents.base.agent import Agent
+from finance_query import FinanceQuery
 from tavily_search import TavilySearch
 from utils.llm import LLM
-import requests
+from utils.tickers import TickerUniverse
 
 class SearchAgent(Agent):
     """
@@ -12,18 +13,23 @@ class SearchAgent(Agent):
 
     def __init__(
             self,
-            llm: LLM = LLM(),
-            tavily: TavilySearch = TavilySearch(),
+            llm: LLM,
+            tavily: TavilySearch,
+            finance: FinanceQuery,
             automatic_function_calling: bool = True,
+            parallel_tool_calls: bool = True,
+            universe: Optional[TickerUniverse] = None,
+            max_symbols: int = 5,
     ):
         """
-        Initialize the GoodStocksAgent with no tools.
+        Initialize the SearchAgent with its web search and finance-query tools.
+
+        Args:
+            universe: Known ticker symbols, the bundled list by default
+            max_symbols: Most mentioned symbols of the search results the agent is asked to analyze
         """
-        super().__init__(
-            llm=llm,
-            tools=None,
-            automatic_function_calling=automatic_function_calling,
-        )
+        self.universe = universe or TickerUniverse.default()
+        self.max_symbols = max_symbols
 
         # Find information regarding good stocks to buy
         def get_search(query: str) -> Dict:
@@ -36,46 +42,24 @@ class SearchAgent(Agent):
                 max_results=3
             )
 
-        def get_news(symbol: str) -> Dict:
+        async def get_news(symbol: str) -> Dict:
             """Fetch the latest news for a given stock symbol."""
-            response = requests.get(
-                "https://finance-query.onrender.com/v1/news",
-                params={"symbol": symbol}
-            )
-            response.raise_for_status()
-            data = response.json()
-            if isinstance(data, list):
-                return {"news": data}
-            return data
+            return await finance.get_news(symbol)
 
-        def get_technicals(symbol: str) -> Dict:
+        async def get_technicals(symbol: str) -> Dict:
             """Fetch technical indicators for a given symbol."""
-            response = requests.get(
-                "https://finance-query.onrender.com/v1/indicators",
-                params={"symbol": symbol, "interval": "1d"}
-            )
-            response.raise_for_status()
-            data = response.json()
-            if isinstance(data, list):
-                return {"indicators": data}
-            return data
+            return await finance.get_technicals(symbol)
 
-        def get_quotes(symbol: str) -> Dict:
+        async def get_quotes(symbol: str) -> Dict:
             """Fetch detailed quote data for given stock symbol."""
-            response = requests.get(
-                "https://finance-query.onrender.com/v1/quotes",
-                params={"symbols": symbol}
-            )
-            response.raise_for_status()
-            data = response.json()
-            if isinstance(data, list):
-                return {"quotes": data}
-            return data
+            return await finance.get_quotes(symbol)
 
         super().__init__(
             llm=llm,
             tools=[get_search, get_quotes, get_technicals, get_news],
             automatic_function_calling=automatic_function_calling,
+            call_site="search",
+            parallel_tool_calls=parallel_tool_calls,
         )
 
     async def recommend(self, system: Optional[str] = None) -> str:
@@ -87,20 +71,33 @@ class SearchAgent(Agent):
         Returns:
             Recommendations with reasoning.
         """
+        prompt = await self._prompt()
+        if prompt is None:
+            return "No trending stocks were found. Please try again later."
+
+        return await super().invoke(prompt=prompt, system=self._system(system))
+
+    async def recommend_stream(self, system: Optional[str] = None) -> AsyncGenerator[str, None]:
+        """Stream version of recommend that yields the recommendations as they're generated."""
+        prompt = await self._prompt()
+        if prompt is None:
+            yield "No trending stocks were found. Please try again later."
+            return
+
+        async for chunk in super().stream(prompt=prompt, system=self._system(system)):
+            yield chunk
+
+    async def _prompt(self) -> Optional[str]:
         # Fetch trending or popular stocks using the get_search method
-        search_results = self.tools[0]("What are some good stocks to buy?")
-        symbols = []
-        for result in search_results.get("results", []):
-            # Extract stock symbols from the content field
-            if "content" in result:
-                symbols.extend(
-                    [word.strip() for word in result["content"].split() if word.isupper() and len(word) <= 5]
-                )
+        search_results = await asyncio.to_thread(self.tools[0], "What are some good stocks to buy?")
+        # Only known symbols, most mentioned first: every symbol costs the agent several tool calls
+        contents = [result["content"] for result in search_results.get("results", []) if "content" in result]
+        symbols = self.universe.rank(contents, limit=self.max_symbols)
 
         if not symbols:
-            return "No trending stocks were found. Please try again later."
+            return None
 
-        prompt = (
+        return (
             f"Analyze the following stock symbols: {', '.join(symbols)}. "
             "For each stock, use the tools get_quotes, get_technicals, and get_news to gather data. "
             "Based on the data, recommend stocks that are good to buy. "
@@ -108,16 +105,16 @@ class SearchAgent(Agent):
             "Focus on actionable insights and avoid disclaimers or generic responses."
         )
 
-        system_instruction = system or (
+    @staticmethod
+    def _system(system: Optional[str]) -> str:
+        return system or (
             "You are a financial advisor specializing in stock recommendations. "
             "Provide clear, data-driven recommendations based on stock fundamentals, technical indicators, and sentiment. "
             "Focus on actionable insights and avoid unnecessary details."
         )
 
-        return await super().invoke(prompt=prompt, system=system_instruction)
-
 if __name__ == "__main__":
-    agent = SearchAgent()
+    agent = SearchAgent(llm=LLM(), tavily=TavilySearch(), finance=FinanceQuery())
     #recommendations = asyncio.run(agent.recommend(symbols=["AAPL", "MSFT", "GOOGL"]))
     recommendations = asyncio.run(agent.recommend())
 
@@ -1,10 +1,15 @@
 import asyncio
-from typing import Optional, List, Dict
-
-import requests
+from typing import Optional, List, Dict, Tuple
 
 from agents.base.agent import Agent
+from finance_query import FinanceQuery
+from models.sentiment import SentimentResponse, SentimentBatch, BatchSentimentResponse
+from utils import metrics
+from utils.cache import LLMCache
 from utils.llm import LLM
+from utils.tickers import TickerValidator
+from utils.tokens import estimate_tokens
+from utils.request_context import memoized
 
 
 class SentimentAgent(Agent):
@@ -12,18 +17,31 @@ class SentimentAgent(Agent):
     Agent that embeds fetched news headlines into the prompt and determines market sentiment.
     """
 
+    BATCH_SYSTEM = "You are a financial news analyst scoring the market sentiment of stocks from their headlines."
+
     def __init__(
             self,
-            llm: LLM = LLM(),
+            llm: LLM,
+            finance: FinanceQuery,
+            tickers: Optional[TickerValidator] = None,
+            max_age: int = 30 * 60,
     ):
         """
         Initialize the SentimentAgent without exposing get_news as a tool.
+
+        Args:
+            tickers: Validates tickers before their news is fetched, any ticker is scored without it
+            max_age: Seconds a sentiment score is reused while the headlines are unchanged
         """
+        self.finance = finance
+        self.tickers = tickers
+        self.max_age = max_age
         # No tools needed; news will be fetched manually
         super().__init__(
             llm=llm,
             tools=None,
             automatic_function_calling=False,
+            call_site="sentiment",
         )
 
     async def invoke(
@@ -41,25 +59,212 @@ class SentimentAgent(Agent):
         Returns:
             Text summary indicating if market sentiment is positive, negative, or neutral.
         """
-        response = requests.get(
-            "https://finance-query.onrender.com/v1/news",
-            params={"symbol": ticker}
+        headlines = await self._headlines(ticker)
+        return await super().invoke(prompt=self._prompt(ticker, headlines), system=system)
+
+    async def score(
+            self,
+            ticker: str,
+            system: Optional[str] = None,
+            call_site: Optional[str] = None,
+    ) -> SentimentResponse:
+        """
+        Sentiment for a stock symbol, cached while its headlines are unchanged.
+
+        Results are cached under a fingerprint of the headlines embedded in the prompt, so the LLM only scores
+        the ticker again once its news changes, or once the cached result is max_age seconds old.
+
+        Args:
+            ticker: Stock symbol to analyze (e.g., 'AAPL').
+            system: Optional system-level instruction.
+            call_site: Overrides the "sentiment" call site, e.g. "warmer" for background refreshes.
+
+        Returns:
+            The parsed sentiment score and key points.
+
+        Raises:
+            InvalidTickerError: If the ticker is malformed or unknown
+            ValueError: If the model does not answer with a valid sentiment JSON object
+        """
+        ticker = await self._validate(ticker)
+        headlines = await self._headlines(ticker)
+        key = self._cache_key(ticker, system, headlines)
+        cached = await self._cached(key)
+        if cached is not None:
+            return cached
+
+        # The fingerprint cache replaces the prompt cache here
+        result = await super().invoke(
+            prompt=self._prompt(ticker, headlines),
+            system=system,
+            use_cache=False,
+            call_site=call_site,
         )
-        response.raise_for_status()
-        data = response.json()
-        articles: List[Dict] = data if isinstance(data, list) else data.get("news", [])
+        sentiment = self.parse(result)
+        await self._store(key, sentiment)
+        return sentiment
+
+    async def score_batch(
+            self,
+            tickers: List[str],
+            system: Optional[str] = None,
+            max_prompt_tokens: int = 4000,
+            max_batch_size: int = 10,
+    ) -> BatchSentimentResponse:
+        """
+        Sentiment for a watchlist of stock symbols, scoring several of them per LLM call.
+
+        News is fetched for every ticker at once. Tickers with a cached score for their current headlines are
+        served from the cache like in score; the rest are packed into structured-output prompts of at most
+        max_prompt_tokens of headlines each. Tickers missing from a batch answer, or whose batch failed, are
+        scored on their own.
+
+        Args:
+            tickers: Stock symbols to analyze, duplicates are scored once
+            system: Optional system-level instruction.
+            max_prompt_tokens: Estimated tokens of headlines packed into one prompt
+            max_batch_size: Maximum tickers per prompt
+
+        Returns:
+            The sentiment of each ticker, and the reason for each ticker that could not be scored.
+        """
+        response = BatchSentimentResponse(results={})
+        validated = await asyncio.gather(*(self._validate(ticker, track=True) for ticker in tickers), return_exceptions=True)
+        for ticker, result in zip(tickers, validated):
+            if isinstance(result, BaseException):
+                response.errors[ticker] = str(result)
+        tickers = list(dict.fromkeys(result for result in validated if isinstance(result, str)))
+
+        fetched = await asyncio.gather(*(self._headlines(ticker) for ticker in tickers), return_exceptions=True)
+        pending: List[Tuple[str, List[Dict[str, str]]]] = []
+        for ticker, headlines in zip(tickers, fetched):
+            if isinstance(headlines, BaseException):
+                response.errors[ticker] = f"Could not fetch news: {headlines}"
+            elif not headlines:
+                response.errors[ticker] = "No recent news"
+            else:
+                cached = await self._cached(self._cache_key(ticker, system, headlines))
+                if cached is not None:
+                    response.results[ticker] = cached
+                else:
+                    pending.append((ticker, headlines))
+
+        batches = self._batches(pending, max_prompt_tokens, max_batch_size)
+        scored = await asyncio.gather(*(self._score_batch(batch, system) for batch in batches))
+        missing = []
+        for batch, results in zip(batches, scored):
+            for ticker, headlines in batch:
+                if ticker in results:
+                    response.results[ticker] = results[ticker]
+                    await self._store(self._cache_key(ticker, system, headlines), results[ticker])
+                else:
+                    missing.append(ticker)
+
+        if missing:
+            metrics.counter("sentiment.batch.fallbacks").inc(len(missing))
+            fallbacks = await asyncio.gather(*(self.score(ticker, system) for ticker in missing), return_exceptions=True)
+            for ticker, result in zip(missing, fallbacks):
+                if isinstance(result, BaseException):
+                    response.errors[ticker] = str(result) or type(result).__name__
+                else:
+                    response.results[ticker] = result
+        return response
+
+    async def _score_batch(
+            self,
+            batch: List[Tuple[str, List[Dict[str, str]]]],
+            system: Optional[str],
+    ) -> Dict[str, SentimentResponse]:
+        """Score the tickers of one batch in a single call; the tickers the answer covers, none if it failed"""
+        metrics.histogram("sentiment.batch.size", (1, 2, 5, 10, 25)).observe(len(batch))
+        try:
+            answer = await self.llm.generate_structured(
+                system=system or self.BATCH_SYSTEM,
+                prompt=self._batch_prompt(batch),
+                output=SentimentBatch,
+                call_site="sentiment_batch",
+                use_cache=False,
+            )
+        except Exception as e:
+            self.logger.warning(f"Sentiment batch of {len(batch)} tickers failed: {e}")
+            return {}
+
+        expected = {ticker for ticker, _ in batch}
+        return {
+            item.ticker.strip().upper(): SentimentResponse(
+                sentiment_score=item.sentiment_score,
+                key_points=item.key_points,
+            )
+            for item in answer.results
+            if item.ticker.strip().upper() in expected
+        }
+
+    @staticmethod
+    def _batches(
+            pending: List[Tuple[str, List[Dict[str, str]]]],
+            max_prompt_tokens: int,
+            max_batch_size: int,
+    ) -> List[List[Tuple[str, List[Dict[str, str]]]]]:
+        """Pack tickers into batches of at most max_prompt_tokens of headlines and max_batch_size tickers"""
+        batches: List[List[Tuple[str, List[Dict[str, str]]]]] = []
+        tokens = 0
+        for ticker, headlines in pending:
+            size = estimate_tokens(SentimentAgent._headlines_text(headlines))
+            if not batches or len(batches[-1]) >= max_batch_size or tokens + size > max_prompt_tokens:
+                batches.append([])
+                tokens = 0
+            batches[-1].append((ticker, headlines))
+            tokens += size
+        return batches
+
+    async def _validate(self, ticker: str, track: bool = False) -> str:
+        """The normalized ticker, rejecting unknown ones when a validator is set"""
+        if self.tickers is None:
+            return ticker.strip().upper()
+        # Endpoints already count single tickers, and the cache warmer must not count its own refreshes
+        return await self.tickers.validate(ticker, track=track)
+
+    def _cache_key(self, ticker: str, system: Optional[str], headlines: List[Dict[str, str]]) -> str:
+        return LLMCache.make_key("sentiment", ticker.upper(), system, self.model_name, headlines)
+
+    async def _cached(self, key: str) -> Optional[SentimentResponse]:
+        """The score cached under this fingerprint key, if any"""
+        cache = self.llm.cache
+        if cache is None:
+            return None
+        cached = await cache.get(key)
+        if cached is None:
+            metrics.counter("sentiment.cache.misses").inc()
+            return None
+        metrics.counter("sentiment.cache.hits").inc()
+        return SentimentResponse.model_validate(cached)
+
+    async def _store(self, key: str, sentiment: SentimentResponse) -> None:
+        if self.llm.cache is not None:
+            await self.llm.cache.set(key, sentiment.model_dump(mode="json"), self.max_age)
+
+    async def _headlines(self, ticker: str) -> List[Dict[str, str]]:
+        """Title and link of up to 10 of the latest articles, as embedded in the prompt"""
+        # Shares the news fetched by other agents of the request, or prefetched by the supervisor
+        data = await memoized("get_news", {"symbol": ticker}, lambda: self.finance.get_news(ticker))
+        articles: List[Dict] = data.get("news", [])
 
         # Extract up to 10 titles with URLs
-        top_articles = articles[:10]
-        titles_text = "\n".join(
-            f"- {article.get('title')} ({article.get('link')})"
-            for article in top_articles
+        return [
+            {"title": article["title"], "link": article["link"]}
+            for article in articles[:10]
             if article.get('title') and article.get('link')
-        )
+        ]
+
+    @staticmethod
+    def _headlines_text(headlines: List[Dict[str, str]]) -> str:
+        return "\n".join(f"- {article['title']} ({article['link']})" for article in headlines)
 
-        prompt = (
+    @staticmethod
+    def _prompt(ticker: str, headlines: List[Dict[str, str]]) -> str:
+        return (
             f"Current ticker: {ticker}. Here are the latest news headlines with URLs:\n"
-            f"{titles_text}\n\n"
+            f"{SentimentAgent._headlines_text(headlines)}\n\n"
             "Based only on these headlines and URLs, please:\n"
             "1. Provide a sentiment score between 0 (very negative) and 1 (very positive).\n"
             "2. List 3 key points, each referencing the relevant article URL.\n"
@@ -73,10 +278,61 @@ class SentimentAgent(Agent):
             "Return only the JSON."
         )
 
-        return await super().invoke(prompt=prompt, system=system)
+    @staticmethod
+    def _batch_prompt(batch: List[Tuple[str, List[Dict[str, str]]]]) -> str:
+        sections = "\n\n".join(
+            f"Ticker: {ticker}\n{SentimentAgent._headlines_text(headlines)}" for ticker, headlines in batch
+        )
+        return (
+            "Here are the latest news headlines with URLs for several tickers:\n\n"
+            f"{sections}\n\n"
+            "For each ticker, based only on its own headlines and URLs:\n"
+            "1. Provide a sentiment score between 0 (very negative) and 1 (very positive).\n"
+            "2. List 3 key points, each referencing the relevant article URL.\n"
+            "Return one result per ticker, with the ticker symbol exactly as given."
+        )
+
+    async def report(self, ticker: str, system: Optional[str] = None) -> str:
+        """
+        Sentiment for a stock symbol rendered as Markdown, for answering the user without a summary step.
+
+        Args:
+            ticker: Stock symbol to analyze (e.g., 'AAPL').
+            system: Optional system-level instruction.
+
+        Returns:
+            Markdown report of the sentiment score and key points.
+        """
+        try:
+            sentiment = await self.score(ticker=ticker, system=system)
+        except ValueError as e:
+            return f"Could not analyze the sentiment of {ticker}: {e}"
+
+        score = sentiment.sentiment_score
+        label = "Positive" if score >= 0.6 else "Negative" if score <= 0.4 else "Neutral"
+        lines = [f"## {ticker} News Sentiment: {label} ({score:.2f})", ""]
+        lines.extend(f"- {key_point.point} ([source]({key_point.url}))" for key_point in sentiment.key_points)
+        return "\n".join(lines)
+
+    @staticmethod
+    def parse(result: str) -> SentimentResponse:
+        """
+        Parse the JSON returned by invoke.
+
+        Raises:
+            ValueError: If the response is not a valid sentiment JSON object
+        """
+        # Remove markdown code block if present
+        result = result.strip()
+        if result.startswith("```json"):
+            result = result[7:].strip()
+        if result.endswith("```"):
+            result = result[:-3].strip()
+
+        return SentimentResponse.model_validate_json(result)
 
 
 if __name__ == "__main__":
-    agent = SentimentAgent()
+    agent = SentimentAgent(llm=LLM(), finance=FinanceQuery())
     summary = asyncio.run(agent.invoke(ticker="AAPL"))
     print(summary)
@@ -1,5 +1,8 @@
 import asyncio
-from typing import Dict, Literal, List, Optional, Any, AsyncGenerator
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Any, AsyncGenerator, AsyncIterator, Awaitable, Set, Tuple, Union
 
 from pydantic import BaseModel
 
@@ -7,18 +10,40 @@ from agents.fundamentals_agent import FundamentalsAgent
 from agents.search_agent import SearchAgent
 from agents.sentiment_agent import SentimentAgent
 from agents.trading_strategy_agent import TradingStrategyAgent
+from finance_query import FinanceQuery
 from models.chatrequest import ChatRequest
+from models.routing import RoutingDecision
+from models.session import ChatSession
+from utils import metrics
 from utils.llm import LLM
+from utils.request_context import RequestContext
+from utils.router import COMPANY_TICKERS, LocalRouter, log_decision
+from utils.sessions import SessionStore
+from utils.tickers import InvalidTickerError, TickerValidator, normalize_ticker
 
 
 class ChatResponse(BaseModel):
     response: str
 
 
-class RoutingDecision(BaseModel):
-    agents: List[Literal['fundamentals', 'sentiment', 'trading', 'search']]
-    ticker: Optional[str]
-    question: Optional[str]
+# Tools whose results each agent needs for the routed ticker, prefetched while routing when the request names one
+PREFETCH_NEEDS: Dict[str, Set[str]] = {
+    'fundamentals': {'get_quotes', 'get_technicals'},
+    'sentiment': {'get_news'},
+    'trading': {'get_quotes', 'get_technicals', 'get_news'},
+    'search': set(),
+}
+
+# Answer when the deadline passes before the answer could be produced
+TIMEOUT_MESSAGE = "This request did not finish in time, please try again."
+
+# Agents that have nothing to analyze without a valid ticker
+TICKER_AGENTS: Set[str] = {'fundamentals', 'sentiment', 'trading'}
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 
 class SupervisorAgent:
@@ -27,93 +52,353 @@ class SupervisorAgent:
     then invokes multiple agents concurrently and returns all their responses.
     """
 
-    def __init__(self, llm: LLM = LLM()):
+    def __init__(
+            self,
+            llm: LLM,
+            fundamentals: FundamentalsAgent,
+            sentiment: SentimentAgent,
+            trading: TradingStrategyAgent,
+            search: SearchAgent,
+            finance: FinanceQuery,
+            tickers: Optional[TickerValidator] = None,
+            router: Optional[LocalRouter] = None,
+            summarize_single_agent: bool = False,
+            summary_reserve: float = 10.0,
+            sessions: Optional[SessionStore] = None,
+    ):
+        """
+        Initialize the supervisor with the sub-agents it routes to.
+        Build it through AgentRegistry so the agents and their clients are created once.
+
+        Args:
+            tickers: Validates the tickers of requests before any agent works on them, none are checked without it
+            router: Decides obvious messages locally, the LLM routes the rest. Without it every message goes
+                through the LLM router.
+            summarize_single_agent: Also summarize requests routed to a single agent, instead of answering with
+                that agent's own output
+            summary_reserve: Seconds of a request's deadline kept for the summary, at most half of what is left
+                once routing is done
+            sessions: Store of server-side sessions, for requests with a session_id
+        """
         self.llm = llm
-        # Sub-agents share the same LLM
-        self.fundamentals = FundamentalsAgent(llm=self.llm)
-        self.sentiment = SentimentAgent(llm=self.llm)
-        self.trading = TradingStrategyAgent(llm=self.llm)
-        self.search = SearchAgent(llm=self.llm)
+        self.fundamentals = fundamentals
+        self.sentiment = sentiment
+        self.trading = trading
+        self.search = search
+        self.finance = finance
+        self.tickers = tickers
+        self.router = router
+        self.summarize_single_agent = summarize_single_agent
+        self.summary_reserve = summary_reserve
+        self.sessions = sessions
+        self.logger = logging.getLogger(__name__)
+
+    async def handle(self, request: ChatRequest, timeout: Optional[float] = None) -> ChatResponse:
+        full_conversation, session = await self._load_conversation(request)
+        response = await self._answer(request, full_conversation, timeout)
+        await self._remember(request, session, response)
+        return ChatResponse(response=response)
+
+    async def handle_stream(self, request: ChatRequest, timeout: Optional[float] = None) -> AsyncGenerator[str, Any]:
+        full_conversation, session = await self._load_conversation(request)
+        chunks = []
+        async for chunk in self._answer_stream(request, full_conversation, timeout):
+            chunks.append(chunk)
+            yield chunk
+        await self._remember(request, session, "".join(chunks))
 
-    async def handle(self, request: ChatRequest) -> ChatResponse:
+    async def handle_events(self, request: ChatRequest, timeout: Optional[float] = None) -> AsyncGenerator[str, Any]:
+        """
+        Stream the handling of a request as typed server-sent events, so clients can render progress before the
+        slowest agent finishes.
+
+        Events, in order: routing (the decision), agent_status (once per agent as it starts), agent_output (once
+        per agent as it completes, successful or not), summary (chunks of the final answer) and done. When a
+        single agent answers directly, its output streams as summary chunks before its agent_output.
+
+        Args:
+            request: The chat request containing message and history
+            timeout: Seconds the request may take; agents still running when their budget is spent are reported
+                with a timeout status and left out of the summary
+
+        Yields:
+            SSE-formatted events
+        """
+        full_conversation, session = await self._load_conversation(request)
+        summary = []
+        async for event, data in self._answer_events(request, full_conversation, timeout):
+            if event == "summary":
+                summary.append(data["text"])
+            elif event == "done":
+                await self._remember(request, session, "".join(summary))
+            yield sse_event(event, data)
+
+    async def _answer(self, request: ChatRequest, full_conversation: str, timeout: Optional[float]) -> str:
         # decide which agents to run and extract ticker/question
-        system_prompt = (
-            "You are a supervisor that routes user requests to specialized agents:\n"
-            "- fundamentals for core metrics and comparisons\n"
-            "- sentiment for news sentiment analysis\n"
-            "- trading for strategy recommendations\n"
-            "- search for recommending stocks to buy\n"
-            "Given the following user message and chat history, identify which agents should handle it, "
-            "and extract a ticker symbol if present, along with the core question. "
-            "Respond in JSON with keys: agents (list), ticker (string or null), question (string or null)."
-        )
-        if request.ticker:
-            system_prompt += f"\nFocus your analysis on ticker: {request.ticker}"
-        # Combine history and latest message
-        full_conversation = "".join(
-            f"{turn['role']}: {turn['content']}\n" for turn in request.history
-        ) + f"user: {request.message}"
-        # Use structured generation for routing
-        decision: RoutingDecision = self.llm.generate_structured(
-            system=system_prompt,
-            prompt=full_conversation,
-            output=RoutingDecision
-        )
-        print("Routing decision:", decision)
-        # Prepare and run selected agents concurrently
-        tasks: List[Any] = []
-        results_map: Dict[str, str] = {}
-        ticker = decision.ticker or ""
-        question = decision.question or request.message
-
-        if not decision.agents:
-            response = await self.handle_chat(request, full_conversation)
-            return ChatResponse(response=response)
-
-        for agent_key in decision.agents:
-            if agent_key == 'fundamentals':
-                tasks.append(
-                    self.fundamentals.analyze(ticker=ticker, question=question)
-                )
-            elif agent_key == 'sentiment':
-                tasks.append(
-                    self.sentiment.invoke(ticker)
-                )
-            elif agent_key == 'trading':
-                tasks.append(
-                    self.trading.invoke(ticker)
-                )
-            elif agent_key == 'search':
-                tasks.append(
-                    self.search.recommend()
+        context = RequestContext(timeout)
+        try:
+            decision = await self._plan(request, full_conversation, context)
+
+            if not decision.agents:
+                return await asyncio.wait_for(
+                    self.handle_chat(request, full_conversation), timeout=context.remaining()
                 )
 
-        raw_outputs = await asyncio.gather(*tasks, return_exceptions=True)
-        print("raw outputs:", raw_outputs)
-        for key, output in zip(decision.agents, raw_outputs):
-            if isinstance(output, Exception):
-                results_map[key] = f"**{key}** error: {output}"
-            else:
-                # Keep raw text for summarization
-                results_map[key] = output.strip()
+            if self._answers_directly(decision):
+                agent_key = decision.agents[0]
+                ticker, question = self._agent_inputs(request, decision)
+                try:
+                    return await asyncio.wait_for(
+                        context.run(self._agent_answer(agent_key, ticker, question)), timeout=context.remaining()
+                    )
+                except asyncio.TimeoutError:
+                    return f"**{agent_key}** did not finish in time, please try again."
+                except Exception as e:
+                    return self._agent_text(agent_key, e)
+
+            results_map, omitted = await self._run_agents(request, decision, context)
+
+            # Synthesize final response via LLM
+            summary_system, summary_prompt = self._summary_prompts(request, results_map, omitted)
+            return await asyncio.wait_for(
+                self.llm.generate(system=summary_system, prompt=summary_prompt, call_site="summary"),
+                timeout=context.remaining(),
+            )
+        except asyncio.TimeoutError:
+            return TIMEOUT_MESSAGE
+        finally:
+            # Tool calls still running are of no use to anyone anymore
+            context.close()
+
+    async def _answer_stream(
+            self,
+            request: ChatRequest,
+            full_conversation: str,
+            timeout: Optional[float],
+    ) -> AsyncGenerator[str, None]:
+        # Ask LLM to decide which agents to run and extract ticker/question
+        context = RequestContext(timeout)
+        try:
+            decision = await self._plan(request, full_conversation, context)
+
+            if not decision.agents:
+                async for chunk in context.run_stream(self.handle_chat_stream(request, full_conversation)):
+                    yield chunk
+                return
+
+            if self._answers_directly(decision):
+                # Stream the agent's own generation, there is nothing to synthesize
+                agent_key = decision.agents[0]
+                ticker, question = self._agent_inputs(request, decision)
+                try:
+                    async for chunk in context.run_stream(self._agent_stream(agent_key, ticker, question)):
+                        yield chunk
+                except asyncio.TimeoutError:
+                    yield f"\n\n**{agent_key}** did not finish in time, please try again."
+                except Exception as e:
+                    yield self._agent_text(agent_key, e)
+                return
+
+            results_map, omitted = await self._run_agents(request, decision, context)
+
+            # Synthesize final response via LLM
+            summary_system, summary_prompt = self._summary_prompts(request, results_map, omitted)
+            summary = self.llm.stream(system=summary_system, prompt=summary_prompt, call_site="summary")
+            async for chunk in context.run_stream(summary):
+                yield chunk
+        except asyncio.TimeoutError:
+            yield f"\n\n{TIMEOUT_MESSAGE}"
+        finally:
+            # Tool calls still running are of no use to anyone anymore
+            context.close()
+
+    async def _answer_events(
+            self,
+            request: ChatRequest,
+            full_conversation: str,
+            timeout: Optional[float],
+    ) -> AsyncGenerator[Tuple[str, Dict[str, Any]], None]:
+        context = RequestContext(timeout)
+        try:
+            decision = await self._plan(request, full_conversation, context)
+            yield ("routing", decision.model_dump())
+
+            if not decision.agents:
+                async for chunk in context.run_stream(self.handle_chat_stream(request, full_conversation)):
+                    yield ("summary", {"text": chunk})
+                yield ("done", {})
+                return
+
+            ticker, question = self._agent_inputs(request, decision)
+            if self._answers_directly(decision):
+                agent_key = decision.agents[0]
+                yield ("agent_status", {"agent": agent_key, "status": "running"})
+                chunks = []
+                try:
+                    async for chunk in context.run_stream(self._agent_stream(agent_key, ticker, question)):
+                        chunks.append(chunk)
+                        yield ("summary", {"text": chunk})
+                except asyncio.TimeoutError:
+                    yield ("agent_output", {"agent": agent_key, "status": "timeout"})
+                except Exception as e:
+                    yield ("agent_output", {"agent": agent_key, "status": "error", "error": str(e)})
+                else:
+                    yield ("agent_output", {"agent": agent_key, "status": "done", "output": "".join(chunks)})
+                yield ("done", {})
+                return
+
+            tasks = [
+                asyncio.create_task(self._run_agent(agent_key, ticker, question, context))
+                for agent_key in decision.agents
+            ]
+            try:
+                for agent_key in decision.agents:
+                    yield ("agent_status", {"agent": agent_key, "status": "running"})
+
+                outputs: Dict[str, Union[str, Exception]] = {}
+                try:
+                    for next_done in asyncio.as_completed(tasks, timeout=self._agents_budget(context)):
+                        agent_key, output = await next_done
+                        outputs[agent_key] = output
+                        if isinstance(output, Exception):
+                            yield ("agent_output", {"agent": agent_key, "status": "error", "error": str(output)})
+                        else:
+                            yield ("agent_output", {"agent": agent_key, "status": "done", "output": output})
+                except asyncio.TimeoutError:
+                    for agent_key in decision.agents:
+                        if agent_key not in outputs:
+                            yield ("agent_output", {"agent": agent_key, "status": "timeout"})
+            finally:
+                # Stragglers past the deadline, or the client went away mid-stream, and the tool calls they started
+                for task in tasks:
+                    task.cancel()
+                context.close()
+
+            # Summarize in routing order, whatever order the agents finished in
+            results_map = {key: self._agent_text(key, outputs[key]) for key in decision.agents if key in outputs}
+            omitted = [key for key in decision.agents if key not in outputs]
+            self._record_timeouts(omitted)
+            summary_system, summary_prompt = self._summary_prompts(request, results_map, omitted)
+            summary = self.llm.stream(system=summary_system, prompt=summary_prompt, call_site="summary")
+            async for chunk in context.run_stream(summary):
+                yield ("summary", {"text": chunk})
+            yield ("done", {})
+        except asyncio.TimeoutError:
+            yield ("summary", {"text": f"\n\n{TIMEOUT_MESSAGE}"})
+            yield ("done", {})
+        finally:
+            # Tool calls still running are of no use to anyone anymore
+            context.close()
+
+    async def _load_conversation(self, request: ChatRequest) -> Tuple[str, Optional[ChatSession]]:
+        """
+        Combine history and latest message, from the request's server-side session when it has one.
 
-        # Synthesize final response via LLM
-        summary_system = (
-            "You are a supervisor that consolidates agent outputs into a concise, user-friendly Markdown report."
-        )
-        # Build prompt listing each agent's output
-        prompt_parts = [f"### {key.capitalize()} Agent Output:\n{text}" for key, text in results_map.items()]
-        summary_prompt = (
-                f"User asked: {request.message}\n\n" + "\n\n".join(prompt_parts) +
-                "\n\nGenerate a final answer in Markdown that addresses the user's request, synthesizes relevant data, and is concise."
-                "DO NOT INCLUDE ANY EXTRA INFORMATION. INCLUDE ONLY RELEVANT RESPONSES TO USER MESSAGE."
-        )
-        final_md = self.llm.generate(system=summary_system, prompt=summary_prompt)
+        Returns:
+            The conversation prompt, and the session if the request belongs to one
+        """
+        if request.session_id and self.sessions:
+            session = await self.sessions.load(request.session_id)
+            return self.sessions.conversation(session, request.message), session
+
+        return "".join(
+            f"{turn['role']}: {turn['content']}\n" for turn in request.history
+        ) + f"user: {request.message}", None
 
-        return ChatResponse(response=final_md)
+    async def _remember(self, request: ChatRequest, session: Optional[ChatSession], response: str) -> None:
+        """Record the turn in the request's session, if any"""
+        if session is not None:
+            await self.sessions.append(request.session_id, request.message, response)
 
-    async def handle_stream(self, request: ChatRequest) -> AsyncGenerator[str, Any]:
-        # Ask LLM to decide which agents to run and extract ticker/question
+    async def _plan(self, request: ChatRequest, full_conversation: str, context: RequestContext) -> RoutingDecision:
+        """
+        Route the request while validating its ticker and speculatively prefetching the ticker's data into the
+        request context, then cancel the prefetches none of the routed agents needs, all of them when the ticker is
+        unknown. Agents needing a ticker are dropped when the routed ticker is unknown.
+        """
+        candidate = self._candidate_ticker(request.ticker)
+        # Checked alongside routing, a ticker outside the local universe costs a quote lookup
+        validation = asyncio.ensure_future(self._valid_ticker(request.ticker, track=False))
+        if candidate:
+            context.prefetch("get_quotes", {"symbol": candidate}, lambda: self.finance.get_quotes(candidate))
+            context.prefetch("get_technicals", {"symbol": candidate}, lambda: self.finance.get_technicals(candidate))
+            context.prefetch("get_news", {"symbol": candidate}, lambda: self.finance.get_news(candidate))
+
+        try:
+            decision = await self._route(request, full_conversation, context)
+            ticker = await validation
+            routed_ticker = decision.ticker
+            decision.ticker = await self._valid_ticker(routed_ticker) or None
+        except BaseException:
+            validation.cancel()
+            context.cancel_prefetches()
+            raise
+
+        if routed_ticker and decision.ticker is None:
+            decision.agents = [agent_key for agent_key in decision.agents if agent_key not in TICKER_AGENTS]
+            metrics.counter("supervisor.invalid_tickers").inc()
+
+        needed: Set[str] = set()
+        # Prefetches of an unknown ticker are all cancelled
+        if ticker and ticker == candidate and decision.ticker == ticker:
+            for agent_key in decision.agents:
+                needed |= PREFETCH_NEEDS[agent_key]
+        cancelled = context.cancel_prefetches(lambda tool, args: tool in needed)
+        if candidate:
+            metrics.counter("supervisor.prefetch.used").inc(len(needed))
+            metrics.counter("supervisor.prefetch.cancelled").inc(cancelled)
+        return decision
+
+    @staticmethod
+    def _candidate_ticker(ticker: Optional[str]) -> str:
+        """The normalized ticker, without checking that it exists, or an empty string when it is malformed"""
+        ticker = (ticker or "").strip()
+        if not ticker:
+            return ""
+        try:
+            return normalize_ticker(COMPANY_TICKERS.get(ticker.lower(), ticker))
+        except InvalidTickerError:
+            return ""
+
+    async def _valid_ticker(self, ticker: Optional[str], track: bool = True) -> str:
+        """The normalized ticker, or an empty string when it is missing or unknown"""
+        ticker = (ticker or "").strip()
+        if not ticker:
+            return ""
+        # The LLM router sometimes answers with the company name
+        ticker = COMPANY_TICKERS.get(ticker.lower(), ticker)
+        if self.tickers is None:
+            return ticker.upper()
+        try:
+            return await self.tickers.validate(ticker, track=track)
+        except InvalidTickerError as e:
+            self.logger.info(f"Ignoring ticker: {e}")
+            return ""
+
+    async def _route(
+            self,
+            request: ChatRequest,
+            full_conversation: str,
+            context: RequestContext,
+    ) -> RoutingDecision:
+        """Decide which agents should handle the conversation, locally when the message is clear enough"""
+        start = time.perf_counter()
+        decision = self.router.route(request) if self.router else None
+        source = "local"
+        if decision is None:
+            decision = await asyncio.wait_for(
+                self._route_llm(request, full_conversation), timeout=context.remaining()
+            )
+            source = "llm"
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        metrics.counter(f"supervisor.routing.{source}").inc()
+        self.logger.info(f"Routing decision ({source}, {latency_ms:.1f}ms): {decision}")
+        await log_decision(request, decision, source, latency_ms)
+        return decision
+
+    async def _route_llm(self, request: ChatRequest, full_conversation: str) -> RoutingDecision:
+        """Ask the LLM which agents should handle the conversation"""
         system_prompt = (
             "You are a supervisor that routes user requests to specialized agents:\n"
             "- fundamentals for core metrics and comparisons\n"
@@ -126,65 +411,165 @@ class SupervisorAgent:
         )
         if request.ticker:
             system_prompt += f"\nFocus your analysis on ticker: {request.ticker}"
-        # Combine history and latest message
-        full_conversation = "".join(
-            f"{turn['role']}: {turn['content']}\n" for turn in request.history
-        ) + f"user: {request.message}"
 
         # Use structured generation for routing
-        decision: RoutingDecision = self.llm.generate_structured(
+        decision: RoutingDecision = await self.llm.generate_structured(
             system=system_prompt,
             prompt=full_conversation,
-            output=RoutingDecision
+            output=RoutingDecision,
+            call_site="routing",
         )
-        print("Routing decision:", decision)
-        # Prepare and run selected agents concurrently
-        tasks: List[Any] = []
-        results_map: Dict[str, str] = {}
-        ticker = decision.ticker or ""
-        question = decision.question or request.message
-
-        if not decision.agents:
-            async for chunk in self.handle_chat_stream(request, full_conversation):
-                yield chunk
-            return
-
-        for agent_key in decision.agents:
-            if agent_key == 'fundamentals':
-                tasks.append(
-                    self.fundamentals.analyze(ticker=ticker, question=question)
-                )
-            elif agent_key == 'sentiment':
-                tasks.append(
-                    self.sentiment.invoke(ticker)
-                )
-            elif agent_key == 'trading':
-                tasks.append(
-                    self.trading.invoke(ticker)
-                )
-
-        raw_outputs = await asyncio.gather(*tasks, return_exceptions=True)
-        print("raw outputs:", raw_outputs)
-        for key, output in zip(decision.agents, raw_outputs):
-            if isinstance(output, Exception):
-                results_map[key] = f"**{key}** error: {output}"
-            else:
-                # Keep raw text for summarization
-                results_map[key] = output.strip()
+        return decision
+
+    def _agent_call(self, agent_key: str, ticker: str, question: str) -> Awaitable[str]:
+        """The coroutine running one sub-agent"""
+        if agent_key == 'fundamentals':
+            return self.fundamentals.analyze(ticker=ticker, question=question)
+        elif agent_key == 'sentiment':
+            return self._sentiment_json(ticker)
+        elif agent_key == 'trading':
+            return self.trading.invoke(ticker)
+        elif agent_key == 'search':
+            return self.search.recommend()
+        raise ValueError(f"Unknown agent {agent_key}")
+
+    async def _sentiment_json(self, ticker: str) -> str:
+        """Sentiment as JSON for the summary, reusing the score cached for unchanged headlines"""
+        return (await self.sentiment.score(ticker)).model_dump_json()
+
+    def _agent_answer(self, agent_key: str, ticker: str, question: str) -> Awaitable[str]:
+        """The coroutine of one sub-agent answering the user directly"""
+        if agent_key == 'sentiment':
+            # Raw sentiment JSON is only fit for the summary
+            return self.sentiment.report(ticker)
+        return self._agent_call(agent_key, ticker, question)
+
+    def _agent_stream(self, agent_key: str, ticker: str, question: str) -> AsyncIterator[str]:
+        """The stream of one sub-agent answering the user directly"""
+        if agent_key == 'fundamentals':
+            return self.fundamentals.analyze_stream(ticker=ticker, question=question)
+        elif agent_key == 'trading':
+            return self.trading.stream(ticker)
+        elif agent_key == 'search':
+            return self.search.recommend_stream()
+        return self._single_chunk(self._agent_answer(agent_key, ticker, question))
+
+    @staticmethod
+    async def _single_chunk(answer: Awaitable[str]) -> AsyncGenerator[str, None]:
+        yield await answer
+
+    def _answers_directly(self, decision: RoutingDecision) -> bool:
+        """Whether the only routed agent answers the user itself, skipping the summary"""
+        return len(decision.agents) == 1 and not self.summarize_single_agent
+
+    @staticmethod
+    def _agent_inputs(request: ChatRequest, decision: RoutingDecision) -> Tuple[str, str]:
+        """Ticker and question passed to the sub-agents"""
+        return (decision.ticker or "").strip().upper(), decision.question or request.message
+
+    async def _run_agents(
+            self,
+            request: ChatRequest,
+            decision: RoutingDecision,
+            context: RequestContext,
+    ) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Run the selected agents concurrently within one request context, so tool results are shared
+        between them. Agents still running once the agents' share of the deadline is spent are cancelled.
 
-        # Synthesize final response via LLM
+        Returns:
+            Each finished agent's output, or an error message for agents that failed, and the agents that
+            were cancelled
+        """
+        ticker, question = self._agent_inputs(request, decision)
+
+        tasks = [
+            asyncio.create_task(self._run_agent(agent_key, ticker, question, context))
+            for agent_key in decision.agents
+        ]
+        try:
+            done, pending = await asyncio.wait(tasks, timeout=self._agents_budget(context))
+        finally:
+            # Stragglers past the deadline, or the request itself was cancelled, and the tool calls they started
+            for task in tasks:
+                task.cancel()
+            context.close()
+
+        outcomes = [task.result() for task in tasks if task in done]
+        omitted = [agent_key for agent_key, task in zip(decision.agents, tasks) if task in pending]
+        self._record_timeouts(omitted)
+        metrics.counter("tools.calls_executed").inc(context.misses)
+        metrics.counter("tools.calls_shared").inc(context.hits)
+        return {key: self._agent_text(key, output) for key, output in outcomes}, omitted
+
+    async def _run_agent(
+            self,
+            agent_key: str,
+            ticker: str,
+            question: str,
+            context: RequestContext,
+    ) -> Tuple[str, Union[str, Exception]]:
+        """Run one sub-agent in the request context, returning its failure instead of raising it"""
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            output = await context.run(self._agent_call(agent_key, ticker, question))
+        except asyncio.CancelledError:
+            status = "cancelled"
+            metrics.counter(f"supervisor.agent.{agent_key}.cancelled").inc()
+            raise
+        except Exception as e:
+            status = "error"
+            return agent_key, e
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.histogram(f"supervisor.agent.{agent_key}.latency").observe(elapsed)
+            self.logger.info(f"Agent {agent_key}: {status} after {elapsed * 1000:.0f}ms")
+        return agent_key, output
+
+    def _agents_budget(self, context: RequestContext) -> Optional[float]:
+        """Seconds the sub-agents may run, leaving part of the request's remaining time for the summary"""
+        remaining = context.remaining()
+        if remaining is None:
+            return None
+        return remaining - min(self.summary_reserve, remaining / 2)
+
+    def _record_timeouts(self, omitted: List[str]) -> None:
+        for agent_key in omitted:
+            metrics.counter(f"supervisor.agent.{agent_key}.timeouts").inc()
+            self.logger.warning(f"Agent {agent_key}: cancelled, missed the request deadline")
+
+    @staticmethod
+    def _agent_text(agent_key: str, output: Union[str, Exception]) -> str:
+        """Agent output as passed to the summary"""
+        if isinstance(output, Exception):
+            return f"**{agent_key}** error: {output}"
+        # Keep raw text for summarization
+        return output.strip()
+
+    @staticmethod
+    def _summary_prompts(
+            request: ChatRequest,
+            results_map: Dict[str, str],
+            omitted: Optional[List[str]] = None,
+    ) -> Tuple[str, str]:
+        """System instruction and prompt consolidating the agent outputs, noting the agents that did not finish"""
         summary_system = (
             "You are a supervisor that consolidates agent outputs into a concise, user-friendly Markdown report."
         )
+        # Build prompt listing each agent's output
         prompt_parts = [f"### {key.capitalize()} Agent Output:\n{text}" for key, text in results_map.items()]
         summary_prompt = (
                 f"User asked: {request.message}\n\n" + "\n\n".join(prompt_parts) +
                 "\n\nGenerate a final answer in Markdown that addresses the user's request, synthesizes relevant data, and is concise."
                 "DO NOT INCLUDE ANY EXTRA INFORMATION. INCLUDE ONLY RELEVANT RESPONSES TO USER MESSAGE."
         )
-
-        async for chunk in self.llm.stream(system=summary_system, prompt=summary_prompt):
-            yield chunk
+        if omitted:
+            summary_prompt += (
+                f"\n\nThe {', '.join(key.capitalize() for key in omitted)} analysis did not finish in time and is "
+                "not included. Briefly tell the user which part of their request could not be answered."
+            )
+        return summary_system, summary_prompt
 
     async def handle_chat(self, request: ChatRequest, conversation: str) -> str:
         """
@@ -208,7 +593,7 @@ class SupervisorAgent:
             system_prompt += f"\nFocus your response on ticker: {request.ticker}"
 
         # Get direct response from LLM
-        response = self.llm.generate(system=system_prompt, prompt=conversation)
+        response = await self.llm.generate(system=system_prompt, prompt=conversation, call_site="chat")
         return response
 
     async def handle_chat_stream(self, request: ChatRequest, conversation: str) -> AsyncGenerator[str, None]:
@@ -233,13 +618,19 @@ class SupervisorAgent:
             system_prompt += f"\nFocus your response on ticker: {request.ticker}"
 
         # Stream response from LLM
-        async for chunk in self.llm.stream(system=system_prompt, prompt=conversation):
+        async for chunk in self.llm.stream(system=system_prompt, prompt=conversation, call_site="chat"):
             yield chunk
 
 if __name__ == "__main__":
+    from agents.registry import AgentRegistry
+    from finance_query import FinanceQuery
+    from rds import RedisHandler
+    from tavily_search import TavilySearch
+
     # Example usage
-    llm = LLM()
-    supervisor = SupervisorAgent(llm=llm)
+    supervisor = AgentRegistry(
+        llm=LLM(), rds=RedisHandler(), tavily=TavilySearch(), finance=FinanceQuery()
+    ).supervisor
     request = ChatRequest(
         message="What is the current price?",
         history=[],
@@ -1,12 +1,11 @@
 import asyncio
-from typing import Dict, Optional
-
-import requests
+from typing import AsyncGenerator, Dict, Optional
 
 from agents.base.agent import Agent
-from dependencies import RDS
+from finance_query import FinanceQuery
 from rds import RedisHandler
 from utils.llm import LLM
+from utils.projection import TokenBudget
 
 
 class TradingStrategyAgent(Agent):
@@ -16,57 +15,27 @@ class TradingStrategyAgent(Agent):
 
     def __init__(
             self,
-            rds: RDS = RedisHandler(),
-            llm: LLM = LLM(),
+            rds: RedisHandler,
+            llm: LLM,
+            finance: FinanceQuery,
             automatic_function_calling: bool = True,
+            parallel_tool_calls: bool = True,
     ):
-        def get_quotes(symbol: str) -> Dict:
+        async def get_quotes(symbol: str) -> Dict:
             """Fetch detailed quote data for given stock symbols."""
-            response = requests.get(
-                "https://finance-query.onrender.com/v1/quotes",
-                params={"symbols": symbol}
-            )
-            response.raise_for_status()
-            data = response.json()
-            if isinstance(data, list):
-                return {"quotes": data}
-            return data
-
-        def get_news(symbol: str) -> Dict:
+            return await finance.get_quotes(symbol)
+
+        async def get_news(symbol: str) -> Dict:
             """Fetch the latest news for a given stock symbol."""
-            response = requests.get(
-                "https://finance-query.onrender.com/v1/news",
-                params={"symbol": symbol}
-            )
-            response.raise_for_status()
-            data = response.json()
-            if isinstance(data, list):
-                return {"news": data}
-            return data
-
-        def get_similar(symbol: str) -> Dict:
+            return await finance.get_news(symbol)
+
+        async def get_similar(symbol: str) -> Dict:
             """Fetch similar stocks for a given symbol."""
-            response = requests.get(
-                "https://finance-query.onrender.com/v1/similar",
-                params={"symbol": symbol}
-            )
-            response.raise_for_status()
-            data = response.json()
-            if isinstance(data, list):
-                return {"similar": data}
-            return data
-
-        def get_technicals(symbol: str) -> Dict:
+            return await finance.get_similar(symbol)
+
+        async def get_technicals(symbol: str) -> Dict:
             """Fetch technical indicators for a given symbol."""
-            response = requests.get(
-                "https://finance-query.onrender.com/v1/indicators",
-                params={"symbol": symbol, "interval": "1d"}
-            )
-            response.raise_for_status()
-            data = response.json()
-            if isinstance(data, list):
-                return {"indicators": data}
-            return data
+            return await finance.get_technicals(symbol)
 
         def get_recent_posts(author: str = "trump") -> Dict:
             """Get the most recent Trump posts from Redis"""
@@ -74,12 +43,14 @@ class TradingStrategyAgent(Agent):
             if not posts:
                 return {"posts": []}
 
-            return {"posts": [post.model_dump_json() for post in posts]}
+            return {"posts": [post.model_dump() for post in posts]}
 
         super().__init__(
             llm=llm,
             tools=[get_quotes, get_news, get_similar, get_technicals, get_recent_posts],
             automatic_function_calling=automatic_function_calling,
+            call_site="trading",
+            parallel_tool_calls=parallel_tool_calls,
         )
 
     async def invoke(
@@ -88,7 +59,9 @@ class TradingStrategyAgent(Agent):
             system: Optional[str] = None,
     ) -> str:
         """
-        Executes analysis for the given ticker.
+        Propose trading strategies for the given symbol based on all available data and recent posts.
+
+        Strategies should include whether to hold, buy on dip, sell, or other actionable recommendations.
 
         Args:
             ticker: Stock symbol to analyze (e.g., 'AAPL').
@@ -97,23 +70,31 @@ class TradingStrategyAgent(Agent):
         Returns:
             Strategy analysis incorporating real-time quote data.
         """
-        """
-        Propose trading strategies for the given symbol based on all available data and recent posts.
+        budget = self.token_budget()
+        return await super().invoke(prompt=await self._prompt(ticker, budget), system=system, budget=budget)
 
-        Strategies should include whether to hold, buy on dip, sell, or other actionable recommendations.
-        """
-        prompt = (
+    async def stream(
+            self,
+            ticker: str,
+            system: Optional[str] = None,
+    ) -> AsyncGenerator[str, None]:
+        """Stream version of invoke that yields the strategy as it's generated."""
+        budget = self.token_budget()
+        async for chunk in super().stream(prompt=await self._prompt(ticker, budget), system=system, budget=budget):
+            yield chunk
+
+    async def _prompt(self, ticker: str, budget: TokenBudget) -> str:
+        return (
             f"Analyze the stock symbol {ticker} and propose a trading strategy. "
             "You have access to the following tools: get_quotes, get_summary, get_historical, get_market_movers, get_similar, get_news, get_technicals, and get_recent_posts(author='trump'). "
             "Use these tools as needed to gather current market data, news sentiment, technical indicators, peer comparisons, and recent Trump posts. "
             "Based on the collected information, recommend whether to hold, buy on dips, or sell, and explain your logic. "
             "Provide a clear step-by-step reasoning in text."
-        )
-        return await super().invoke(prompt=prompt, system=system)
+        ) + await self.prefetched_data(budget)
 
 
 if __name__ == "__main__":
     rds = RedisHandler()
-    agent = TradingStrategyAgent(rds=rds)
+    agent = TradingStrategyAgent(rds=rds, llm=LLM(), finance=FinanceQuery())
     result = asyncio.run(agent.invoke(ticker="AAPL"))
     print(result)
@@ -0,0 +1,69 @@
+"""
+Per-request cost of obtaining the chat agents.
+
+Compares building the supervisor and its sub-agents on every request, as the endpoints used to, with looking up
+the instance the lifespan hook builds once in AgentRegistry. The per-request case also builds each agent's
+generation config, which agents used to build in their constructor and now build on first use. No network calls
+are made, and every finance-query client is closed outside the timed section.
+
+    python benchmarks/agent_construction.py --iterations 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Clients only validate that credentials exist when constructed
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379")
+
+from agents.registry import AgentRegistry  # noqa: E402
+from finance_query import FinanceQuery  # noqa: E402
+from rds import RedisHandler  # noqa: E402
+from tavily_search import TavilySearch  # noqa: E402
+from utils.llm import LLM  # noqa: E402
+
+
+async def per_request(iterations: int) -> float:
+    """Build the LLM, clients and every agent, with its generation config, per request"""
+    elapsed = 0.0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        finance = FinanceQuery()
+        try:
+            registry = AgentRegistry(llm=LLM(), rds=RedisHandler(), tavily=TavilySearch(), finance=finance)
+            for agent in (registry.fundamentals, registry.sentiment, registry.trading, registry.search):
+                agent.config
+            registry.supervisor
+            elapsed += time.perf_counter() - start
+        finally:
+            await finance.aclose()
+    return elapsed / iterations
+
+
+async def registry_lookup(iterations: int) -> float:
+    """Build once, then only look the supervisor up per request"""
+    finance = FinanceQuery()
+    try:
+        registry = AgentRegistry(llm=LLM(), rds=RedisHandler(), tavily=TavilySearch(), finance=finance)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            registry.supervisor
+        return (time.perf_counter() - start) / iterations
+    finally:
+        await finance.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agent construction cost per request")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    before = asyncio.run(per_request(args.iterations))
+    after = asyncio.run(registry_lookup(args.iterations))
+    print(f"per-request construction: {before * 1e6:,.1f} us/request")
+    print(f"registry lookup:          {after * 1e6:,.3f} us/request")
@@ -0,0 +1,71 @@
+"""
+Load test for /chat/stream.
+
+Opens concurrent streaming sessions against a running backend and reports when each session received its first
+and last chunk. With a non-blocking event loop the sessions progress in parallel, so the wall time stays close to
+the slowest single session instead of the sum of all of them.
+
+    uvicorn main:app
+    python benchmarks/chat_stream_load.py --sessions 8
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def run_session(client: httpx.AsyncClient, url: str, message: str, start: float) -> dict:
+    """Stream one chat and record time to first byte and total duration relative to start"""
+    first_chunk = None
+    chunks = 0
+    async with client.stream("POST", url, json={"message": message, "history": []}) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_text():
+            if not chunk:
+                continue
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+            chunks += 1
+    return {"ttfb": first_chunk, "total": time.perf_counter() - start, "chunks": chunks}
+
+
+async def main(url: str, sessions: int, message: str) -> None:
+    async with httpx.AsyncClient(timeout=None) as client:
+        # A single session first gives the baseline duration of one chat
+        baseline = await run_session(client, url, message, time.perf_counter())
+        print(f"baseline: done {baseline['total']:.2f}s, {baseline['chunks']} chunks\n")
+
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(run_session(client, url, message, start) for _ in range(sessions)),
+            return_exceptions=True,
+        )
+        wall = time.perf_counter() - start
+
+    ok = [r for r in results if isinstance(r, dict)]
+    for i, result in enumerate(results):
+        if isinstance(result, Exception):
+            print(f"session {i}: error {result}")
+        else:
+            print(f"session {i}: first chunk {result['ttfb']:.2f}s, done {result['total']:.2f}s, "
+                  f"{result['chunks']} chunks")
+
+    if not ok:
+        return
+    ttfbs = [r["ttfb"] for r in ok if r["ttfb"] is not None]
+    print(f"\n{len(ok)}/{sessions} sessions succeeded in {wall:.2f}s wall time")
+    if ttfbs:
+        print(f"first chunks between {min(ttfbs):.2f}s and {max(ttfbs):.2f}s, median {statistics.median(ttfbs):.2f}s")
+    # Serialized sessions would need roughly sessions * baseline
+    print(f"effective parallelism {len(ok) * baseline['total'] / wall:.1f}x of {len(ok)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent /chat/stream load test")
+    parser.add_argument("--url", default="http://localhost:8000/chat/stream")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--message", default="Tell me about the stock market today")
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.sessions, args.message))
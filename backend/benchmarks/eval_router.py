@@ -0,0 +1,78 @@
+"""
+Offline evaluation of the local intent router against the LLM router.
+
+Replays the messages the LLM routed, as logged to ROUTING_LOG_PATH (run the app with LOCAL_ROUTING=false to log
+every message), through LocalRouter and compares the decisions. Reports how many messages the local router
+decides, how often it agrees with the LLM, and the routing latency saved on the messages it would have decided.
+No network calls are made.
+
+    python benchmarks/eval_router.py routing.jsonl --show-disagreements
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.chatrequest import ChatRequest  # noqa: E402
+from models.routing import RoutingDecision  # noqa: E402
+from utils.router import LocalRouter  # noqa: E402
+
+
+def agrees(local: RoutingDecision, llm: RoutingDecision) -> bool:
+    """Same agents, and the same ticker whenever a ticker matters"""
+    if set(local.agents) != set(llm.agents):
+        return False
+    if not local.agents or local.agents == ['search']:
+        return True
+    return (local.ticker or "").upper() == (llm.ticker or "").upper()
+
+
+def evaluate(records: List[Dict], router: LocalRouter, show_disagreements: bool) -> None:
+    decided = agreed = 0
+    llm_ms = saved_ms = local_ms = 0.0
+
+    for record in records:
+        request = ChatRequest(message=record["message"], ticker=record.get("ticker"))
+        expected = RoutingDecision.model_validate(record["decision"])
+        llm_ms += record.get("latency_ms", 0.0)
+
+        start = time.perf_counter()
+        decision = router.route(request)
+        local_ms += (time.perf_counter() - start) * 1000
+        if decision is None:
+            continue
+
+        decided += 1
+        if agrees(decision, expected):
+            agreed += 1
+            saved_ms += record.get("latency_ms", 0.0)
+        elif show_disagreements:
+            print(f"  {record['message']!r}: local={decision.agents}/{decision.ticker} "
+                  f"llm={expected.agents}/{expected.ticker}")
+
+    total = len(records)
+    print(f"messages:            {total}")
+    print(f"decided locally:     {decided} ({decided / total:.1%})")
+    print(f"agreement:           {agreed}/{decided} ({agreed / decided if decided else 0:.1%})")
+    print(f"local router:        {local_ms / total:.3f} ms/message")
+    print(f"LLM routing latency: {llm_ms / total:,.0f} ms/message")
+    print(f"latency saved:       {saved_ms:,.0f} ms total, {saved_ms / total:,.0f} ms/message")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the local router with logged LLM routing decisions")
+    parser.add_argument("log", help="JSONL routing log written through ROUTING_LOG_PATH")
+    parser.add_argument("--show-disagreements", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.log) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records = [record for record in records if record.get("source") == "llm"]
+    if not records:
+        sys.exit("No LLM routing decisions in the log")
+
+    evaluate(records, LocalRouter(), args.show_disagreements)
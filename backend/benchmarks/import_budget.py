@@ -0,0 +1,82 @@
+"""
+Startup import-time budget for the API.
+
+Imports main in fresh interpreters with `python -X importtime` and fails when the cumulative import time of
+main exceeds the budget, or when a dependency that must be loaded lazily is imported at startup.
+
+    python benchmarks/import_budget.py --budget-ms 750
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use by the code paths that need them, never at startup
+LAZY_MODULES = ["yfinance", "pandas", "boto3", "botocore", "google.genai", "tavily", "elevenlabs"]
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(\S+)$")
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    # Clients only validate that credentials exist when constructed
+    env.setdefault("GEMINI_API_KEY", "budget")
+    env.setdefault("TAVILY_API_KEY", "budget")
+    env.setdefault("REDIS_URL", "redis://localhost:6379")
+    return env
+
+
+def measure_import_ms() -> float:
+    """Cumulative import time of main in a fresh interpreter, in milliseconds"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=_env(), capture_output=True, text=True, check=True,
+    )
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and match.group(3) == "main":
+            return int(match.group(2)) / 1000
+    raise RuntimeError(f"main not found in importtime output:\n{result.stderr[-2000:]}")
+
+
+def eagerly_imported() -> list:
+    """Lazy modules present in sys.modules right after importing main"""
+    script = (
+        "import json, sys, main\n"
+        f"print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=BACKEND_DIR, env=_env(), capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fail when API startup imports regress")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "750")))
+    parser.add_argument("--runs", type=int, default=3, help="Best of N runs, to smooth out noise")
+    args = parser.parse_args()
+
+    failed = False
+    eager = eagerly_imported()
+    if eager:
+        print(f"FAIL: imported at startup but should be lazy: {', '.join(eager)}")
+        failed = True
+
+    best = min(measure_import_ms() for _ in range(args.runs))
+    if best > args.budget_ms:
+        print(f"FAIL: importing main took {best:.0f} ms, budget is {args.budget_ms:.0f} ms")
+        failed = True
+    else:
+        print(f"OK: importing main took {best:.0f} ms, budget is {args.budget_ms:.0f} ms")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,17 @@
+import os
 from typing import Annotated
 
-from fastapi import Depends
+from fastapi import Depends, HTTPException
+from fastapi.params import Path
 from starlette.requests import Request
 
+from agents.registry import AgentRegistry
+from agents.sentiment_agent import SentimentAgent
+from agents.supervisor_agent import SupervisorAgent
+from price_history import PriceHistory
 from rds import RedisHandler
 from s3 import S3
+from utils.tickers import InvalidTickerError
 
 
 async def get_s3(request: Request) -> S3:
@@ -17,5 +24,52 @@ async def get_rds(request: Request):
     return request.app.state.rds
 
 
+async def get_agents(request: Request) -> AgentRegistry:
+    """Get the agent registry from app state"""
+    return request.app.state.agents
+
+
+async def get_supervisor(request: Request) -> SupervisorAgent:
+    """Get the shared supervisor agent from app state"""
+    return request.app.state.agents.supervisor
+
+
+async def get_sentiment_agent(request: Request) -> SentimentAgent:
+    """Get the shared sentiment agent from app state"""
+    return request.app.state.agents.sentiment
+
+
+async def get_prices(request: Request) -> PriceHistory:
+    """Get the shared price history cache from app state"""
+    return request.app.state.prices
+
+
+async def get_valid_ticker(request: Request, ticker: str = Path()) -> str:
+    """The ticker of the path, normalized, or a 404 before any work is done for a malformed or unknown one"""
+    try:
+        return await request.app.state.agents.tickers.validate(ticker)
+    except InvalidTickerError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+async def get_request_timeout(request: Request) -> float:
+    """
+    Seconds a chat request may take: CHAT_TIMEOUT, or less when the client asks for it
+    with an X-Request-Timeout header.
+    """
+    timeout = float(os.getenv("CHAT_TIMEOUT", "60"))
+    try:
+        requested = float(request.headers.get("X-Request-Timeout", timeout))
+    except ValueError:
+        return timeout
+    return min(requested, timeout) if requested > 0 else timeout
+
+
 S3 = Annotated[S3, Depends(get_s3)]
 RDS = Annotated[RedisHandler, Depends(get_rds)]
+Agents = Annotated[AgentRegistry, Depends(get_agents)]
+Supervisor = Annotated[SupervisorAgent, Depends(get_supervisor)]
+Sentiment = Annotated[SentimentAgent, Depends(get_sentiment_agent)]
+RequestTimeout = Annotated[float, Depends(get_request_timeout)]
+ValidTicker = Annotated[str, Depends(get_valid_ticker)]
+Prices = Annotated[PriceHistory, Depends(get_prices)]
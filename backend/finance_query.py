@@ -0,0 +1,261 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from utils import metrics
+
+# Seconds a response is cached for, per endpoint
+DEFAULT_TTLS: Dict[str, int] = {
+    "quotes": 10,
+    "indicators": 5 * 60,
+    "news": 3 * 60,
+    "similar": 60 * 60,
+}
+
+
+class QuoteLoader:
+    """
+    DataLoader-style batching of quote lookups.
+
+    Symbols requested within a short window, by any caller, are fetched together in one multi-symbol request and
+    the results are split back to each caller. Each symbol succeeds or fails on its own: a symbol missing from the
+    response only fails its callers, and a batch rejected with a 4xx, which one bad symbol can cause, is retried
+    symbol by symbol. Any other failure, such as a 5xx or a timeout, fails the whole batch rather than sending each
+    symbol to an upstream that is already failing.
+    """
+
+    def __init__(
+            self,
+            fetch: Callable[[List[str]], Awaitable[List[Dict]]],
+            window: float = 0.01,
+            max_batch_size: int = 25,
+    ):
+        """
+        Args:
+            fetch: Fetches the quotes of several symbols in one request
+            window: Seconds to wait for more symbols after the first one of a batch
+            max_batch_size: Symbols per request, a full batch is sent without waiting for the window
+        """
+        self.fetch = fetch
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # The event loop only keeps weak references to tasks, hold the running batches until they are done
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def load(self, symbol: str) -> Dict:
+        """Quote of one symbol, fetched with whatever else is requested in the same window"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(symbol.upper(), []).append(future)
+
+        if len(self._pending) >= self.max_batch_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._dispatch)
+        return await future
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Dict[str, List[asyncio.Future]]) -> None:
+        metrics.histogram("finance_query.quotes.batch_size", (1, 2, 5, 10, 25, 50)).observe(len(batch))
+        try:
+            quotes = await self.fetch(list(batch))
+        except Exception as e:
+            if len(batch) == 1 or not _client_error(e):
+                self._resolve(batch, {}, e)
+                return
+            # One bad symbol must not fail the others, retry each on its own
+            await asyncio.gather(*(self._run({symbol: futures}) for symbol, futures in batch.items()))
+            return
+        by_symbol = {str(quote.get("symbol", "")).upper(): quote for quote in quotes}
+        self._resolve(batch, by_symbol)
+
+    @staticmethod
+    def _resolve(
+            batch: Dict[str, List[asyncio.Future]],
+            by_symbol: Dict[str, Dict],
+            error: Optional[Exception] = None,
+    ) -> None:
+        for symbol, futures in batch.items():
+            for future in futures:
+                if future.done():
+                    continue
+                if symbol in by_symbol:
+                    future.set_result(by_symbol[symbol])
+                else:
+                    future.set_exception(error or LookupError(f"No quote found for {symbol}"))
+
+
+def _client_error(error: Exception) -> bool:
+    return isinstance(error, httpx.HTTPStatusError) and 400 <= error.response.status_code < 500
+
+
+class FinanceQuery:
+    """
+    Shared client for the finance-query API used by every agent tool.
+
+    Requests go through one pooled keep-alive async HTTP client with explicit timeouts. Responses are cached per
+    endpoint with their own TTL, and concurrent requests for the same uncached data share one upstream call.
+    Quote lookups from concurrent callers are batched into multi-symbol requests by a QuoteLoader.
+    Cache hit rates and upstream latency histograms are exposed through utils.metrics.
+
+    Usage:
+        finance = FinanceQuery()
+        quotes = await finance.get_quotes("AAPL")
+        await finance.aclose()
+    """
+
+    def __init__(
+            self,
+            base_url: str = "https://finance-query.onrender.com",
+            timeout: float = 10.0,
+            max_connections: int = 20,
+            ttls: Optional[Dict[str, int]] = None,
+            max_entries: int = 2048,
+            quote_batch_window: float = 0.01,
+            max_quote_batch_size: int = 25,
+    ):
+        """
+        Args:
+            base_url: Root URL of the finance-query API
+            timeout: Seconds allowed per request; connecting gets at most 5 seconds of it
+            max_connections: Size of the connection pool
+            ttls: Seconds to cache responses for, per endpoint
+            max_entries: Maximum number of cached responses
+            quote_batch_window: Seconds quote lookups wait to be batched with others
+            max_quote_batch_size: Maximum symbols per quotes request
+        """
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0)),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.max_entries = max_entries
+        self._cache: Dict[Tuple, Tuple[float, Any]] = {}
+        self._in_flight: Dict[Tuple, asyncio.Task] = {}
+        self._hits: Dict[str, int] = {}
+        self._misses: Dict[str, int] = {}
+        self.quote_loader = QuoteLoader(self._fetch_quotes, quote_batch_window, max_quote_batch_size)
+        metrics.gauge("finance_query", self.stats)
+
+    async def get_quotes(self, symbol: str, min_ttl: float = 0) -> Dict:
+        """
+        Fetch detailed quote data for given stock symbol, or several comma-separated symbols.
+
+        Like every getter, min_ttl is the number of seconds a cached response must stay fresh for to be served,
+        so the cache warmer can refresh entries ahead of their expiry.
+        """
+        symbols = [s.strip().upper() for s in symbol.split(",") if s.strip()]
+        results = await asyncio.gather(
+            *(
+                self._cached("quotes", ("quotes", s), lambda s=s: self.quote_loader.load(s), min_ttl)
+                for s in symbols
+            ),
+            return_exceptions=True,
+        )
+        quotes = [result for result in results if not isinstance(result, BaseException)]
+        if not quotes and results:
+            raise results[0]
+        return {"quotes": quotes}
+
+    async def get_technicals(self, symbol: str, min_ttl: float = 0) -> Dict:
+        """Fetch technical indicators for a given symbol."""
+        params = {"symbol": symbol, "interval": "1d"}
+        return await self._get("indicators", params, wrap="indicators", min_ttl=min_ttl)
+
+    async def get_news(self, symbol: str, min_ttl: float = 0) -> Dict:
+        """Fetch the latest news for a given stock symbol."""
+        return await self._get("news", {"symbol": symbol}, wrap="news", min_ttl=min_ttl)
+
+    async def get_similar(self, symbol: str, min_ttl: float = 0) -> Dict:
+        """Fetch similar stocks for a given symbol."""
+        return await self._get("similar", {"symbol": symbol}, wrap="similar", min_ttl=min_ttl)
+
+    async def aclose(self) -> None:
+        """Close the pooled HTTP connections"""
+        await self.http.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache hits, misses and hit rate per endpoint"""
+        stats = {}
+        for endpoint in sorted(set(self._hits) | set(self._misses)):
+            hits = self._hits.get(endpoint, 0)
+            misses = self._misses.get(endpoint, 0)
+            stats[endpoint] = {"hits": hits, "misses": misses, "hit_rate": round(hits / (hits + misses), 3)}
+        return stats
+
+    async def _get(self, endpoint: str, params: Dict[str, str], wrap: str, min_ttl: float = 0) -> Dict:
+        """GET /v1/{endpoint}, serving it from the cache while fresh"""
+        key = (endpoint, tuple(sorted(params.items())))
+        return await self._cached(endpoint, key, lambda: self._fetch(endpoint, params, wrap), min_ttl)
+
+    async def _cached(
+            self,
+            endpoint: str,
+            key: Tuple,
+            load: Callable[[], Awaitable[Any]],
+            min_ttl: float = 0,
+    ) -> Any:
+        """Serve key from the cache while fresh for min_ttl more seconds, otherwise load it once for all callers"""
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] > time.monotonic() + min_ttl:
+            self._hits[endpoint] = self._hits.get(endpoint, 0) + 1
+            return entry[1]
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            # Join an identical request that is already on its way
+            self._hits[endpoint] = self._hits.get(endpoint, 0) + 1
+        else:
+            self._misses[endpoint] = self._misses.get(endpoint, 0) + 1
+            task = asyncio.create_task(load())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._done(key, endpoint, t))
+        # Shielded so a cancelled caller does not cancel the request for everyone else
+        return await asyncio.shield(task)
+
+    def _done(self, key: Tuple, endpoint: str, task: asyncio.Task) -> None:
+        del self._in_flight[key]
+        if not task.cancelled() and task.exception() is None:
+            self._store(key, task.result(), self.ttls.get(endpoint, 0))
+
+    async def _fetch(self, endpoint: str, params: Dict[str, str], wrap: str) -> Dict:
+        start = time.perf_counter()
+        try:
+            response = await self.http.get(f"/v1/{endpoint}", params=params)
+        finally:
+            metrics.histogram(f"finance_query.{endpoint}.latency").observe(time.perf_counter() - start)
+        response.raise_for_status()
+        data = response.json()
+        if isinstance(data, list):
+            return {wrap: data}
+        return data
+
+    async def _fetch_quotes(self, symbols: List[str]) -> List[Dict]:
+        data = await self._fetch("quotes", {"symbols": ",".join(symbols)}, wrap="quotes")
+        return data.get("quotes", [])
+
+    def _store(self, key: Tuple, data: Dict, ttl: int) -> None:
+        if ttl <= 0:
+            return
+        if len(self._cache) >= self.max_entries:
+            now = time.monotonic()
+            self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+            if len(self._cache) >= self.max_entries:
+                # Still full of fresh entries, drop the ones closest to expiring
+                for k, _ in sorted(self._cache.items(), key=lambda item: item[1][0])[:self.max_entries // 10 + 1]:
+                    del self._cache[k]
+        self._cache[key] = (time.monotonic() + ttl, data)
@@ -2,13 +2,47 @@ import json
 
 import requests
 from dotenv import load_dotenv
-from elevenlabs import ElevenLabs, save
+from elevenlabs import ElevenLabs
 from s3 import S3
 from rds import RedisHandler
 from models.post import Post
 import os
 
 
+def generate_post_audio(
+        post: Post,
+        elevenlabs_client: ElevenLabs,
+        s3_client: S3,
+        redis_handler: RedisHandler,
+) -> Post:
+    """
+    Generate an MP3 for a post, upload it to S3 and save the post with its S3 key in Redis.
+
+    Args:
+        post: The post to voice
+        elevenlabs_client: ElevenLabs client used for text-to-speech
+        s3_client: S3 service the audio is uploaded to
+        redis_handler: Redis handler the updated post is saved to
+
+    Returns:
+        The post with its tts field set to the S3 key
+    """
+    generated_audio = elevenlabs_client.generate(
+        text=post.content,
+        voice="Adam",
+        model="eleven_flash_v2_5"
+    )
+    # Keep the audio in memory so concurrent workers never share a temporary file
+    file_content = b"".join(generated_audio)
+
+    # Upload MP3 to S3 and update post.tts with S3 key
+    post.tts = s3_client.upload_file(file_content, post)
+
+    # Save updated post in Redis
+    if not redis_handler.save_post(post):
+        raise Exception(f"Failed to save post {post.date} to Redis")
+    return post
+
 
 if __name__ == "__main__":
 
@@ -27,36 +61,10 @@ if __name__ == "__main__":
     for post_data in filtered_posts:
         post = Post(**post_data)
 
-        # Generate MP3 from content
-        try:
-            generated_audio = elevenlabs_client.generate(
-                text=post.content,
-                voice="Adam",
-                model="eleven_flash_v2_5"
-            )
-        except Exception as e:
-            print(f"Error generating audio for post {post.date}: {e}")
-            continue
-
-        save(generated_audio, "output.mp3")
-        with open("output.mp3", "rb") as f:
-            file_content = f.read()
-
-        #Upload MP3 to S3
         try:
-            s3_key = s3_client.upload_file(file_content, post)
+            generate_post_audio(post, elevenlabs_client, s3_client, redis_handler)
         except Exception as e:
-            print(f"Error uploading audio for post {post.date}: {e}")
+            print(f"Error processing post {post.date}: {e}")
             continue
 
-        # Update post.tts with S3 key
-        post.tts = s3_key
-
-        # Save updated post in Redis
-        try:
-            redis_handler.save_post(post)
-            #redis_handler.set(f"trump_post:{post.date}", post.dict(), expiry=30 * 24 * 60 * 60)
-        except Exception as e:
-            print(f"Error saving post {post.date} to Redis: {e}")
-
-        print("Processed: ", post.date)
\ No newline at end of file
+        print("Processed: ", post.date)
@@ -1,19 +1,26 @@
-import json
 import os
 from contextlib import asynccontextmanager
 
-import yfinance as yf
 from fastapi import FastAPI, Query, HTTPException
 from fastapi.params import Path
+from starlette.requests import Request
 from starlette.responses import StreamingResponse
 
-from agents.sentiment_agent import SentimentAgent
-from agents.supervisor_agent import SupervisorAgent
-from dependencies import RDS, S3
+from agents.registry import AgentRegistry
+from dependencies import RDS, S3, Supervisor, Sentiment, RequestTimeout, ValidTicker, Prices
+from finance_query import FinanceQuery
 from models.chatrequest import ChatRequest
 from models.historical import Period
-from models.sentiment import SentimentResponse
+from models.sentiment import SentimentResponse, BatchSentimentRequest, BatchSentimentResponse
+from price_history import PriceHistory, WINDOWS
 from rds import RedisHandler
+from tavily_search import TavilySearch
+from utils import metrics
+from utils.admission import AdmissionMiddleware
+from utils.cache import LLMCache
+from utils.llm import LLM
+from utils.streaming import cancel_on_disconnect
+from utils.warmer import CacheWarmer
 
 elevenlabs = os.getenv("ELEVENLABS_API_KEY")
 
@@ -23,14 +30,42 @@ async def lifespan(app: FastAPI):
     # Initialize dependencies
     rds = RedisHandler()
     s3 = S3()
+    llm = LLM(cache=LLMCache(rds))
+    finance = FinanceQuery()
+    agents = AgentRegistry(llm=llm, rds=rds, tavily=TavilySearch(), finance=finance)
+    prices = PriceHistory()
 
     app.state.rds = rds
     app.state.s3 = s3
+    app.state.agents = agents
+    app.state.prices = prices
+
+    # Keep the caches of the most requested tickers warm
+    warmer = CacheWarmer(
+        agents.popularity,
+        finance,
+        prices,
+        agents.sentiment,
+        interval=float(os.getenv("WARMER_INTERVAL")) if os.getenv("WARMER_INTERVAL") else None,
+        top_n=int(os.getenv("WARMER_TOP_N", "10")),
+    )
+    if os.getenv("CACHE_WARMER", "true").lower() != "false":
+        warmer.start()
 
     yield
 
+    await warmer.stop()
+    await finance.aclose()
+    rds.redis.close()
+
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(
+    AdmissionMiddleware,
+    max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", "16")),
+    data_concurrency=int(os.getenv("ADMISSION_DATA_CONCURRENCY", "8")),
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "32")),
+)
 
 
 @app.get("/")
@@ -38,6 +73,14 @@ async def root():
     return {"message": "Hello World"}
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Runtime metrics, including Gemini limiter, circuit breaker and admission queue state.
+    """
+    return metrics.snapshot()
+
+
 """
 1 day - time interval of 1 minute - 5 minutes 
 5 day - time interval of 15 minutes
@@ -46,41 +89,14 @@ async def root():
 
 
 @app.get("/price/{ticker}")
-async def get_stock_data(ticker: str, period: Period):
+async def get_stock_data(ticker: ValidTicker, period: Period, prices: Prices):
     """
     Fetch stock data for a given ticker, period, and interval.
-    Maps data by datetime timestamps in milliseconds (integer format).
+    Maps data by Unix timestamps in seconds (integer format).
     """
-    intervals = {
-        period.ONE_DAY: "5m",
-        period.FIVE_DAY: "15m",
-        period.ONE_MONTH: "1d"
-    }
-    periods = {
-        period.ONE_DAY: "1d",
-        period.FIVE_DAY: "5d",
-        period.ONE_MONTH: "1mo"
-    }
-
-    valid_periods = [period.ONE_DAY, period.FIVE_DAY, period.ONE_MONTH]
-    if period not in valid_periods:
+    if period not in WINDOWS:
         return {"error": "Invalid period"}
-
-    # get the current interval
-    interval = intervals.get(period, [])
-    period_string = periods.get(period, [])
-
-    stock = yf.Ticker(ticker)
-    data = stock.history(period=period_string, interval=interval)
-
-    # Convert the DataFrame index to Unix timestamps (milliseconds)
-    data_dict = {}
-    for idx, row in data.iterrows():
-        # Convert timestamp to seconds integer
-        timestamp = int(idx.timestamp())
-        data_dict[timestamp] = row.to_dict()
-
-    return data_dict
+    return await prices.get(ticker, period)
 
 
 @app.get("/posts/{author}")
@@ -111,45 +127,46 @@ async def get_tts(
 
 
 @app.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, supervisor: Supervisor, timeout: RequestTimeout):
     """
     Nonstreaming endpoint: yields the Markdown response as a single response
     """
-    supervisor = SupervisorAgent()
-    response = await supervisor.handle(request)
+    response = await supervisor.handle(request, timeout=timeout)
     return response
 
 
 @app.post("/chat/stream")
-async def chat_stream(request: ChatRequest):
+async def chat_stream(
+        request: ChatRequest,
+        http_request: Request,
+        supervisor: Supervisor,
+        timeout: RequestTimeout,
+        events: bool = Query(False),
+):
     """
-    Streaming endpoint: yields the Markdown response as it’s generated chunk by chunk
+    Streaming endpoint: yields the Markdown response as it’s generated chunk by chunk.
+    With events=true, yields typed server-sent events instead: the routing decision, each agent's status and
+    output as it completes, then the summary chunks.
+    Agents and LLM streams still running when the client disconnects are cancelled.
     """
-    supervisor = SupervisorAgent()
+    chunks = supervisor.handle_events(request, timeout) if events else supervisor.handle_stream(request, timeout)
     return StreamingResponse(
-        supervisor.handle_stream(request),
+        cancel_on_disconnect(http_request, chunks),
         media_type="text/event-stream"
     )
 
 
 @app.get("/sentiment/{ticker}", response_model=SentimentResponse)
-async def get_sentiment(ticker: str):
+async def get_sentiment(ticker: ValidTicker, sentiment_agent: Sentiment):
     """
     Fetch sentiment for a given ticker.
     """
-    sentiment_agent = SentimentAgent()
-    result = await sentiment_agent.invoke(ticker=ticker)
-
-    # Need to extract and parse the JSON
-    if isinstance(result, str):
-        # Remove markdown code block if present
-        result = result.strip()
-        if result.startswith("```json"):
-            result = result[7:].strip()
-        if result.endswith("```"):
-            result = result[:-3].strip()
-
-        # Parse the JSON string into a dictionary
-        result = json.loads(result)
-
-    return SentimentResponse.model_validate(result)
+    return await sentiment_agent.score(ticker=ticker)
+
+
+@app.post("/sentiment/batch", response_model=BatchSentimentResponse)
+async def get_sentiment_batch(request: BatchSentimentRequest, sentiment_agent: Sentiment):
+    """
+    Fetch sentiment for a watchlist of tickers, scoring several tickers per LLM call.
+    """
+    return await sentiment_agent.score_batch(tickers=request.tickers)
@@ -6,4 +6,6 @@ from pydantic import BaseModel
 class ChatRequest(BaseModel):
     message: str
     ticker: Optional[str] = None
-    history: List[Dict[str, str]] = []
\ No newline at end of file
+    history: List[Dict[str, str]] = []
+    # Server-side session, replaces history: the client only sends its new message
+    session_id: Optional[str] = None
\ No newline at end of file
@@ -0,0 +1,9 @@
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel
+
+
+class RoutingDecision(BaseModel):
+    agents: List[Literal['fundamentals', 'sentiment', 'trading', 'search']]
+    ticker: Optional[str]
+    question: Optional[str]
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import Dict, List
 
 
 class KeyPoint(BaseModel):
@@ -9,4 +9,22 @@ class KeyPoint(BaseModel):
 
 class SentimentResponse(BaseModel):
     sentiment_score: float
-    key_points: List[KeyPoint]
\ No newline at end of file
+    key_points: List[KeyPoint]
+
+
+class TickerSentiment(SentimentResponse):
+    ticker: str
+
+
+class SentimentBatch(BaseModel):
+    results: List[TickerSentiment]
+
+
+class BatchSentimentRequest(BaseModel):
+    tickers: List[str] = Field(min_length=1, max_length=50)
+
+
+class BatchSentimentResponse(BaseModel):
+    results: Dict[str, SentimentResponse]
+    # Tickers that could not be scored, with the reason
+    errors: Dict[str, str] = {}
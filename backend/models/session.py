@@ -0,0 +1,9 @@
+from typing import Dict, List
+
+from pydantic import BaseModel
+
+
+class ChatSession(BaseModel):
+    # Rolling summary of the turns folded out of the session
+    summary: str = ""
+    turns: List[Dict[str, str]] = []
@@ -0,0 +1,107 @@
+"""
+Post processing workers consuming the Redis post streams.
+
+Run any number of instances of each stage, on any node sharing the same REDIS_URL:
+
+    python pipeline.py scrape
+    python pipeline.py filter --consumer filter-1
+    python pipeline.py tts --consumer tts-1
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from models.post import Post
+from rds import RedisHandler
+from streams import (
+    PostStream,
+    StreamStage,
+    SCRAPED_STREAM,
+    FILTERED_STREAM,
+    DEAD_LETTER_STREAM,
+    FILTER_GROUP,
+    TTS_GROUP,
+)
+
+
+def run_scrape(rds: RedisHandler) -> None:
+    """Scrape the latest posts and publish the ones not published yet to the scraped stream"""
+    from scrapers.trump_scraper import scrape_latest_trump_posts
+
+    stream = PostStream(rds, SCRAPED_STREAM)
+    posts = scrape_latest_trump_posts()
+    published = sum(stream.publish_new(post) is not None for post in posts)
+    print(f"Published {published} new posts of {len(posts)} scraped to {SCRAPED_STREAM}")
+
+
+def run_filter(rds: RedisHandler, consumer: str) -> None:
+    """Forward finance-related posts from the scraped stream to the filtered stream"""
+    from scrapers.trump_filter import TrumpPostFilter
+
+    post_filter = TrumpPostFilter()
+    # One loop for the worker's lifetime so the async Gemini client keeps its connections
+    loop = asyncio.new_event_loop()
+
+    def handle(post: Post) -> Optional[Post]:
+        return post if loop.run_until_complete(post_filter.is_finance_related(post.content)) else None
+
+    StreamStage(
+        source=PostStream(rds, SCRAPED_STREAM),
+        group=FILTER_GROUP,
+        consumer=consumer,
+        handler=handle,
+        output=PostStream(rds, FILTERED_STREAM),
+        dead_letter=PostStream(rds, DEAD_LETTER_STREAM),
+    ).run()
+
+
+def run_tts(rds: RedisHandler, consumer: str) -> None:
+    """Generate audio for filtered posts and save them to Redis"""
+    from elevenlabs import ElevenLabs
+    from genaudio import generate_post_audio
+    from s3 import S3
+
+    elevenlabs_client = ElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"))
+    s3_client = S3()
+
+    def handle(post: Post) -> Optional[Post]:
+        return generate_post_audio(post, elevenlabs_client, s3_client, rds)
+
+    StreamStage(
+        source=PostStream(rds, FILTERED_STREAM),
+        group=TTS_GROUP,
+        consumer=consumer,
+        handler=handle,
+        dead_letter=PostStream(rds, DEAD_LETTER_STREAM),
+    ).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a post processing stage")
+    parser.add_argument("stage", choices=["scrape", "filter", "tts"])
+    parser.add_argument(
+        "--consumer",
+        default=f"{socket.gethostname()}-{os.getpid()}",
+        help="Consumer name, unique within the stage's group",
+    )
+    parser.add_argument("--redis-url", default=None, help="Defaults to REDIS_URL")
+    args = parser.parse_args()
+
+    rds = RedisHandler(args.redis_url)
+    if args.stage == "scrape":
+        run_scrape(rds)
+    elif args.stage == "filter":
+        run_filter(rds, args.consumer)
+    elif args.stage == "tts":
+        run_tts(rds, args.consumer)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,97 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from models.historical import Period
+from utils import metrics
+
+# yfinance period and interval of each chart window
+WINDOWS: Dict[Period, Tuple[str, str]] = {
+    Period.ONE_DAY: ("1d", "5m"),
+    Period.FIVE_DAY: ("5d", "15m"),
+    Period.ONE_MONTH: ("1mo", "1d"),
+}
+
+# Seconds a window is cached for, about one bar of its interval
+DEFAULT_TTLS: Dict[Period, int] = {
+    Period.ONE_DAY: 5 * 60,
+    Period.FIVE_DAY: 15 * 60,
+    Period.ONE_MONTH: 60 * 60,
+}
+
+
+class PriceHistory:
+    """
+    Cached price history from yfinance, for the /price charts.
+
+    Downloads run in a worker thread, so they never block the event loop, and concurrent requests for the same
+    uncached window share one download.
+
+    Usage:
+        prices = PriceHistory()
+        bars = await prices.get("AAPL", Period.ONE_DAY)
+    """
+
+    def __init__(self, ttls: Optional[Dict[Period, int]] = None, max_entries: int = 512):
+        """
+        Args:
+            ttls: Seconds to cache each window for
+            max_entries: Maximum number of cached windows
+        """
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.max_entries = max_entries
+        self._cache: Dict[Tuple[str, Period], Tuple[float, Dict[int, Dict[str, Any]]]] = {}
+        self._in_flight: Dict[Tuple[str, Period], asyncio.Task] = {}
+
+    async def get(self, ticker: str, period: Period, min_ttl: float = 0) -> Dict[int, Dict[str, Any]]:
+        """
+        Bars of a ticker over a chart window, served from the cache while fresh.
+
+        Args:
+            ticker: Stock symbol
+            period: Chart window
+            min_ttl: Seconds the cached window must stay fresh for to be served, to refresh ahead of expiry
+
+        Returns:
+            Each bar's open, high, low, close and volume by Unix timestamp in seconds
+        """
+        key = (ticker.upper(), period)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] > time.monotonic() + min_ttl:
+            metrics.counter("prices.cache.hits").inc()
+            return entry[1]
+
+        metrics.counter("prices.cache.misses").inc()
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(asyncio.to_thread(self._download, *key))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        # Shielded so a cancelled caller does not cancel the download for everyone else
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _download(ticker: str, period: Period) -> Dict[int, Dict[str, Any]]:
+        # yfinance pulls in pandas, only load it once prices are requested
+        import yfinance as yf
+
+        period_string, interval = WINDOWS[period]
+        start = time.perf_counter()
+        data = yf.Ticker(ticker).history(period=period_string, interval=interval)
+        metrics.histogram("prices.download.latency").observe(time.perf_counter() - start)
+
+        # Convert the DataFrame index to Unix timestamps (seconds)
+        return {int(idx.timestamp()): row.to_dict() for idx, row in data.iterrows()}
+
+    def _done(self, key: Tuple[str, Period], task: asyncio.Task) -> None:
+        del self._in_flight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        if len(self._cache) >= self.max_entries:
+            now = time.monotonic()
+            self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+            if len(self._cache) >= self.max_entries:
+                # Still full of fresh entries, drop the ones closest to expiring
+                for k, _ in sorted(self._cache.items(), key=lambda item: item[1][0])[:self.max_entries // 10 + 1]:
+                    del self._cache[k]
+        self._cache[key] = (time.monotonic() + self.ttls.get(key[1], 0), task.result())
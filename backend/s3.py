@@ -1,7 +1,5 @@
 import os
 
-import boto3
-from botocore.config import Config
 from dotenv import load_dotenv
 
 from models.post import Post
@@ -11,14 +9,24 @@ class S3:
     def __init__(self, bucket: str = "ramhack"):
         load_dotenv()
         self.bucket = bucket
-        self.client = boto3.client(
-            's3',
-            region_name='us-east-2',
-            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-            endpoint_url='https://s3.us-east-2.amazonaws.com',
-            config=Config(signature_version='s3v4')
-        )
+        self._client = None
+
+    @property
+    def client(self):
+        """boto3 S3 client, created on first use to keep boto3 out of startup"""
+        if self._client is None:
+            import boto3
+            from botocore.config import Config
+
+            self._client = boto3.client(
+                's3',
+                region_name='us-east-2',
+                aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+                endpoint_url='https://s3.us-east-2.amazonaws.com',
+                config=Config(signature_version='s3v4')
+            )
+        return self._client
 
     def upload_file(self, file: bytes, post: Post) -> str:
         """
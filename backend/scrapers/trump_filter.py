@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 from typing import List, Dict, Any
@@ -56,7 +57,7 @@ class TrumpPostFilter:
         wait=wait_fixed(30),
         stop=stop_after_attempt(2)
     )
-    def is_finance_related(self, post_content: str) -> bool:
+    async def is_finance_related(self, post_content: str) -> bool:
         """
         Check if post is related to finance, economics, or stocks
         """
@@ -89,15 +90,16 @@ class TrumpPostFilter:
 
         Return false for general economic topics that don't specifically mention stock markets or tariffs.
         """
-        response = self.llm.generate_structured(
+        response = await self.llm.generate_structured(
             system=system_prompt,
             prompt=user_prompt,
-            output=RelevanceResponse
+            output=RelevanceResponse,
+            call_site="filter",
         )
         return response.is_relevant
 
 
-    def filter_posts(self) -> List[Dict[str, Any]]:
+    async def filter_posts(self) -> List[Dict[str, Any]]:
         """Filter posts for financial/economic content"""
         posts = self.load_posts()
         if not posts:
@@ -117,7 +119,7 @@ class TrumpPostFilter:
             print(f"Analyzing post {i + 1}/{total_posts}: {content[:50]}...")
 
             try:
-                is_relevant = self.is_finance_related(content)
+                is_relevant = await self.is_finance_related(content)
 
                 if is_relevant:
                     print(f"✓ RELEVANT: {content[:100]}...")
@@ -144,7 +146,7 @@ class TrumpPostFilter:
 
 def main():
     filter = TrumpPostFilter()
-    filtered_posts = filter.filter_posts()
+    filtered_posts = asyncio.run(filter.filter_posts())
     filter.save_filtered_posts(filtered_posts)
     print(f"Found {len(filtered_posts)} posts related to finance/economics")
 
@@ -0,0 +1,220 @@
+import logging
+import time
+from typing import Callable, List, Optional, Tuple
+
+from redis.exceptions import ResponseError
+
+from models.post import Post
+from rds import RedisHandler
+
+# Stream names for each stage of post processing
+SCRAPED_STREAM = "posts:scraped"
+FILTERED_STREAM = "posts:filtered"
+DEAD_LETTER_STREAM = "posts:dead"
+
+# Consumer group names for each processing stage
+FILTER_GROUP = "filter"
+TTS_GROUP = "tts"
+
+
+class PostStream:
+    """
+    Redis Stream of posts shared by every processing instance.
+
+    Posts are appended with XADD and read through consumer groups, so each entry is delivered to exactly one
+    consumer of a group. Entries stay pending until acknowledged and can be claimed by another consumer when
+    their owner crashes.
+
+    Usage:
+        stream = PostStream(RedisHandler("redis://localhost:6379"), SCRAPED_STREAM)
+        stream.publish(post)
+    """
+
+    def __init__(self, rds: RedisHandler, name: str = SCRAPED_STREAM, maxlen: int = 10_000):
+        """
+        Args:
+            rds: Redis handler that owns the connection
+            name: The stream key
+            maxlen: Approximate cap on the number of entries kept in the stream
+        """
+        self.rds = rds
+        self.redis = rds.redis
+        self.name = name
+        self.maxlen = maxlen
+        self.logger = logging.getLogger(__name__)
+
+    def publish(self, post: Post) -> str:
+        """Append a post to the stream and return its entry id"""
+        entry_id = self.redis.xadd(
+            self.name,
+            {"post": post.model_dump_json()},
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+        return _decode(entry_id)
+
+    def publish_new(self, post: Post, ttl: int = 60 * 24 * 60 * 60) -> Optional[str]:
+        """
+        Append a post unless it was already published to this stream, so repeated scrapes of the same window
+        publish each post once. A marker per post is set with SET NX and kept for ttl seconds, which must exceed
+        the time a post can be scraped again.
+
+        Returns:
+            The entry id, or None if the post was published before
+        """
+        marker = f"{self.name}:published:{post.author}:{post.date}"
+        if not self.redis.set(marker, 1, nx=True, ex=ttl):
+            return None
+        try:
+            return self.publish(post)
+        except Exception:
+            # Let the next scrape publish it
+            self.redis.delete(marker)
+            raise
+
+    def ensure_group(self, group: str) -> None:
+        """Create the consumer group (and the stream) if it does not exist yet"""
+        try:
+            self.redis.xgroup_create(self.name, group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def read(self, group: str, consumer: str, count: int = 10, block_ms: int = 5000) -> List[Tuple[str, Post]]:
+        """Read entries never delivered to any consumer of the group"""
+        response = self.redis.xreadgroup(group, consumer, {self.name: ">"}, count=count, block=block_ms)
+        if not response:
+            return []
+        _, entries = response[0]
+        return self._parse(group, entries)
+
+    def claim_stale(self, group: str, consumer: str, min_idle_ms: int, count: int = 10) -> List[Tuple[str, Post]]:
+        """
+        Take over entries another consumer read but did not acknowledge within min_idle_ms.
+
+        Returns:
+            The claimed entries, now owned by this consumer
+        """
+        response = self.redis.xautoclaim(self.name, group, consumer, min_idle_time=min_idle_ms, count=count)
+        return self._parse(group, response[1])
+
+    def delivery_count(self, group: str, entry_id: str) -> int:
+        """Number of times an entry has been delivered to the group's consumers"""
+        pending = self.redis.xpending_range(self.name, group, min=entry_id, max=entry_id, count=1)
+        if not pending:
+            return 0
+        return pending[0]["times_delivered"]
+
+    def ack(self, group: str, entry_id: str) -> None:
+        """Acknowledge an entry so it leaves the group's pending list"""
+        self.redis.xack(self.name, group, entry_id)
+
+    def _parse(self, group: str, entries) -> List[Tuple[str, Post]]:
+        posts = []
+        for entry_id, fields in entries:
+            entry_id = _decode(entry_id)
+            try:
+                post = Post.model_validate_json(fields[b"post"])
+            except Exception as e:
+                # A malformed entry can never succeed, so drop it instead of redelivering it forever
+                self.logger.error(f"Dropping malformed entry {entry_id} from {self.name}: {e}")
+                self.ack(group, entry_id)
+                continue
+            posts.append((entry_id, post))
+        return posts
+
+
+class StreamStage:
+    """
+    A processing stage that consumes one stream through a consumer group.
+
+    Each post is passed to the handler. A returned post is published to the output stream, if any, and the entry
+    is acknowledged. When the handler raises, the entry stays pending and is retried once it has been idle for
+    claim_idle_ms, either by this consumer or by any other instance. Entries that fail max_deliveries times are
+    moved to the dead-letter stream.
+    """
+
+    def __init__(
+            self,
+            source: PostStream,
+            group: str,
+            consumer: str,
+            handler: Callable[[Post], Optional[Post]],
+            output: Optional[PostStream] = None,
+            dead_letter: Optional[PostStream] = None,
+            batch_size: int = 10,
+            block_ms: int = 5000,
+            claim_idle_ms: int = 60_000,
+            max_deliveries: int = 5,
+    ):
+        """
+        Args:
+            source: Stream to consume
+            group: Consumer group shared by every instance of this stage
+            consumer: Name of this consumer, unique within the group
+            handler: Processes a post, returning the post to forward or None to drop it
+            output: Optional stream receiving the handler's results
+            dead_letter: Optional stream receiving posts that exceeded max_deliveries
+            batch_size: Maximum entries read or claimed per call
+            block_ms: How long a read blocks waiting for new entries
+            claim_idle_ms: Idle time after which another consumer's pending entry may be claimed
+            max_deliveries: Deliveries allowed before an entry is dead-lettered
+        """
+        self.source = source
+        self.group = group
+        self.consumer = consumer
+        self.handler = handler
+        self.output = output
+        self.dead_letter = dead_letter
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self.max_deliveries = max_deliveries
+        self.logger = logging.getLogger(__name__)
+
+        self.source.ensure_group(self.group)
+
+    def run_once(self) -> int:
+        """
+        Process one batch, preferring stale pending entries over new ones.
+
+        Returns:
+            The number of entries processed
+        """
+        entries = self.source.claim_stale(self.group, self.consumer, self.claim_idle_ms, self.batch_size)
+        if not entries:
+            entries = self.source.read(self.group, self.consumer, self.batch_size, self.block_ms)
+
+        for entry_id, post in entries:
+            self._process(entry_id, post)
+        return len(entries)
+
+    def run(self, stop: Optional[Callable[[], bool]] = None) -> None:
+        """Process entries until stop() returns True (forever by default)"""
+        self.logger.info(f"Consumer {self.consumer} of group {self.group} reading {self.source.name}")
+        while not (stop and stop()):
+            try:
+                self.run_once()
+            except Exception as e:
+                self.logger.error(f"Error reading {self.source.name}: {e}")
+                time.sleep(1)
+
+    def _process(self, entry_id: str, post: Post) -> None:
+        try:
+            result = self.handler(post)
+        except Exception as e:
+            self.logger.error(f"Error processing post {post.date} ({entry_id}) in {self.group}: {e}")
+            if self.source.delivery_count(self.group, entry_id) >= self.max_deliveries:
+                self.logger.error(f"Post {post.date} failed {self.max_deliveries} times, dead-lettering")
+                if self.dead_letter:
+                    self.dead_letter.publish(post)
+                self.source.ack(self.group, entry_id)
+            return
+
+        if result is not None and self.output:
+            self.output.publish(result)
+        self.source.ack(self.group, entry_id)
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
@@ -2,7 +2,6 @@ import os
 from typing import Literal, Optional, Union, Sequence
 
 from dotenv import load_dotenv
-from tavily import TavilyClient
 
 
 class TavilySearch:
@@ -17,7 +16,16 @@ class TavilySearch:
     def __init__(self):
         load_dotenv()
         self.api_key = os.getenv("TAVILY_API_KEY")
-        self.client = TavilyClient(api_key=self.api_key)
+        self._client = None
+
+    @property
+    def client(self):
+        """Tavily client, created on first search to keep the SDK out of startup"""
+        if self._client is None:
+            from tavily import TavilyClient
+
+            self._client = TavilyClient(api_key=self.api_key)
+        return self._client
 
     def search(
             self,
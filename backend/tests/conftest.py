@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Tests import the backend modules the way the app does, from the backend directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Clients only validate that credentials exist when constructed
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("TAVILY_API_KEY", "test")
@@ -0,0 +1,129 @@
+import asyncio
+from typing import Dict, List
+
+from utils import metrics
+from utils.admission import AdmissionMiddleware, RouteClass
+
+
+class FakeApp:
+    """ASGI app whose /chat responses hold their slot, like a stream, until release is set"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.started: Dict[str, int] = {}
+
+    async def __call__(self, scope, receive, send) -> None:
+        path = scope["path"]
+        self.started[path] = self.started.get(path, 0) + 1
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        if path.startswith("/chat"):
+            await self.release.wait()
+        await send({"type": "http.response.body", "body": path.encode()})
+
+
+async def request(app: AdmissionMiddleware, path: str) -> List[dict]:
+    """Send a GET through the middleware, returning the ASGI messages of the response"""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": [], "query_string": b""}
+    await app(scope, receive, send)
+    return messages
+
+
+def status(messages: List[dict]) -> int:
+    return messages[0]["status"]
+
+
+async def hold_chat_slots(app: AdmissionMiddleware, count: int) -> List[asyncio.Task]:
+    """Chat requests holding every slot they got until the fake app's release is set"""
+    tasks = [asyncio.create_task(request(app, "/chat")) for _ in range(count)]
+    await asyncio.sleep(0.01)
+    return tasks
+
+
+def test_unclassified_paths_are_not_limited():
+    async def main():
+        fake = FakeApp()
+        app = AdmissionMiddleware(fake, max_concurrency=1, max_queue=0)
+        chats = await hold_chat_slots(app, 1)
+        response = await asyncio.wait_for(request(app, "/"), timeout=1)
+        fake.release.set()
+        await asyncio.gather(*chats)
+        return response
+
+    assert status(asyncio.run(main())) == 200
+
+
+def test_data_requests_are_served_while_chat_streams_hold_every_slot():
+    async def main():
+        fake = FakeApp()
+        app = AdmissionMiddleware(fake, max_concurrency=2, data_concurrency=1)
+        chats = await hold_chat_slots(app, 3)
+        response = await asyncio.wait_for(request(app, "/price/AAPL"), timeout=1)
+        snapshot = app.snapshot()
+        fake.release.set()
+        await asyncio.gather(*chats)
+        return response, snapshot, app.snapshot()
+
+    response, busy, idle = asyncio.run(main())
+    assert status(response) == 200
+    assert busy["pools"]["llm"]["in_flight"] == 2
+    assert busy["queued"] == 1
+    assert idle["in_flight"] == idle["queued"] == 0
+
+
+def test_request_arriving_to_a_full_queue_is_shed():
+    shed = metrics.counter("admission.chat.shed").snapshot()
+
+    async def main():
+        fake = FakeApp()
+        app = AdmissionMiddleware(fake, max_concurrency=1, max_queue=1)
+        chats = await hold_chat_slots(app, 2)
+        response = await request(app, "/chat")
+        fake.release.set()
+        await asyncio.gather(*chats)
+        return response, app.snapshot(), fake.started
+
+    response, snapshot, started = asyncio.run(main())
+    assert status(response) == 503
+    assert (b"retry-after", b"5") in response[0]["headers"]
+    assert snapshot["rejected"] == {"chat": 1}
+    assert started == {"/chat": 2}
+    assert metrics.counter("admission.chat.shed").snapshot() - shed == 1
+
+
+def test_request_waiting_too_long_is_shed():
+    impatient = RouteClass("chat", priority=2, max_wait=0.05)
+
+    async def main():
+        fake = FakeApp()
+        app = AdmissionMiddleware(fake, max_concurrency=1, routes=[("/chat", impatient)])
+        chats = await hold_chat_slots(app, 1)
+        response = await request(app, "/chat")
+        fake.release.set()
+        await asyncio.gather(*chats)
+        return response, app.snapshot()
+
+    response, snapshot = asyncio.run(main())
+    assert status(response) == 503
+    assert snapshot["queued"] == 0
+
+
+def test_shed_requests_are_logged_at_most_once_per_interval(caplog):
+    async def main():
+        fake = FakeApp()
+        app = AdmissionMiddleware(fake, max_concurrency=1, max_queue=1, log_interval=60)
+        chats = await hold_chat_slots(app, 2)
+        statuses = [status(await request(app, "/chat")) for _ in range(5)]
+        fake.release.set()
+        await asyncio.gather(*chats)
+        return statuses
+
+    assert asyncio.run(main()) == [503] * 5
+    assert len([record for record in caplog.records if record.message.startswith("Shed")]) == 1
@@ -0,0 +1,167 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from utils import llm as llm_module
+from utils import metrics
+from utils.limits import CircuitOpenError, PriorityLimiter
+from utils.llm import GEMINI_LIMITER, LLM, CallPolicy
+
+
+class FakeModels:
+    """Gemini models API answering with the model name, after a delay and with failures per model"""
+
+    def __init__(self, delays=None, failures=()):
+        self.delays = delays or {}
+        self.failures = set(failures)
+        self.calls = []
+        self.cancelled = []
+
+    async def generate_content(self, model, contents, config):
+        self.calls.append(model)
+        try:
+            await asyncio.sleep(self.delays.get(model, 0))
+        except asyncio.CancelledError:
+            self.cancelled.append(model)
+            raise
+        if model in self.failures:
+            raise RuntimeError(f"{model} failed")
+        return SimpleNamespace(text=model)
+
+
+@pytest.fixture(autouse=True)
+def breakers(monkeypatch):
+    # Circuit breakers are process-wide, start every test with closed circuits
+    monkeypatch.setattr(llm_module, "_breakers", {})
+
+
+def make_llm(models: FakeModels, **policy) -> LLM:
+    client = SimpleNamespace(aio=SimpleNamespace(models=models))
+    return LLM(model_name="primary", client=client, policies={"site": CallPolicy(**policy)})
+
+
+def generate(llm: LLM, call_site: str = "site") -> str:
+    return asyncio.run(llm.generate("system", "prompt", call_site=call_site, use_cache=False))
+
+
+def test_call_site_without_policy_only_tries_primary():
+    models = FakeModels(failures={"primary"})
+    llm = make_llm(models, fallback_models=["fallback"])
+
+    with pytest.raises(RuntimeError):
+        generate(llm, call_site="other")
+    assert models.calls == ["primary"]
+
+
+def test_falls_back_when_primary_errors():
+    models = FakeModels(failures={"primary"})
+    llm = make_llm(models, fallback_models=["fallback"])
+
+    assert generate(llm) == "fallback"
+    assert models.calls == ["primary", "fallback"]
+
+
+def test_last_error_is_raised_when_every_model_fails():
+    models = FakeModels(failures={"primary", "fallback"})
+    llm = make_llm(models, fallback_models=["fallback"])
+
+    with pytest.raises(RuntimeError, match="fallback failed"):
+        generate(llm)
+
+
+def test_falls_back_when_primary_times_out():
+    models = FakeModels(delays={"primary": 1})
+    llm = make_llm(models, timeout=0.05, fallback_models=["fallback"])
+
+    assert generate(llm) == "fallback"
+    assert models.cancelled == ["primary"]
+    assert llm_module.circuit_breaker("primary").snapshot()["error_rate"] == 1.0
+
+
+def test_hedge_wins_over_slow_request():
+    models = FakeModels()
+    delays = iter([1, 0])
+
+    async def generate_content(model, contents, config):
+        models.delays = {model: next(delays)}
+        return await FakeModels.generate_content(models, model, contents, config)
+
+    models.generate_content = generate_content
+    llm = make_llm(models, timeout=5, hedge_after=0.05)
+
+    assert generate(llm) == "primary"
+    assert models.calls == ["primary", "primary"]
+    # The slow original lost and was cancelled
+    assert models.cancelled == ["primary"]
+
+
+def test_no_hedge_when_request_is_fast():
+    models = FakeModels()
+    llm = make_llm(models, timeout=5, hedge_after=0.5)
+
+    assert generate(llm) == "primary"
+    assert models.calls == ["primary"]
+
+
+def test_open_circuit_fails_fast_to_fallback():
+    models = FakeModels()
+    llm = make_llm(models, fallback_models=["fallback"])
+    breaker = llm_module.circuit_breaker("primary")
+    for _ in range(breaker.min_calls):
+        breaker.record_failure()
+
+    assert generate(llm) == "fallback"
+    assert models.calls == ["fallback"]
+    with pytest.raises(CircuitOpenError):
+        generate(make_llm(models))
+
+
+def test_limiter_slots_are_released():
+    models = FakeModels(delays={"primary": 1}, failures={"fallback"})
+    llm = make_llm(models, timeout=0.05, hedge_after=0.01, fallback_models=["fallback"])
+
+    with pytest.raises(RuntimeError):
+        generate(llm)
+    assert generate(make_llm(FakeModels())) == "primary"
+    assert GEMINI_LIMITER.in_flight == 0
+
+
+def test_queueing_for_a_slot_does_not_count_against_gemini(monkeypatch):
+    # One slot, held by a slow call while the routing calls queue behind it
+    monkeypatch.setattr(llm_module, "GEMINI_LIMITER", PriorityLimiter(1))
+    models = FakeModels(delays={"slow": 0.3})
+    slow = LLM(model_name="slow", client=SimpleNamespace(aio=SimpleNamespace(models=models)), policies={})
+    fast = make_llm(models, timeout=0.1, hedge_after=0.02)
+
+    async def main():
+        slow_call = asyncio.create_task(slow.generate("system", "prompt", use_cache=False))
+        await asyncio.sleep(0.01)
+        results = await asyncio.gather(*(
+            fast.generate("system", "prompt", call_site="site", use_cache=False) for _ in range(5)
+        ))
+        await slow_call
+        return results
+
+    assert asyncio.run(main()) == ["primary"] * 5
+    # Nothing was hedged into the saturated limiter, and the breaker saw no failure
+    assert models.calls.count("primary") == 5
+    assert llm_module.circuit_breaker("primary").snapshot()["error_rate"] == 0
+    assert llm_module.GEMINI_LIMITER.in_flight == 0
+
+
+def test_hedge_skipped_while_calls_are_queueing(monkeypatch):
+    monkeypatch.setattr(llm_module, "GEMINI_LIMITER", PriorityLimiter(2))
+    models = FakeModels(delays={"primary": 0.1})
+    llm = make_llm(models, timeout=5, hedge_after=0.02)
+    skipped = metrics.counter("llm.hedges_skipped").snapshot()
+
+    async def main():
+        return await asyncio.gather(*(
+            llm.generate("system", "prompt", call_site="site", use_cache=False) for _ in range(3)
+        ))
+
+    assert asyncio.run(main()) == ["primary"] * 3
+    # The first two calls held both slots while the third queued, neither was hedged
+    assert metrics.counter("llm.hedges_skipped").snapshot() - skipped == 2
+    assert llm_module.GEMINI_LIMITER.in_flight == 0
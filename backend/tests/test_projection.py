@@ -0,0 +1,64 @@
+from utils.projection import TokenBudget, project_quotes, project_technicals
+
+# Shape of finance-query's /v1/indicators?symbol=AAPL&interval=1d summary, as wrapped by FinanceQuery
+INDICATORS = {"indicators": {
+    "SMA(10)": {"SMA": 228.0512},
+    "SMA(50)": {"SMA": 221.3377},
+    "EMA(10)": {"EMA": 228.5139},
+    "RSI(14)": {"RSI": 56.2311},
+    "Stoch %K(14,3,3)": {"%K": 76.8245, "%D": 71.2034},
+    "MACD(12,26)": {"MACD": 1.4521, "Signal": 0.9837},
+    "BBands(20,2)": {"Upper Band": 233.3012, "Lower Band": 220.9188},
+    "Super Trend": {"Super Trend": 219.5061, "Trend": "UP"},
+}}
+
+
+def test_indicator_summary_keeps_every_indicator():
+    projected = project_technicals(INDICATORS)
+
+    assert set(projected["indicators"]) == set(INDICATORS["indicators"])
+    assert projected["indicators"]["MACD(12,26)"] == {"MACD": 1.45, "Signal": 0.98}
+    assert projected["indicators"]["Super Trend"] == {"Super Trend": 219.51, "Trend": "UP"}
+
+
+def test_list_of_indicators_keeps_every_indicator():
+    result = {"indicators": [
+        {"indicator": name, **values} for name, values in INDICATORS["indicators"].items()
+    ]}
+
+    projected = project_technicals(result)
+
+    assert [item["indicator"] for item in projected["indicators"]] == list(INDICATORS["indicators"])
+    assert projected["indicators"][3] == {"indicator": "RSI(14)", "RSI": 56.23}
+
+
+def test_time_series_keep_their_latest_value():
+    result = {"indicators": {
+        "RSI(14)": [55.1234, 56.2311],
+        "SMA(10)": [
+            {"date": "2025-05-01", "value": 227.1},
+            {"date": "2025-05-02", "value": 228.0512},
+        ],
+    }}
+
+    assert project_technicals(result) == {"indicators": {
+        "RSI(14)": 56.23,
+        "SMA(10)": {"date": "2025-05-02", "value": 228.05},
+    }}
+
+
+def test_budget_projects_and_counts_saved_tokens():
+    quote = {"symbol": "AAPL", "price": 228.5, "logo": "https://example.com/aapl.png" * 20, "about": "x" * 2000}
+    budget = TokenBudget(1000)
+
+    result = budget.fit("get_quotes", {"quotes": [quote]})
+
+    assert result == project_quotes({"quotes": [quote]}) == {"quotes": [{"symbol": "AAPL", "price": 228.5}]}
+    assert budget.saved > 0
+    assert 0 < budget.used < 1000
+
+
+def test_unprojectable_result_is_passed_through():
+    budget = TokenBudget(None)
+
+    assert budget.fit("get_quotes", {"quotes": None}) == {"quotes": None}
@@ -0,0 +1,90 @@
+import asyncio
+import gc
+
+import httpx
+import pytest
+
+from finance_query import QuoteLoader
+
+
+class FakeQuotes:
+    """Multi-symbol quotes endpoint recording each request, failing with the given error for bad symbols"""
+
+    def __init__(self, bad=(), error=None):
+        self.bad = set(bad)
+        self.error = error
+        self.requests = []
+
+    async def __call__(self, symbols):
+        self.requests.append(sorted(symbols))
+        await asyncio.sleep(0)
+        if self.error and (not self.bad or self.bad & set(symbols)):
+            raise self.error
+        return [{"symbol": symbol, "price": 1.0} for symbol in symbols if symbol not in self.bad]
+
+
+def http_error(status: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "https://finance-query.test/v1/quotes")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status, request=request))
+
+
+def load_all(loader: QuoteLoader, symbols):
+    async def main():
+        return await asyncio.gather(*(loader.load(symbol) for symbol in symbols), return_exceptions=True)
+
+    return asyncio.run(main())
+
+
+def test_concurrent_loads_share_one_request():
+    fetch = FakeQuotes()
+    results = load_all(QuoteLoader(fetch), ["aapl", "MSFT", "AAPL"])
+
+    assert fetch.requests == [["AAPL", "MSFT"]]
+    assert [quote["symbol"] for quote in results] == ["AAPL", "MSFT", "AAPL"]
+
+
+def test_full_batch_is_sent_without_waiting():
+    fetch = FakeQuotes()
+    load_all(QuoteLoader(fetch, window=10, max_batch_size=2), ["A", "B", "C", "D"])
+
+    assert fetch.requests == [["A", "B"], ["C", "D"]]
+
+
+def test_missing_symbol_only_fails_its_callers():
+    fetch = FakeQuotes(bad={"NOPE"})
+    aapl, nope = load_all(QuoteLoader(fetch), ["AAPL", "NOPE"])
+
+    assert aapl["symbol"] == "AAPL"
+    assert isinstance(nope, LookupError)
+    assert len(fetch.requests) == 1
+
+
+def test_client_error_retries_each_symbol():
+    fetch = FakeQuotes(bad={"NOPE"}, error=http_error(404))
+    aapl, nope = load_all(QuoteLoader(fetch), ["AAPL", "NOPE"])
+
+    assert aapl["symbol"] == "AAPL"
+    assert isinstance(nope, httpx.HTTPStatusError)
+    assert fetch.requests == [["AAPL", "NOPE"], ["AAPL"], ["NOPE"]]
+
+
+@pytest.mark.parametrize("error", [http_error(503), httpx.ReadTimeout("timeout")])
+def test_upstream_failure_fails_the_whole_batch(error):
+    fetch = FakeQuotes(error=error)
+    results = load_all(QuoteLoader(fetch), ["AAPL", "MSFT"])
+
+    assert all(result is error for result in results)
+    assert fetch.requests == [["AAPL", "MSFT"]]
+
+
+def test_running_batch_survives_garbage_collection():
+    async def fetch(symbols):
+        gc.collect()
+        await asyncio.sleep(0.01)
+        gc.collect()
+        return [{"symbol": symbol} for symbol in symbols]
+
+    async def main():
+        return await asyncio.wait_for(QuoteLoader(fetch).load("AAPL"), timeout=1)
+
+    assert asyncio.run(main()) == {"symbol": "AAPL"}
@@ -0,0 +1,179 @@
+import asyncio
+
+import pytest
+
+from utils.request_context import RequestContext, current, memoized, prefetched, time_left
+
+
+class Calls:
+    """Counts the calls of a tool answering after a delay, failing while fail is set"""
+
+    def __init__(self, delay: float = 0.01, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.count = 0
+        self.cancelled = 0
+
+    async def __call__(self, symbol: str = "AAPL"):
+        self.count += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError("boom")
+        return {"symbol": symbol}
+
+
+def test_identical_calls_share_one_result():
+    calls = Calls()
+
+    async def main():
+        context = RequestContext()
+        results = await asyncio.gather(
+            *(context.memoize("get_quotes", {"symbol": "AAPL"}, calls) for _ in range(3)),
+            context.memoize("get_quotes", {"symbol": "MSFT"}, lambda: calls("MSFT")),
+        )
+        return results, context
+
+    results, context = asyncio.run(main())
+    assert results == [{"symbol": "AAPL"}] * 3 + [{"symbol": "MSFT"}]
+    assert calls.count == 2
+    assert (context.hits, context.misses) == (2, 2)
+
+
+def test_failures_are_not_memoized():
+    calls = Calls(fail=True)
+
+    async def main():
+        context = RequestContext()
+        with pytest.raises(RuntimeError):
+            await context.memoize("get_quotes", {"symbol": "AAPL"}, calls)
+        calls.fail = False
+        return await context.memoize("get_quotes", {"symbol": "AAPL"}, calls)
+
+    assert asyncio.run(main()) == {"symbol": "AAPL"}
+    assert calls.count == 2
+
+
+def test_memoized_uses_the_current_context_only():
+    calls = Calls()
+
+    async def agent():
+        assert current() is not None
+        return await memoized("get_quotes", {"symbol": "AAPL"}, calls)
+
+    async def main():
+        context = RequestContext()
+        await asyncio.gather(context.run(agent()), context.run(agent()))
+        # Outside of a request every call runs
+        await memoized("get_quotes", {"symbol": "AAPL"}, calls)
+        assert current() is None
+
+    asyncio.run(main())
+    assert calls.count == 2
+
+
+def test_prefetch_seeds_the_memo():
+    calls = Calls()
+
+    async def main():
+        context = RequestContext()
+        context.prefetch("get_quotes", {"symbol": "AAPL"}, calls)
+        context.prefetch("get_news", {"symbol": "AAPL"}, Calls(fail=True))
+        ready = await context.run(prefetched(["get_quotes", "get_news"]))
+        result = await context.memoize("get_quotes", {"symbol": "AAPL"}, calls)
+        return ready, result
+
+    ready, result = asyncio.run(main())
+    assert ready == [("get_quotes", {"symbol": "AAPL"}, {"symbol": "AAPL"})]
+    assert result == {"symbol": "AAPL"}
+    assert calls.count == 1
+
+
+def test_unneeded_prefetches_are_cancelled():
+    quotes, news = Calls(delay=1), Calls(delay=1)
+
+    async def main():
+        context = RequestContext()
+        context.prefetch("get_quotes", {"symbol": "AAPL"}, quotes)
+        context.prefetch("get_news", {"symbol": "AAPL"}, news)
+        await asyncio.sleep(0)
+        cancelled = context.cancel_prefetches(lambda tool, args: tool == "get_quotes")
+        await asyncio.sleep(0)
+        return cancelled, await context.prefetched(["get_quotes", "get_news"])
+
+    cancelled, ready = asyncio.run(main())
+    assert cancelled == 1
+    assert news.cancelled == 1
+    assert [tool for tool, _, _ in ready] == ["get_quotes"]
+
+
+def test_close_cancels_running_calls():
+    calls = Calls(delay=1)
+
+    async def main():
+        context = RequestContext()
+        waiter = asyncio.create_task(context.memoize("get_quotes", {"symbol": "AAPL"}, calls))
+        context.prefetch("get_news", {"symbol": "AAPL"}, calls)
+        await asyncio.sleep(0.01)
+        # The caller gave up, the shielded call would otherwise keep running
+        waiter.cancel()
+        cancelled = context.close()
+        await asyncio.sleep(0)
+        return cancelled
+
+    assert asyncio.run(main()) == 2
+    assert calls.cancelled == 2
+
+
+def test_deadline_bounds_time_left():
+    async def left(limit):
+        return time_left(limit)
+
+    async def main():
+        return await left(5), await RequestContext(timeout=10).run(left(30)), await RequestContext().run(left(30))
+
+    outside, bounded, unbounded = asyncio.run(main())
+    assert outside == 5
+    assert 9 < bounded <= 10
+    assert unbounded == 30
+
+
+def test_run_stream_times_out_at_the_deadline():
+    async def chunks():
+        yield "first"
+        await asyncio.sleep(1)
+        yield "never"
+
+    async def main():
+        received = []
+        with pytest.raises(asyncio.TimeoutError):
+            async for chunk in RequestContext(timeout=0.05).run_stream(chunks()):
+                received.append(chunk)
+        return received
+
+    assert asyncio.run(main()) == ["first"]
+
+
+def test_run_stream_cleans_up_before_returning():
+    cleaned = []
+
+    async def chunks():
+        try:
+            yield current() is not None
+            await asyncio.sleep(1)
+            yield "never"
+        finally:
+            await asyncio.sleep(0.01)
+            cleaned.append(True)
+
+    async def main():
+        stream = RequestContext().run_stream(chunks())
+        first = await stream.__anext__()
+        await stream.aclose()
+        # The wrapped stream ran inside the context, but the context did not leak out
+        return first, list(cleaned), current()
+
+    assert asyncio.run(main()) == (True, [True], None)
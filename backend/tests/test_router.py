@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+from models.chatrequest import ChatRequest
+from models.routing import RoutingDecision
+from utils.router import LocalRouter, extract_tickers, log_decision
+from utils.tickers import TickerUniverse
+
+UNIVERSE = TickerUniverse(["AAPL", "AI", "BRK-B", "NVDA", "ON"])
+
+
+def route(message: str, ticker: str = None):
+    return LocalRouter(universe=UNIVERSE).route(ChatRequest(message=message, history=[], ticker=ticker))
+
+
+def test_extracts_known_symbols_cashtags_and_company_names():
+    assert extract_tickers("Compare AAPL with $msft and nvidia", UNIVERSE) == ["MSFT", "AAPL", "NVDA"]
+    assert extract_tickers("Is $BRK.B cheap?", UNIVERSE) == ["BRK-B"]
+
+
+def test_jargon_and_stoplisted_symbols_are_not_tickers():
+    assert extract_tickers("What is the EPS and RSI, is AI hype ON now?", UNIVERSE) == []
+    assert extract_tickers("Is $AI cheap?", UNIVERSE) == ["AI"]
+
+
+def test_shouted_messages_only_count_cashtags():
+    assert extract_tickers("WHAT IS THE PRICE OF $NVDA NOW", UNIVERSE) == ["NVDA"]
+
+
+def test_routes_clear_messages_locally():
+    decision = route("What is the P/E ratio of AAPL?")
+
+    assert decision.agents == ["fundamentals"]
+    assert decision.ticker == "AAPL"
+    assert route("What is the EPS?") is None
+    assert route("What is the EPS?", ticker="NVDA").ticker == "NVDA"
+
+
+def test_log_decision_appends_jsonl(tmp_path, monkeypatch):
+    path = tmp_path / "routing.jsonl"
+    monkeypatch.setenv("ROUTING_LOG_PATH", str(path))
+    request = ChatRequest(message="hi", history=[], ticker=None)
+    decision = RoutingDecision(agents=[], ticker=None, question="hi")
+
+    async def main():
+        await asyncio.gather(*(log_decision(request, decision, "local", 0.1) for _ in range(3)))
+
+    asyncio.run(main())
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(records) == 3
+    assert records[0]["source"] == "local"
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from rds import RedisHandler  # noqa: E402
+from utils.sessions import SessionStore  # noqa: E402
+
+
+class FakeLLM:
+    """Summarizes by counting the folded turns, once released when a gate is given"""
+
+    def __init__(self, gate: asyncio.Event = None, fail: bool = False):
+        self.gate = gate
+        self.fail = fail
+        self.prompts = []
+
+    async def generate(self, system, prompt, call_site=None):
+        self.prompts.append(prompt)
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.fail:
+            raise RuntimeError("boom")
+        return f" summary of {prompt.count('user:')} questions "
+
+
+@pytest.fixture
+def rds() -> RedisHandler:
+    handler = RedisHandler("redis://localhost:6379")
+    handler.redis = fakeredis.FakeRedis()
+    return handler
+
+
+def make_store(rds: RedisHandler, llm: FakeLLM = None, **kwargs) -> SessionStore:
+    return SessionStore(rds, llm or FakeLLM(), **kwargs)
+
+
+async def compacted(store: SessionStore) -> None:
+    await asyncio.gather(*store._compacting.values())
+
+
+def test_missing_session_is_empty(rds):
+    session = asyncio.run(make_store(rds).load("new"))
+
+    assert session.summary == ""
+    assert session.turns == []
+
+
+def test_append_round_trip(rds):
+    store = make_store(rds)
+
+    async def main():
+        await store.append("s", "hi", "hello")
+        return await store.load("s")
+
+    session = asyncio.run(main())
+    assert session.turns == [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+    assert store.conversation(session, "next") == "user: hi\nassistant: hello\nuser: next"
+    assert 0 < rds.redis.ttl("session:s") <= store.ttl
+
+
+def test_concurrent_turns_are_all_kept(rds):
+    store = make_store(rds)
+
+    async def main():
+        await asyncio.gather(*(store.append("s", f"q{i}", f"a{i}") for i in range(10)))
+        return await store.load("s")
+
+    session = asyncio.run(main())
+    questions = sorted(turn["content"] for turn in session.turns if turn["role"] == "user")
+    assert questions == sorted(f"q{i}" for i in range(10))
+
+
+def test_compaction_folds_old_turns(rds):
+    store = make_store(rds, max_tokens=1, keep_turns=2)
+
+    async def main():
+        await store.append("s", "first", "one")
+        await compacted(store)
+        await store.append("s", "second", "two")
+        await compacted(store)
+        return await store.load("s")
+
+    session = asyncio.run(main())
+    assert session.summary == "summary of 1 questions"
+    assert session.turns == [{"role": "user", "content": "second"}, {"role": "assistant", "content": "two"}]
+
+
+def test_turns_added_while_compacting_are_kept(rds):
+    async def main():
+        gate = asyncio.Event()
+        store = make_store(rds, FakeLLM(gate), max_tokens=1, keep_turns=2)
+        await store.append("s", "first", "one")
+        await store.append("s", "second", "two")
+        # The first compaction is still summarizing while these turns land
+        await store.append("s", "third", "three")
+        gate.set()
+        await compacted(store)
+        return await store.load("s")
+
+    session = asyncio.run(main())
+    # Only the turns summarized are folded, the one added meanwhile is kept
+    assert session.summary == "summary of 1 questions"
+    assert [turn["content"] for turn in session.turns] == ["second", "two", "third", "three"]
+
+
+def test_failed_compaction_keeps_turns(rds, caplog):
+    store = make_store(rds, FakeLLM(fail=True), max_tokens=1, keep_turns=2)
+
+    async def main():
+        await store.append("s", "first", "one")
+        await store.append("s", "second", "two")
+        await compacted(store)
+        return await store.load("s")
+
+    session = asyncio.run(main())
+    assert len(session.turns) == 4
+    assert "Failed to compact session s" in caplog.text
@@ -0,0 +1,122 @@
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from models.post import Post  # noqa: E402
+from rds import RedisHandler  # noqa: E402
+from streams import PostStream, StreamStage  # noqa: E402
+
+
+@pytest.fixture
+def rds() -> RedisHandler:
+    handler = RedisHandler("redis://localhost:6379")
+    handler.redis = fakeredis.FakeRedis()
+    return handler
+
+
+def make_post(date: int = 1) -> Post:
+    return Post(author="trump", content=f"post {date}", date=date)
+
+
+def make_stage(rds: RedisHandler, handler, consumer: str = "worker-1", **kwargs) -> StreamStage:
+    return StreamStage(
+        source=PostStream(rds, "source"),
+        group="group",
+        consumer=consumer,
+        handler=handler,
+        output=PostStream(rds, "output"),
+        dead_letter=PostStream(rds, "dead"),
+        block_ms=1,
+        **kwargs,
+    )
+
+
+def entries(rds: RedisHandler, name: str) -> list:
+    return [Post.model_validate_json(fields[b"post"]) for _, fields in rds.redis.xrange(name)]
+
+
+def pending(rds: RedisHandler, name: str = "source", group: str = "group") -> int:
+    return rds.redis.xpending(name, group)["pending"]
+
+
+def test_publish_and_read_round_trip(rds):
+    stream = PostStream(rds, "source")
+    stream.ensure_group("group")
+    entry_id = stream.publish(make_post())
+
+    read = stream.read("group", "worker-1", block_ms=1)
+
+    assert read == [(entry_id, make_post())]
+    assert stream.read("group", "worker-1", block_ms=1) == []
+    stream.ack("group", entry_id)
+    assert pending(rds) == 0
+
+
+def test_ensure_group_is_idempotent(rds):
+    stream = PostStream(rds, "source")
+    stream.ensure_group("group")
+    stream.ensure_group("group")
+
+
+def test_publish_new_skips_posts_already_published(rds):
+    stream = PostStream(rds, "source")
+
+    assert stream.publish_new(make_post(1)) is not None
+    assert stream.publish_new(make_post(1)) is None
+    assert stream.publish_new(make_post(2)) is not None
+    assert entries(rds, "source") == [make_post(1), make_post(2)]
+
+
+def test_stage_forwards_results_and_acknowledges(rds):
+    stage = make_stage(rds, lambda post: post if post.date % 2 else None)
+    for date in range(1, 5):
+        stage.source.publish(make_post(date))
+
+    assert stage.run_once() == 4
+    assert entries(rds, "output") == [make_post(1), make_post(3)]
+    assert pending(rds) == 0
+
+
+def test_failed_entry_is_claimed_by_another_consumer(rds):
+    def fail(post: Post) -> Post:
+        raise RuntimeError("boom")
+
+    failing = make_stage(rds, fail, consumer="worker-1", claim_idle_ms=0)
+    failing.source.publish(make_post())
+    failing.run_once()
+    assert pending(rds) == 1
+
+    # XAUTOCLAIM hands the idle entry to the healthy consumer
+    healthy = make_stage(rds, lambda post: post, consumer="worker-2", claim_idle_ms=0)
+    assert healthy.run_once() == 1
+    assert entries(rds, "output") == [make_post()]
+    assert pending(rds) == 0
+
+
+def test_entry_is_dead_lettered_after_max_deliveries(rds):
+    calls = []
+
+    def fail(post: Post) -> Post:
+        calls.append(post)
+        raise RuntimeError("boom")
+
+    stage = make_stage(rds, fail, claim_idle_ms=0, max_deliveries=3)
+    stage.source.publish(make_post())
+    for _ in range(3):
+        stage.run_once()
+
+    assert len(calls) == 3
+    assert entries(rds, "dead") == [make_post()]
+    assert entries(rds, "output") == []
+    assert pending(rds) == 0
+    assert stage.run_once() == 0
+
+
+def test_malformed_entry_is_dropped(rds):
+    stage = make_stage(rds, lambda post: post)
+    rds.redis.xadd("source", {"post": b"not json"})
+    stage.source.publish(make_post())
+
+    assert stage.run_once() == 1
+    assert entries(rds, "output") == [make_post()]
+    assert pending(rds) == 0
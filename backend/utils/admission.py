@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from utils import metrics
+from utils.limits import PriorityLimiter
+
+
+@dataclass
+class RouteClass:
+    """How requests to a group of routes are admitted"""
+    name: str
+    # Lower values are served first from the queue
+    priority: int
+    # Seconds a request may wait for a slot before it is shed
+    max_wait: float
+    # Whether a request is shed on arrival when the queue is full
+    sheddable: bool = True
+    # Pool of slots the class draws from, classes of different pools never wait for each other
+    pool: str = "llm"
+
+
+DATA = RouteClass("data", priority=0, max_wait=10.0, sheddable=False, pool="data")
+SENTIMENT = RouteClass("sentiment", priority=1, max_wait=5.0)
+CHAT = RouteClass("chat", priority=2, max_wait=5.0)
+
+# Path prefixes and their class. Other paths are not admission controlled.
+DEFAULT_ROUTES: List[Tuple[str, RouteClass]] = [
+    ("/price", DATA),
+    ("/posts", DATA),
+    ("/sentiment", SENTIMENT),
+    ("/chat", CHAT),
+]
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware bounding the requests served at once, so overload sheds a few requests quickly instead of
+    slowing every one down.
+
+    LLM-backed requests wait for one of max_concurrency slots in a PriorityLimiter queue, sentiment ahead of chat.
+    Streaming responses hold their slot until the stream ends, so cheap data reads get a pool of
+    data_concurrency slots of their own rather than queueing behind a burst of chat streams. A request arriving
+    to a full queue, or waiting longer than its class allows, gets a 503 with Retry-After. Shed requests are
+    counted in metrics and logged at most once per log_interval.
+
+    Usage:
+        app.add_middleware(AdmissionMiddleware, max_concurrency=16, data_concurrency=8, max_queue=32)
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            max_concurrency: int = 16,
+            data_concurrency: int = 8,
+            max_queue: int = 32,
+            retry_after: int = 5,
+            routes: Optional[List[Tuple[str, RouteClass]]] = None,
+            log_interval: float = 10.0,
+    ):
+        """
+        Args:
+            app: The wrapped ASGI app
+            max_concurrency: LLM-backed requests served at once
+            data_concurrency: Data requests served at once, on top of max_concurrency
+            max_queue: Requests allowed to wait for a slot, per pool
+            retry_after: Seconds clients are told to wait before retrying a shed request
+            routes: Path prefixes and their class, DEFAULT_ROUTES if None
+            log_interval: Minimum seconds between two logs of shed requests
+        """
+        self.app = app
+        self.limiters: Dict[str, PriorityLimiter] = {
+            "llm": PriorityLimiter(max_concurrency),
+            "data": PriorityLimiter(data_concurrency),
+        }
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.routes = DEFAULT_ROUTES if routes is None else routes
+        self.log_interval = log_interval
+        self.rejected: Dict[str, int] = {}
+        self.logger = logging.getLogger(__name__)
+        self._unlogged = 0
+        self._logged_at = float("-inf")
+        metrics.gauge("admission", self.snapshot)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        route_class = self._classify(scope) if scope["type"] == "http" else None
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiters[route_class.pool]
+        if route_class.sheddable and limiter.queued >= self.max_queue:
+            await self._reject(route_class, "queue full", scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        try:
+            # Waits in this task, so the queue length is accurate for the next arrival
+            async with asyncio.timeout(route_class.max_wait):
+                await limiter.acquire(route_class.priority)
+        except asyncio.TimeoutError:
+            await self._reject(route_class, "queue wait exceeded", scope, receive, send)
+            return
+        finally:
+            metrics.histogram(f"admission.{route_class.name}.wait").observe(time.perf_counter() - start)
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        pools = {name: limiter.snapshot() for name, limiter in self.limiters.items()}
+        return {
+            # Totals across pools, queued is what background work backs off on
+            "in_flight": sum(pool["in_flight"] for pool in pools.values()),
+            "queued": sum(pool["queued"] for pool in pools.values()),
+            "max_queue": self.max_queue,
+            "rejected": dict(self.rejected),
+            "pools": pools,
+        }
+
+    def _classify(self, scope: Scope) -> Optional[RouteClass]:
+        path = scope["path"]
+        for prefix, route_class in self.routes:
+            if path == prefix or path.startswith(prefix + "/"):
+                return route_class
+        return None
+
+    async def _reject(self, route_class: RouteClass, reason: str, scope: Scope, receive: Receive, send: Send) -> None:
+        self.rejected[route_class.name] = self.rejected.get(route_class.name, 0) + 1
+        metrics.counter(f"admission.{route_class.name}.shed").inc()
+        # Shedding happens under overload, when a log line per request hurts the most
+        self._unlogged += 1
+        now = time.monotonic()
+        if now - self._logged_at >= self.log_interval:
+            self.logger.warning(f"Shed {self._unlogged} requests since last reported, latest {scope['path']}: {reason}")
+            self._unlogged = 0
+            self._logged_at = now
+        response = JSONResponse(
+            {"detail": "Server is busy, please retry later"},
+            status_code=503,
+            headers={"Retry-After": str(self.retry_after)},
+        )
+        await response(scope, receive, send)
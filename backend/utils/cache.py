@@ -0,0 +1,73 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from rds import RedisHandler
+
+
+class LLMCache:
+    """
+    Two-level cache for deterministic LLM responses: an in-process LRU in front of Redis.
+
+    Values must be JSON serializable. Entries expire after the TTL given when they are set, both locally and
+    in Redis, so every process sharing the Redis instance benefits from a response computed by any of them.
+    """
+
+    def __init__(self, rds: Optional[RedisHandler] = None, max_entries: int = 1024, prefix: str = "llm:"):
+        """
+        Args:
+            rds: Optional Redis handler backing the local LRU
+            max_entries: Maximum number of entries kept in process
+            prefix: Prefix of the Redis keys
+        """
+        self.rds = rds
+        self.max_entries = max_entries
+        self.prefix = prefix
+        self._entries: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Hash the parts that determine a response into a stable cache key"""
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, checking the local LRU before Redis"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        if self.rds is not None:
+            # The Redis client is synchronous, keep it off the event loop
+            stored = await asyncio.to_thread(self.rds.get, self.prefix + key)
+            if stored is not None:
+                ttl = await asyncio.to_thread(self.rds.redis.ttl, self.prefix + key)
+                if ttl and ttl > 0:
+                    self._remember(key, stored["value"], ttl)
+                self.hits += 1
+                return stored["value"]
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any, ttl: int) -> None:
+        """Cache a value for ttl seconds"""
+        self._remember(key, value, ttl)
+        if self.rds is not None:
+            await asyncio.to_thread(self.rds.set, self.prefix + key, {"value": value}, ttl)
+
+    def _remember(self, key: str, value: Any, ttl: int) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,179 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Tuple
+
+
+class PriorityLimiter:
+    """
+    Bounds the number of concurrent holders of a slot. Callers beyond the bound wait in a queue served by
+    priority (lower values first), then in arrival order.
+
+    Usage:
+        async with limiter.slot(priority=0):
+            ...
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 0) -> AsyncIterator[None]:
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, priority: int = 0) -> None:
+        """Wait for a free slot"""
+        if self.try_acquire():
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled, pass it on
+                self.release()
+            else:
+                self._waiters = [waiter for waiter in self._waiters if waiter[2] is not future]
+                heapq.heapify(self._waiters)
+            raise
+
+    def try_acquire(self) -> bool:
+        """Take a free slot without waiting, only when nobody is queueing for one"""
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self.in_flight += 1
+            return True
+        return False
+
+    def release(self) -> None:
+        """Hand the slot to the next waiter, or free it"""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # The slot moves to the waiter, so in_flight is unchanged
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+        }
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because its circuit is open"""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Fails fast while a dependency is unhealthy.
+
+    The breaker opens when the error rate over the last window_size calls crosses error_threshold. After
+    reset_timeout seconds it half-opens and lets a single probe through: success closes it again, failure
+    reopens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+            self,
+            name: str,
+            error_threshold: float = 0.5,
+            window_size: int = 20,
+            min_calls: int = 5,
+            reset_timeout: float = 30.0,
+    ):
+        """
+        Args:
+            name: Name used in errors and monitoring
+            error_threshold: Error rate (0-1) that opens the circuit
+            window_size: Number of most recent calls the error rate is computed over
+            min_calls: Calls needed in the window before the circuit may open
+            reset_timeout: Seconds the circuit stays open before probing
+        """
+        self.name = name
+        self.error_threshold = error_threshold
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._outcomes: Deque[bool] = deque(maxlen=window_size)
+        self._probing = False
+
+    def allow(self) -> None:
+        """Raise CircuitOpenError unless a call may proceed"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError(f"Circuit {self.name} is open")
+            self.state = self.HALF_OPEN
+
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                self.rejected += 1
+                raise CircuitOpenError(f"Circuit {self.name} is half-open and already probing")
+            self._probing = True
+
+    def record_success(self) -> None:
+        if self.state == self.HALF_OPEN:
+            self._close()
+            return
+        self._outcomes.append(True)
+
+    def record_failure(self) -> None:
+        if self.state == self.HALF_OPEN:
+            self._open()
+            return
+        self._outcomes.append(False)
+        if len(self._outcomes) >= self.min_calls and self.error_rate >= self.error_threshold:
+            self._open()
+
+    def release_probe(self) -> None:
+        """Let another probe through when the current one ended without an outcome, e.g. it was cancelled"""
+        self._probing = False
+
+    @property
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "error_rate": round(self.error_rate, 3),
+            "calls_in_window": len(self._outcomes),
+            "rejected": self.rejected,
+        }
+
+    def _open(self) -> None:
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self._probing = False
+
+    def _close(self) -> None:
+        self.state = self.CLOSED
+        self._outcomes.clear()
+        self._probing = False
@@ -1,93 +1,526 @@
+import asyncio
+import logging
 import os
-from typing import TypeVar, Type, AsyncGenerator
+import time
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from typing import TypeVar, Type, AsyncGenerator, AsyncIterator, Any, Awaitable, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
 
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
 from pydantic import BaseModel
 
+from utils import metrics
+from utils.cache import LLMCache
+from utils.limits import PriorityLimiter, CircuitBreaker
+from utils.streaming import close_stream
+
+if TYPE_CHECKING:
+    from google import genai
+
 T = TypeVar('T', bound=BaseModel)
+R = TypeVar('R')
+C = TypeVar('C')
+
+# Seconds a response is cached for, per call site. Call sites not listed here are never cached.
+DEFAULT_CACHE_TTLS: Dict[str, int] = {
+    "routing": 600,
+    "summary": 60,
+    "fundamentals": 60,
+    "trading": 60,
+    "sentiment": 300,
+    "search": 300,
+    "filter": 7 * 24 * 60 * 60,
+}
+
+
+
+@dataclass
+class CallPolicy:
+    """
+    How a call site issues requests to Gemini.
+
+    Attributes:
+        timeout: Seconds each model gets, including its hedge, before moving on to the next fallback model
+        hedge_after: Seconds to wait before firing a duplicate request, the first to finish wins
+        fallback_models: Models tried in order when the primary model errors or times out
+    """
+    timeout: Optional[float] = None
+    hedge_after: Optional[float] = None
+    fallback_models: List[str] = field(default_factory=list)
+
+
+# Agents call tools, so duplicating their requests would duplicate tool calls; they only get fallbacks
+DEFAULT_POLICIES: Dict[str, CallPolicy] = {
+    "routing": CallPolicy(timeout=10, hedge_after=1.5, fallback_models=["gemini-2.0-flash-lite"]),
+    "summary": CallPolicy(timeout=30, hedge_after=5, fallback_models=["gemini-2.0-flash-lite"]),
+    "chat": CallPolicy(timeout=30, hedge_after=5, fallback_models=["gemini-2.0-flash-lite"]),
+    "fundamentals": CallPolicy(timeout=60, fallback_models=["gemini-2.0-flash-lite"]),
+    "trading": CallPolicy(timeout=60, fallback_models=["gemini-2.0-flash-lite"]),
+    "sentiment": CallPolicy(timeout=30, hedge_after=5, fallback_models=["gemini-2.0-flash-lite"]),
+    "sentiment_batch": CallPolicy(timeout=45, fallback_models=["gemini-2.0-flash-lite"]),
+    "search": CallPolicy(timeout=90, fallback_models=["gemini-2.0-flash-lite"]),
+    "session_summary": CallPolicy(timeout=30, fallback_models=["gemini-2.0-flash-lite"]),
+    "warmer": CallPolicy(timeout=60, fallback_models=["gemini-2.0-flash-lite"]),
+}
+
+# Queue priority per call site when Gemini is saturated, lower values are served first
+CALL_PRIORITIES: Dict[str, int] = {
+    "routing": 0,
+    "summary": 0,
+    "chat": 1,
+    "fundamentals": 2,
+    "trading": 2,
+    "sentiment": 2,
+    "sentiment_batch": 3,
+    "search": 2,
+    "session_summary": 8,
+    "filter": 9,
+    # Background cache refreshes, nobody is waiting for them
+    "warmer": 10,
+}
+DEFAULT_PRIORITY = 5
+
+# Process-wide bound on in-flight Gemini calls, shared by every LLM instance
+GEMINI_LIMITER = PriorityLimiter(int(os.environ.get("GEMINI_MAX_CONCURRENCY", "8")))
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def circuit_breaker(model_name: str) -> CircuitBreaker:
+    """Get the process-wide circuit breaker guarding a model"""
+    if model_name not in _breakers:
+        _breakers[model_name] = CircuitBreaker(model_name)
+    return _breakers[model_name]
+
+
+def llm_status() -> Dict[str, Any]:
+    """Limiter and circuit breaker state for monitoring"""
+    return {
+        "limiter": GEMINI_LIMITER.snapshot(),
+        "breakers": {name: breaker.snapshot() for name, breaker in _breakers.items()},
+    }
+
+
+metrics.gauge("gemini", llm_status)
 
 
 class LLM:
-    def __init__(self, model_name: str = "gemini-2.0-flash"):
+    def __init__(
+            self,
+            model_name: str = "gemini-2.0-flash",
+            cache: Optional[LLMCache] = None,
+            cache_ttls: Optional[Dict[str, int]] = None,
+            policies: Optional[Dict[str, CallPolicy]] = None,
+            client: Optional["genai.Client"] = None,
+    ):
         """
         Initialize the LLM with Google's Gemini API
 
         Args:
             model_name: The Gemini model to use
+            cache: Optional response cache, caching is disabled without one
+            cache_ttls: Seconds to cache responses for, per call site
+            policies: Hedging, timeout and fallback policies, per call site
+            client: Optional Gemini client, one is created from GEMINI_API_KEY by default
         """
         load_dotenv()
         self.model_name = model_name
-        self.client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+        self._client = client
         self.generation_config = {
             "temperature": 0.3,
             "top_p": 0.95,
             "top_k": 40,
         }
+        self.cache = cache
+        self.cache_ttls = DEFAULT_CACHE_TTLS if cache_ttls is None else cache_ttls
+        self.policies = DEFAULT_POLICIES if policies is None else policies
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def client(self) -> "genai.Client":
+        """Gemini client, created on first use since importing the SDK dominates startup time"""
+        if self._client is None:
+            from google import genai
+
+            self._client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+        return self._client
+
+    async def generate(
+            self,
+            system: str,
+            prompt: str,
+            call_site: Optional[str] = None,
+            use_cache: bool = True,
+            **kwargs,
+    ) -> str:
+        """
+        Generate a response from the LLM using the provided system and prompt.
+
+        Args:
+            system: The system instruction
+            prompt: The user prompt
+            call_site: Name of the calling code path, selects the cache TTL
+            use_cache: Set to False to bypass the cache when freshness matters
+        """
+        from google.genai import types
 
-    def generate(self, system: str, prompt: str, **kwargs) -> str:
-        """Generate a response from the LLM using the provided system and prompt."""
         generation_config = {**self.generation_config, **kwargs}
 
-        response = self.client.models.generate_content(
-            model=self.model_name,
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                system_instruction=system,
-                **generation_config
+        async def request(model: str) -> str:
+            response = await self.client.aio.models.generate_content(
+                model=model,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    system_instruction=system,
+                    **generation_config
+                )
             )
-        )
+            return response.text
 
-        return response.text
+        async def compute() -> str:
+            return await self.call(call_site, request)
 
-    def generate_structured(
+        return await self.cached(
+            call_site,
+            use_cache,
+            ("generate", self.model_name, system, prompt, generation_config, None),
+            compute,
+        )
+
+    async def generate_structured(
             self,
             system: str,
             prompt: str,
             output: Type[T],
+            call_site: Optional[str] = None,
+            use_cache: bool = True,
     ) -> T:
         """Generate structured output using a Pydantic model schema."""
-        response = self.client.models.generate_content(
-            model=self.model_name,
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                response_schema=output,
-                system_instruction=system,
-                **self.generation_config
+        from google.genai import types
+
+        async def request(model: str) -> Dict[str, Any]:
+            response = await self.client.aio.models.generate_content(
+                model=model,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json",
+                    response_schema=output,
+                    system_instruction=system,
+                    **self.generation_config
+                )
             )
-        )
 
-        try:
-            # Use the parsed response if available
-            if hasattr(response, "parsed") and response.parsed:
-                return response.parsed
-            # Otherwise manually parse the JSON
-            return output.model_validate_json(response.text)
-        except Exception as e:
-            raise ValueError(f"Failed to parse structured response: {e}\nResponse: {response.text}")
+            try:
+                # Use the parsed response if available
+                if hasattr(response, "parsed") and response.parsed:
+                    parsed = response.parsed
+                # Otherwise manually parse the JSON
+                else:
+                    parsed = output.model_validate_json(response.text)
+            except Exception as e:
+                raise ValueError(f"Failed to parse structured response: {e}\nResponse: {response.text}")
+            # Cache the JSON form so hits from Redis validate the same way
+            return parsed.model_dump(mode="json")
+
+        async def compute() -> Dict[str, Any]:
+            return await self.call(call_site, request)
 
-    def stream(self, system: str, prompt: str, **kwargs) -> AsyncGenerator[str, None]:
+        data = await self.cached(
+            call_site,
+            use_cache,
+            ("structured", self.model_name, system, prompt, self.generation_config, output.model_json_schema()),
+            compute,
+        )
+        return output.model_validate(data)
+
+    async def stream(
+            self,
+            system: str,
+            prompt: str,
+            call_site: Optional[str] = None,
+            use_cache: bool = True,
+            **kwargs,
+    ) -> AsyncGenerator[str, None]:
         """
         Stream model output in chunks as they are generated.
+        Cached responses are replayed chunk by chunk.
 
         Yields:
             Chunks of text generated by the model.
         """
+        from google.genai import types
+
         generation_config = {**self.generation_config, **kwargs}
-        # Initiate streaming generation
-        stream = self.client.models.generate_content_stream(
-            model=self.model_name,
-            contents=[prompt],
-            config=types.GenerateContentConfig(
-                system_instruction=system,
-                **generation_config
+
+        async def open_stream(model: str):
+            # Initiate streaming generation without blocking the event loop between chunks
+            return await self.client.aio.models.generate_content_stream(
+                model=model,
+                contents=[prompt],
+                config=types.GenerateContentConfig(
+                    system_instruction=system,
+                    **generation_config
+                )
             )
-        )
-        # Generator that yields text chunks
-        async def streamer():
-            for chunk in stream:
-                text = chunk.text or ""
-                yield text
-        return streamer()
\ No newline at end of file
+
+        async def produce() -> AsyncGenerator[str, None]:
+            async with aclosing(self.call_stream(call_site, open_stream)) as chunks:
+                async for chunk in chunks:
+                    yield chunk.text or ""
+
+        async with aclosing(self.cached_stream(
+                call_site,
+                use_cache,
+                ("stream", self.model_name, system, prompt, generation_config, None),
+                produce,
+        )) as chunks:
+            async for chunk in chunks:
+                yield chunk
+
+    async def cached_stream(
+            self,
+            call_site: Optional[str],
+            use_cache: bool,
+            key_parts: tuple,
+            produce: Callable[[], AsyncIterator[str]],
+    ) -> AsyncGenerator[str, None]:
+        """
+        Replay the cached chunks for key_parts, or stream produce() and cache its chunks once complete.
+
+        Args:
+            call_site: Name of the calling code path, selects the cache TTL
+            use_cache: Whether the cache may be used at all
+            key_parts: Everything that determines the response, hashed into the cache key
+            produce: Async iterator factory yielding the chunks on a miss
+        """
+        ttl = self._cache_ttl(call_site, use_cache)
+        key = None
+        if ttl:
+            key = LLMCache.make_key(*key_parts)
+            chunks = await self.cache.get(key)
+            if chunks is not None:
+                for chunk in chunks:
+                    yield chunk
+                return
+
+        chunks = []
+        # Closed as soon as this generator is, so an abandoned stream gives back its Gemini slot right away
+        async with aclosing(produce()) as produced:
+            async for chunk in produced:
+                chunks.append(chunk)
+                yield chunk
+
+        # Only complete streams are cached
+        if key:
+            await self.cache.set(key, chunks, ttl)
+
+    async def cached(
+            self,
+            call_site: Optional[str],
+            use_cache: bool,
+            key_parts: tuple,
+            compute: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Return the cached result for key_parts, or compute and cache it using the call site's TTL.
+
+        Args:
+            call_site: Name of the calling code path, selects the cache TTL
+            use_cache: Whether the cache may be used at all
+            key_parts: Everything that determines the response, hashed into the cache key
+            compute: Coroutine factory producing a JSON serializable result on a miss
+        """
+        ttl = self._cache_ttl(call_site, use_cache)
+        if not ttl:
+            return await compute()
+
+        key = LLMCache.make_key(*key_parts)
+        result = await self.cache.get(key)
+        if result is None:
+            result = await compute()
+            await self.cache.set(key, result, ttl)
+        return result
+
+    async def call(self, call_site: Optional[str], request: Callable[[str], Awaitable[R]]) -> R:
+        """
+        Run a request with the call site's policy: each model in turn, starting with the primary model,
+        with an optional hedged duplicate and timeout, until one succeeds.
+        Every attempt waits for a slot in the process-wide limiter and fails fast while its model's circuit is open.
+
+        Args:
+            call_site: Name of the calling code path, selects the policy
+            request: Coroutine factory issuing the request against the given model name
+
+        Returns:
+            The result of the first successful request
+        """
+        result, _ = await self._call(call_site, request)
+        return result
+
+    async def call_stream(
+            self,
+            call_site: Optional[str],
+            open_stream: Callable[[str], Awaitable[AsyncIterator[C]]],
+    ) -> AsyncGenerator[C, None]:
+        """
+        Open a stream with the call site's policy and yield its chunks. The policy covers the time to first chunk,
+        and the limiter slot is held until the stream is exhausted or closed, so the bound on concurrent Gemini
+        calls covers the whole generation.
+
+        Args:
+            call_site: Name of the calling code path, selects the policy
+            open_stream: Coroutine factory opening the stream against the given model name
+
+        Yields:
+            The chunks of the stream
+        """
+        async def request(model: str) -> Tuple[Optional[C], AsyncIterator[C]]:
+            stream = await open_stream(model)
+            # Wait for the first chunk so hedging and fallbacks cover time to first token
+            try:
+                return await anext(stream, None), stream
+            except BaseException:
+                # Lost a hedge or was cancelled, release the connection
+                await close_stream(stream)
+                raise
+
+        (first, stream), release = await self._call(call_site, request, hold=True)
+        completed = False
+        try:
+            if first is not None:
+                yield first
+                async for chunk in stream:
+                    yield chunk
+            completed = True
+        finally:
+            try:
+                if not completed:
+                    # The consumer went away mid-stream, stop generating
+                    metrics.counter("llm.streams_cancelled").inc()
+                    await close_stream(stream)
+            finally:
+                release()
+
+    async def _call(
+            self,
+            call_site: Optional[str],
+            request: Callable[[str], Awaitable[R]],
+            hold: bool = False,
+    ) -> Tuple[R, Callable[[], None]]:
+        """
+        Run a request with the call site's policy, see call.
+
+        Args:
+            call_site: Name of the calling code path, selects the policy
+            request: Coroutine factory issuing the request against the given model name
+            hold: Keep the limiter slot of the successful request, for the caller to release
+
+        Returns:
+            The result of the first successful request and the function releasing its slot, a no-op unless held
+        """
+        policy = self.policies.get(call_site) if call_site else None
+        if policy is None:
+            return await self._attempt(call_site, request, self.model_name, None, hold)
+
+        models = [self.model_name, *policy.fallback_models]
+        for i, model in enumerate(models):
+            try:
+                return await self._attempt(call_site, request, model, policy, hold)
+            except Exception as e:
+                if i == len(models) - 1:
+                    raise
+                self.logger.warning(f"{call_site} request to {model} failed ({e!r}), falling back to {models[i + 1]}")
+
+    @classmethod
+    async def _attempt(
+            cls,
+            call_site: Optional[str],
+            request: Callable[[str], Awaitable[R]],
+            model: str,
+            policy: Optional[CallPolicy],
+            hold: bool = False,
+    ) -> Tuple[R, Callable[[], None]]:
+        """
+        Await the request against one model, through its circuit breaker and the process-wide limiter.
+
+        The policy's timeout and hedge only start once a limiter slot is acquired, so time spent queueing behind
+        other local calls is never taken for a slow or failing Gemini.
+
+        Returns:
+            The result and the function releasing the limiter slot, which is already released unless hold is set
+        """
+        breaker = circuit_breaker(model)
+        breaker.allow()
+        try:
+            await GEMINI_LIMITER.acquire(CALL_PRIORITIES.get(call_site, DEFAULT_PRIORITY))
+            result = await cls._hedged(request, model, policy)
+        except asyncio.CancelledError:
+            breaker.release_probe()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        release = _once(GEMINI_LIMITER.release)
+        if not hold:
+            release()
+        return result, release
+
+    @staticmethod
+    async def _hedged(request: Callable[[str], Awaitable[R]], model: str, policy: Optional[CallPolicy]) -> R:
+        """
+        Await the request on the limiter slot already acquired, firing a duplicate after hedge_after, and cancel
+        whichever loses. The duplicate only runs on a slot that is free right away, never while other calls are
+        queueing for one. The winner keeps its slot, the slots of the others are released.
+        """
+        timeout = policy.timeout if policy else None
+        hedge_after = policy.hedge_after if policy else None
+        deadline = time.monotonic() + timeout if timeout else None
+        tasks = [asyncio.create_task(request(model))]
+        error: Optional[BaseException] = None
+        try:
+            if hedge_after is not None:
+                if deadline:
+                    hedge_after = min(hedge_after, deadline - time.monotonic())
+                done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+                if not done:
+                    if GEMINI_LIMITER.try_acquire():
+                        tasks.append(asyncio.create_task(request(model)))
+                    else:
+                        # Gemini calls are queueing, a duplicate would only add to the overload
+                        metrics.counter("llm.hedges_skipped").inc()
+
+            while tasks:
+                remaining = max(deadline - time.monotonic(), 0) if deadline else None
+                done, _ = await asyncio.wait(tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise asyncio.TimeoutError(f"{model} did not respond within {timeout}s")
+                for task in done:
+                    tasks.remove(task)
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                    GEMINI_LIMITER.release()
+            raise error
+        finally:
+            # Losers, whether still running or finished together with the winner, give back their slot
+            for task in tasks:
+                task.cancel()
+                GEMINI_LIMITER.release()
+
+    def _cache_ttl(self, call_site: Optional[str], use_cache: bool) -> int:
+        if not (self.cache and use_cache and call_site):
+            return 0
+        return self.cache_ttls.get(call_site, 0)
+
+
+def _once(release: Callable[[], None]) -> Callable[[], None]:
+    """Wrap a release function so that calling it more than once has no effect"""
+    released = False
+
+    def wrapper() -> None:
+        nonlocal released
+        if not released:
+            released = True
+            release()
+
+    return wrapper
@@ -0,0 +1,79 @@
+import bisect
+from typing import Any, Callable, Dict, Optional, Sequence
+
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Counter:
+    """A monotonically increasing count"""
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+    def snapshot(self) -> int:
+        return self.value
+
+
+class Histogram:
+    """Counts of observed values per upper bound, plus their count and sum"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip([*self.buckets, float("inf")], self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {"count": self.count, "sum": round(self.sum, 6), "buckets": buckets}
+
+
+_counters: Dict[str, Counter] = {}
+_histograms: Dict[str, Histogram] = {}
+_gauges: Dict[str, Callable[[], Any]] = {}
+
+
+def counter(name: str) -> Counter:
+    """Get or create the process-wide counter with this name"""
+    if name not in _counters:
+        _counters[name] = Counter()
+    return _counters[name]
+
+
+def histogram(name: str, buckets: Optional[Sequence[float]] = None) -> Histogram:
+    """Get or create the process-wide histogram with this name"""
+    if name not in _histograms:
+        _histograms[name] = Histogram(buckets or DEFAULT_BUCKETS)
+    return _histograms[name]
+
+
+def gauge(name: str, read: Callable[[], Any]) -> None:
+    """Register a function read whenever metrics are collected"""
+    _gauges[name] = read
+
+
+def read(name: str) -> Any:
+    """Current value of one registered gauge, None if there is none by that name"""
+    read_gauge = _gauges.get(name)
+    return read_gauge() if read_gauge else None
+
+
+def snapshot() -> Dict[str, Any]:
+    """Current value of every registered metric"""
+    return {
+        "counters": {name: c.snapshot() for name, c in _counters.items()},
+        "histograms": {name: h.snapshot() for name, h in _histograms.items()},
+        "gauges": {name: read() for name, read in _gauges.items()},
+    }
@@ -0,0 +1,183 @@
+import copy
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from utils import metrics
+from utils.request_context import current
+from utils.tokens import estimate_tokens
+
+# Fields of each upstream payload the agent prompts actually use
+QUOTE_FIELDS = (
+    "symbol", "name", "price", "change", "percentChange", "open", "high", "low", "volume", "avgVolume",
+    "marketCap", "pe", "eps", "beta", "yearHigh", "yearLow", "dividend", "yield", "sector", "industry",
+    "earningsDate",
+)
+SIMILAR_FIELDS = ("symbol", "name", "price", "percentChange")
+NEWS_FIELDS = ("title", "link", "source", "time")
+SEARCH_FIELDS = ("title", "url", "content")
+# Keys dating the entries of a time series
+SERIES_KEYS = ("date", "time", "timestamp", "datetime")
+
+MAX_NEWS = 10
+MAX_SIMILAR = 8
+MAX_POSTS = 10
+MAX_SEARCH_RESULTS = 5
+MAX_TEXT_CHARS = 600
+
+logger = logging.getLogger(__name__)
+
+
+def _pick(item: Any, fields: tuple) -> Any:
+    if not isinstance(item, dict):
+        return item
+    return {field: item[field] for field in fields if item.get(field) not in (None, "")}
+
+
+def _truncate(text: Any, max_chars: int = MAX_TEXT_CHARS) -> Any:
+    if isinstance(text, str) and len(text) > max_chars:
+        return text[:max_chars] + "…"
+    return text
+
+
+def project_quotes(result: Dict) -> Dict:
+    return {"quotes": [_pick(quote, QUOTE_FIELDS) for quote in result.get("quotes", [])]}
+
+
+def project_news(result: Dict) -> Dict:
+    return {"news": [_pick(article, NEWS_FIELDS) for article in result.get("news", [])[:MAX_NEWS]]}
+
+
+def project_similar(result: Dict) -> Dict:
+    return {"similar": [_pick(quote, SIMILAR_FIELDS) for quote in result.get("similar", [])[:MAX_SIMILAR]]}
+
+
+def project_technicals(result: Dict) -> Dict:
+    """Indicators keep only the latest value of their time series, rounded. Lists of indicators are kept whole."""
+    def latest(value: Any) -> Any:
+        if isinstance(value, dict):
+            return {key: latest(v) for key, v in value.items()}
+        if isinstance(value, list):
+            if _is_series(value):
+                return latest(value[-1]) if value else None
+            return [latest(item) for item in value]
+        if isinstance(value, float):
+            return round(value, 2)
+        return value
+
+    return latest(result)
+
+
+def _is_series(items: list) -> bool:
+    """Whether a list holds the successive values of one indicator: plain values, or entries with a date"""
+    if all(not isinstance(item, (dict, list)) for item in items):
+        return True
+    return all(isinstance(item, dict) and any(key in item for key in SERIES_KEYS) for item in items)
+
+
+def project_posts(result: Dict) -> Dict:
+    return {"posts": [
+        {"date": post.get("date"), "content": _truncate(post.get("content"))}
+        for post in result.get("posts", [])[:MAX_POSTS]
+        if isinstance(post, dict)
+    ]}
+
+
+def project_search(result: Dict) -> Dict:
+    return {"results": [
+        {key: _truncate(value) for key, value in _pick(item, SEARCH_FIELDS).items()}
+        for item in result.get("results", [])[:MAX_SEARCH_RESULTS]
+    ]}
+
+
+# Projection per tool name, tools not listed here reach the model unchanged
+PROJECTIONS: Dict[str, Callable[[Dict], Dict]] = {
+    "get_quotes": project_quotes,
+    "get_news": project_news,
+    "get_similar": project_similar,
+    "get_technicals": project_technicals,
+    "get_recent_posts": project_posts,
+    "get_search": project_search,
+}
+
+
+def shrink(value: Any, max_tokens: int) -> Any:
+    """
+    Cut a JSON-like value down to about max_tokens: the longest lists are halved and long strings truncated
+    until it fits.
+    """
+    if estimate_tokens(value) <= max_tokens:
+        return value
+    # Results may be shared through the request memo, never cut them in place
+    value = copy.deepcopy(value)
+    while estimate_tokens(value) > max_tokens:
+        lists = _lists(value)
+        longest = max(lists, key=len, default=None)
+        if longest is not None and len(longest) > 1:
+            del longest[(len(longest) + 1) // 2:]
+            continue
+        # Nothing left to drop, cut the serialized text instead
+        text = value if isinstance(value, str) else str(value)
+        return {"truncated": text[:max_tokens * 4]}
+    return value
+
+
+def _lists(value: Any) -> List[list]:
+    found = []
+    if isinstance(value, list):
+        found.append(value)
+        for item in value:
+            found.extend(_lists(item))
+    elif isinstance(value, dict):
+        for item in value.values():
+            found.extend(_lists(item))
+    return found
+
+
+class TokenBudget:
+    """
+    Tokens of tool results one agent invocation may pass to the model.
+
+    Results are projected to the fields the prompts use, then shrunk to whatever is left of the budget.
+    Tokens saved are counted per budget, per request in the current RequestContext and process-wide in
+    utils.metrics.
+    """
+
+    def __init__(self, limit: Optional[int]):
+        """
+        Args:
+            limit: Tokens allowed across all tool results, unlimited if None
+        """
+        self.limit = limit
+        self.used = 0
+        self.saved = 0
+
+    @property
+    def remaining(self) -> Optional[int]:
+        return None if self.limit is None else max(self.limit - self.used, 0)
+
+    def fit(self, tool: str, result: Dict) -> Dict:
+        """Project a tool result and charge it to the budget"""
+        raw_tokens = estimate_tokens(result)
+        projection = PROJECTIONS.get(tool)
+        if projection is not None:
+            try:
+                result = projection(result)
+            except Exception as e:
+                # Unexpected upstream shape, better unprojected than lost
+                metrics.counter(f"tools.{tool}.projection_errors").inc()
+                logger.warning(f"Could not project {tool} result: {e}")
+
+        if self.remaining is not None:
+            result = shrink(result, self.remaining) if self.remaining else {
+                "error": "Tool result budget exhausted, answer with the data already retrieved"
+            }
+        tokens = estimate_tokens(result)
+        saved = max(raw_tokens - tokens, 0)
+        self.used += tokens
+        self.saved += saved
+        metrics.counter("tools.tokens_sent").inc(tokens)
+        metrics.counter("tools.tokens_saved").inc(saved)
+        context = current()
+        if context is not None:
+            context.tokens_saved += saved
+        return result
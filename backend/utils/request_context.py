@@ -0,0 +1,203 @@
+import asyncio
+import json
+import time
+from contextvars import ContextVar
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+from utils import metrics
+
+T = TypeVar('T')
+
+_current: ContextVar[Optional["RequestContext"]] = ContextVar("request_context", default=None)
+
+
+class RequestContext:
+    """
+    State shared by all the work done for one chat request, carried through a contextvar.
+
+    Tool results are memoized by (tool, args) for the lifetime of the request, so sub-agents asking for the same
+    data share one call, and concurrent identical calls await the same in-flight task. Data known to be needed
+    can be prefetched into the memo before any agent runs. An optional deadline bounds all the work of the request.
+
+    Usage:
+        context = RequestContext()
+        results = await asyncio.gather(context.run(agent_a()), context.run(agent_b()))
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        """
+        Args:
+            timeout: Seconds the whole request may take, no deadline if None
+        """
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self._results: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._prefetched: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        # Tool result tokens kept from the model by projection and budgets
+        self.tokens_saved = 0
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left until the deadline, None without one"""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    async def run(self, awaitable: Awaitable[T]) -> T:
+        """Await inside this context, so everything it calls can find it through current()"""
+        token = _current.set(self)
+        try:
+            return await awaitable
+        finally:
+            _current.reset(token)
+
+    async def run_stream(self, chunks: AsyncIterator[T]) -> AsyncGenerator[T, None]:
+        """
+        Iterate chunks inside this context. The iteration runs in a task of its own, so the context never leaks
+        into the caller between chunks; closing this generator cancels it.
+
+        Raises:
+            asyncio.TimeoutError: If the deadline passes before the last chunk
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def pump() -> None:
+            try:
+                async for chunk in chunks:
+                    await queue.put((False, chunk))
+            except Exception as e:
+                await queue.put((True, e))
+                return
+            await queue.put((True, None))
+
+        task = asyncio.create_task(self.run(pump()))
+        try:
+            while True:
+                finished, item = await asyncio.wait_for(queue.get(), timeout=self.remaining())
+                if finished:
+                    if item is not None:
+                        raise item
+                    return
+                yield item
+        finally:
+            task.cancel()
+            # Let the stream clean up, closing its connection and freeing its Gemini slot, before returning
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def memoize(self, tool: str, args: Dict[str, Any], call: Callable[[], Awaitable[T]]) -> T:
+        """Return the result of call(), running it at most once per (tool, args) in this request"""
+        key = self._key(tool, args)
+        task = self._results.get(key)
+        if task is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(call())
+            self._results[key] = task
+            task.add_done_callback(lambda t: self._forget_failure(key, t))
+        # Shielded so one caller timing out does not cancel the call for the others
+        return await asyncio.shield(task)
+
+    def prefetch(self, tool: str, args: Dict[str, Any], call: Callable[[], Awaitable[Any]]) -> None:
+        """Start call() in the background and seed the memo with it, before any agent asks for it"""
+        key = self._key(tool, args)
+        if key in self._results:
+            return
+        task = asyncio.ensure_future(call())
+        self._results[key] = task
+        self._prefetched[key] = args
+        task.add_done_callback(lambda t: self._forget_failure(key, t))
+
+    async def prefetched(self, tools: Iterable[str]) -> List[Tuple[str, Dict[str, Any], Any]]:
+        """
+        Results of the prefetches of these tools, waiting for the ones still running.
+
+        Returns:
+            (tool, args, result) of each successful prefetch
+        """
+        tools = set(tools)
+        keys = [key for key in self._prefetched if key[0] in tools and key in self._results]
+        results = await asyncio.gather(*(asyncio.shield(self._results[key]) for key in keys), return_exceptions=True)
+        return [
+            (key[0], self._prefetched[key], result)
+            for key, result in zip(keys, results)
+            if not isinstance(result, BaseException)
+        ]
+
+    def cancel_prefetches(self, keep: Callable[[str, Dict[str, Any]], bool] = lambda tool, args: False) -> int:
+        """
+        Cancel the prefetches nothing is going to use.
+
+        Args:
+            keep: Whether the prefetch of a tool with these args is still needed
+
+        Returns:
+            The number of prefetches cancelled
+        """
+        cancelled = 0
+        for key, args in list(self._prefetched.items()):
+            if keep(key[0], args):
+                continue
+            del self._prefetched[key]
+            task = self._results.pop(key, None)
+            if task is not None and not task.done():
+                task.cancel()
+                cancelled += 1
+        return cancelled
+
+    def close(self) -> int:
+        """
+        Cancel the tool calls and prefetches still running. Callers await them shielded, so they would otherwise
+        outlive the request, e.g. after the client disconnected or the deadline passed.
+
+        Returns:
+            The number of calls cancelled
+        """
+        self._prefetched.clear()
+        cancelled = 0
+        for task in list(self._results.values()):
+            if not task.done():
+                task.cancel()
+                cancelled += 1
+        if cancelled:
+            metrics.counter("request_context.cancelled_calls").inc(cancelled)
+        return cancelled
+
+    @staticmethod
+    def _key(tool: str, args: Dict[str, Any]) -> Tuple[str, str]:
+        return tool, json.dumps(args, sort_keys=True, default=str)
+
+    def _forget_failure(self, key: Tuple[str, str], task: asyncio.Task) -> None:
+        # Failures are not memoized, a later call may succeed
+        if (task.cancelled() or task.exception() is not None) and self._results.get(key) is task:
+            self._results.pop(key, None)
+
+
+def current() -> Optional[RequestContext]:
+    """The context of the request being handled, if any"""
+    return _current.get()
+
+
+def time_left(limit: Optional[float] = None) -> Optional[float]:
+    """Seconds left for the current request, at most limit; just limit outside of a request or without deadline"""
+    context = current()
+    remaining = context.remaining() if context else None
+    if remaining is None:
+        return limit
+    return remaining if limit is None else min(limit, remaining)
+
+
+async def memoized(tool: str, args: Dict[str, Any], call: Callable[[], Awaitable[T]]) -> T:
+    """Memoize call() in the current request context, or just run it outside of one"""
+    context = current()
+    if context is None:
+        return await call()
+    return await context.memoize(tool, args, call)
+
+
+async def prefetched(tools: Iterable[str]) -> List[Tuple[str, Dict[str, Any], Any]]:
+    """Prefetched results of these tools in the current request context, none outside of one"""
+    context = current()
+    if context is None:
+        return []
+    return await context.prefetched(tools)
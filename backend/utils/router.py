@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Set
+
+from models.chatrequest import ChatRequest
+from models.routing import RoutingDecision
+from utils.tickers import TickerUniverse
+
+# Phrases that send a message to an agent, matched on word boundaries of the lowercased message
+LEXICON: Dict[str, List[str]] = {
+    'fundamentals': [
+        "p/e", "pe ratio", "price to earnings", "market cap", "eps", "earnings per share", "revenue", "dividend",
+        "valuation", "fundamentals", "52 week", "52-week", "volume", "price", "trading at", "rsi", "macd",
+        "moving average", "technicals", "technical indicators", "beta",
+    ],
+    'sentiment': [
+        "sentiment", "news", "headlines", "what are people saying", "market mood", "how do investors feel",
+    ],
+    'trading': [
+        "should i buy", "should i sell", "should i hold", "buy or sell", "trading strategy", "strategy",
+        "entry point", "exit point", "buy the dip", "take profit", "stop loss", "trade",
+    ],
+    'search': [
+        "stocks to buy", "good stocks", "best stocks", "recommend stocks", "recommend some stocks",
+        "stock recommendations", "stock picks", "what should i invest in", "which stocks",
+    ],
+}
+
+GREETINGS: Set[str] = {
+    "hi", "hello", "hey", "thanks", "thank you", "thx", "good morning", "good evening", "bye", "goodbye",
+}
+
+# Well-known company names, so "how is apple doing" needs no cashtag
+COMPANY_TICKERS: Dict[str, str] = {
+    "apple": "AAPL", "microsoft": "MSFT", "nvidia": "NVDA", "tesla": "TSLA", "amazon": "AMZN",
+    "google": "GOOGL", "alphabet": "GOOGL", "meta": "META", "facebook": "META", "netflix": "NFLX",
+    "amd": "AMD", "intel": "INTC", "palantir": "PLTR", "berkshire": "BRK-B",
+}
+
+_CASHTAG = re.compile(r"\$([A-Za-z]{1,5}(?:[.-][A-Za-z])?)\b")
+_PATTERNS: Dict[str, re.Pattern] = {
+    agent: re.compile(r"(?<![\w/])(?:" + "|".join(re.escape(phrase) for phrase in phrases) + r")(?![\w/])")
+    for agent, phrases in LEXICON.items()
+}
+
+
+class LocalRouter:
+    """
+    Rule and lexicon based router that decides obvious chat messages without a Gemini round trip.
+
+    A message is routed locally only when it matches a single agent's lexicon (or is a bare greeting) and, for
+    agents analyzing a ticker, exactly one ticker is known. Anything else returns None, and the supervisor falls
+    back to the LLM router.
+    """
+
+    def __init__(self, max_words: int = 30, universe: Optional[TickerUniverse] = None):
+        """
+        Args:
+            max_words: Longer messages are left to the LLM router
+            universe: Known ticker symbols, the bundled list by default
+        """
+        self.max_words = max_words
+        self.universe = universe or TickerUniverse.default()
+
+    def route(self, request: ChatRequest) -> Optional[RoutingDecision]:
+        """
+        Route the request if the decision is clear.
+
+        Args:
+            request: The chat request containing message and history
+
+        Returns:
+            The routing decision, or None when unsure
+        """
+        message = request.message.strip()
+        if not message or len(message.split()) > self.max_words:
+            return None
+
+        text = message.lower()
+        if text.strip(" !.?") in GREETINGS:
+            return RoutingDecision(agents=[], ticker=request.ticker, question=message)
+
+        agents = [agent for agent, pattern in _PATTERNS.items() if pattern.search(text)]
+        # "what stocks should I buy" is a search, not a trade of some ticker
+        if 'search' in agents and 'trading' in agents:
+            agents.remove('trading')
+        if len(agents) != 1:
+            return None
+
+        tickers = extract_tickers(message, self.universe)
+        if agents == ['search']:
+            return None if tickers else RoutingDecision(agents=agents, ticker=None, question=message)
+
+        if len(tickers) > 1:
+            return None
+        ticker = tickers[0] if tickers else request.ticker
+        if not ticker:
+            return None
+        return RoutingDecision(agents=agents, ticker=ticker.upper(), question=message)
+
+
+def extract_tickers(message: str, universe: Optional[TickerUniverse] = None) -> List[str]:
+    """
+    Tickers mentioned in a message: any cashtag, known symbols written in upper case except the stoplisted ones,
+    and well-known company names.
+
+    Args:
+        message: The user's message
+        universe: Known ticker symbols, the bundled list by default
+    """
+    universe = universe or TickerUniverse.default()
+    # A cashtag is explicit enough even for a symbol missing from the bundled list
+    tickers = [TickerUniverse.canonical(symbol) for symbol in _CASHTAG.findall(message)]
+    tickers.extend(universe.find(message))
+    for word in re.findall(r"[a-z]+", message.lower()):
+        if word in COMPANY_TICKERS:
+            tickers.append(COMPANY_TICKERS[word])
+    return list(dict.fromkeys(tickers))
+
+
+async def log_decision(request: ChatRequest, decision: RoutingDecision, source: str, latency_ms: float) -> None:
+    """
+    Append a routing decision to the JSONL file at ROUTING_LOG_PATH, if set, for benchmarks/eval_router.py.
+    The file is written from a worker thread, never from the event loop.
+
+    Args:
+        request: The routed chat request
+        decision: The decision taken
+        source: Which router decided, "local" or "llm"
+        latency_ms: Time taken to decide
+    """
+    path = os.getenv("ROUTING_LOG_PATH")
+    if not path:
+        return
+    record: Dict[str, Any] = {
+        "message": request.message,
+        "ticker": request.ticker,
+        "source": source,
+        "decision": decision.model_dump(),
+        "latency_ms": round(latency_ms, 3),
+    }
+    await asyncio.to_thread(_append_line, path, json.dumps(record))
+
+
+def _append_line(path: str, line: str) -> None:
+    with open(path, "a") as f:
+        f.write(line + "\n")
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+from typing import Callable, Dict, Optional
+
+from models.session import ChatSession
+from rds import RedisHandler
+from utils.llm import LLM
+from utils.tokens import estimate_tokens
+
+
+class SessionStore:
+    """
+    Server-side chat sessions in Redis, so clients send only their new message.
+
+    Each session keeps its most recent turns verbatim and a rolling summary of the older ones. Once the turns
+    exceed max_tokens, the oldest ones are folded into the summary by the LLM, so the conversation passed to
+    routing and chat prompts stays bounded however long the session runs.
+
+    Every write is a read-modify-write in a WATCH/MULTI transaction, retried when the session changed in the
+    meantime, so concurrent turns and compactions of one session never overwrite each other.
+    """
+
+    def __init__(
+            self,
+            rds: RedisHandler,
+            llm: LLM,
+            max_tokens: int = 1500,
+            keep_turns: int = 4,
+            ttl: int = 24 * 60 * 60,
+            prefix: str = "session:",
+    ):
+        """
+        Args:
+            rds: Redis handler storing the sessions
+            llm: LLM folding old turns into the summary
+            max_tokens: Estimated tokens of verbatim turns that trigger compaction
+            keep_turns: Most recent turns never folded into the summary
+            ttl: Seconds a session lives after its last turn
+            prefix: Prefix of the Redis keys
+        """
+        self.rds = rds
+        self.llm = llm
+        self.max_tokens = max_tokens
+        self.keep_turns = keep_turns
+        self.ttl = ttl
+        self.prefix = prefix
+        # Compactions in progress by session id, also keeping their tasks referenced until done
+        self._compacting: Dict[str, asyncio.Task] = {}
+        self.logger = logging.getLogger(__name__)
+
+    async def load(self, session_id: str) -> ChatSession:
+        """The session, or a new empty one"""
+        # The Redis client is synchronous, keep it off the event loop
+        data = await asyncio.to_thread(self.rds.get, self.prefix + session_id)
+        return ChatSession.model_validate(data) if data else ChatSession()
+
+    @staticmethod
+    def conversation(session: ChatSession, message: str) -> str:
+        """The session and the new message as a prompt"""
+        summary = f"Summary of the earlier conversation: {session.summary}\n" if session.summary else ""
+        turns = "".join(f"{turn['role']}: {turn['content']}\n" for turn in session.turns)
+        return f"{summary}{turns}user: {message}"
+
+    async def append(self, session_id: str, message: str, response: str) -> None:
+        """
+        Record a turn at the end of the session as currently stored. When the session grew past the token budget,
+        it is compacted in the background so the response is not held up.
+
+        Args:
+            session_id: Key of the session
+            message: The user's message
+            response: The assistant's response
+        """
+        def add_turn(session: ChatSession) -> ChatSession:
+            session.turns.append({"role": "user", "content": message})
+            session.turns.append({"role": "assistant", "content": response})
+            return session
+
+        session = await asyncio.to_thread(self._update, session_id, add_turn)
+
+        over_budget = estimate_tokens(session.turns) > self.max_tokens and len(session.turns) > self.keep_turns
+        if over_budget and session_id not in self._compacting:
+            task = asyncio.create_task(self._compact(session_id, session))
+            self._compacting[session_id] = task
+            task.add_done_callback(lambda _: self._compacting.pop(session_id, None))
+
+    async def _compact(self, session_id: str, session: ChatSession) -> None:
+        """Fold all but the most recent turns into the rolling summary"""
+        old_turns = session.turns[:-self.keep_turns]
+        transcript = "".join(f"{turn['role']}: {turn['content']}\n" for turn in old_turns)
+        try:
+            summary = await self.llm.generate(
+                system=(
+                    "You maintain a running summary of a conversation between a user and a stock market "
+                    "assistant. Keep tickers, figures, user preferences and open questions. Reply with the "
+                    "summary only, in at most 150 words."
+                ),
+                prompt=f"Current summary:\n{session.summary or '(none)'}\n\nNew turns to fold in:\n{transcript}",
+                call_site="session_summary",
+            )
+        except Exception as e:
+            # Kept verbatim, compaction is retried after the next turn
+            self.logger.warning(f"Failed to compact session {session_id}: {e}")
+            return
+
+        def fold(current: ChatSession) -> Optional[ChatSession]:
+            # Turns may have been added while summarizing, only fold the ones summarized
+            if current.summary != session.summary or current.turns[:len(old_turns)] != old_turns:
+                return None
+            current.summary = summary.strip()
+            current.turns = current.turns[len(old_turns):]
+            return current
+
+        await asyncio.to_thread(self._update, session_id, fold)
+
+    def _update(
+            self,
+            session_id: str,
+            change: Callable[[ChatSession], Optional[ChatSession]],
+    ) -> Optional[ChatSession]:
+        """
+        Apply change to the stored session and save the result atomically, retrying when the session is written
+        by someone else in between. Blocking, run it in a thread.
+
+        Args:
+            session_id: Key of the session
+            change: Returns the updated session, or None to leave it as it is
+
+        Returns:
+            The saved session, or None if change left it as it is
+        """
+        key = self.prefix + session_id
+
+        def transaction(pipe) -> Optional[ChatSession]:
+            data = pipe.get(key)
+            updated = change(ChatSession.model_validate_json(data) if data else ChatSession())
+            if updated is not None:
+                pipe.multi()
+                pipe.set(key, updated.model_dump_json(), ex=self.ttl)
+            return updated
+
+        return self.rds.redis.transaction(transaction, key, value_from_callable=True)
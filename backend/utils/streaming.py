@@ -0,0 +1,59 @@
+import asyncio
+from typing import AsyncGenerator, AsyncIterator, Optional, TypeVar, TYPE_CHECKING
+
+from utils import metrics
+
+if TYPE_CHECKING:
+    from starlette.requests import Request
+
+T = TypeVar('T')
+
+
+async def cancel_on_disconnect(
+        request: "Request",
+        chunks: AsyncGenerator[T, None],
+        poll_interval: float = 0.5,
+) -> AsyncGenerator[T, None]:
+    """
+    Yield chunks until the client disconnects, then cancel the work producing them.
+
+    The producer is cancelled at whatever it is awaiting, even between chunks, so agent tasks and upstream
+    streams behind it are torn down as soon as the disconnect is seen rather than running to completion.
+
+    Args:
+        request: The HTTP request whose connection is watched
+        chunks: The response stream
+        poll_interval: Seconds between checks of the connection
+    """
+    watcher = asyncio.create_task(_wait_for_disconnect(request, poll_interval))
+    next_chunk: Optional[asyncio.Future] = None
+    try:
+        while True:
+            next_chunk = asyncio.ensure_future(chunks.__anext__())
+            await asyncio.wait({next_chunk, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_chunk.done():
+                metrics.counter("chat.disconnects").inc()
+                return
+            try:
+                chunk = next_chunk.result()
+            except StopAsyncIteration:
+                return
+            yield chunk
+    finally:
+        watcher.cancel()
+        if next_chunk is not None and not next_chunk.done():
+            next_chunk.cancel()
+            await asyncio.gather(next_chunk, return_exceptions=True)
+        await chunks.aclose()
+
+
+async def close_stream(stream: AsyncIterator) -> None:
+    """Close an upstream stream early, releasing its connection"""
+    aclose = getattr(stream, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+async def _wait_for_disconnect(request: "Request", poll_interval: float) -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(poll_interval)
@@ -0,0 +1,264 @@
+import re
+import time
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import httpx
+
+from utils import metrics
+
+TICKERS_PATH = Path(__file__).resolve().parent.parent / "data" / "tickers.txt"
+
+# Real symbols that are far more often ordinary words or jargon in upper-case text: AI (C3.ai), IT (Gartner),
+# ON (ON Semiconductor), NOW (ServiceNow)... They are only taken from a cashtag, e.g. $AI.
+STOPLIST: Set[str] = {
+    "A", "AI", "ALL", "ARE", "C", "CAT", "D", "F", "FAST", "GO", "HAS", "IT", "J", "K", "KEY", "L", "LOW",
+    "NOW", "O", "ON", "ONE", "SO", "T", "U", "V", "W",
+}
+
+# Letters after a dot that are share classes (BRK.B) rather than exchange suffixes (BP.L, SHOP.TO)
+SHARE_CLASSES: Set[str] = {"A", "B", "C"}
+
+_SYMBOL = re.compile(r"^\^?[A-Z0-9]{1,10}(?:-[A-Z0-9]{1,4})?(?:\.[A-Z]{1,3})?(?:=[A-Z])?$")
+_CANDIDATE = re.compile(r"(?<![\w$])(\$?)([A-Za-z]{1,5}(?:[.-][A-Za-z])?)(?![\w-])")
+
+
+class TickerUniverse:
+    """
+    In-memory index of the known ticker symbols, loaded once from the bundled list at data/tickers.txt.
+
+    Validates the upper-case words of free text against the index, so words like CEO or EPS are never taken
+    for symbols, and ranks the symbols found by how often they are mentioned.
+
+    Usage:
+        universe = TickerUniverse.default()
+        symbols = universe.rank(text, limit=5)
+    """
+
+    def __init__(self, symbols: Iterable[str], stoplist: Set[str] = STOPLIST):
+        """
+        Args:
+            symbols: Known ticker symbols
+            stoplist: Known symbols only accepted as cashtags
+        """
+        self.symbols = frozenset(self.canonical(symbol) for symbol in symbols)
+        self.stoplist = frozenset(stoplist)
+
+    @classmethod
+    def load(cls, path: Path = TICKERS_PATH) -> "TickerUniverse":
+        """Read one symbol per line, skipping blank lines and # comments"""
+        with open(path) as f:
+            return cls(line.strip() for line in f if line.strip() and not line.startswith("#"))
+
+    @classmethod
+    @lru_cache(maxsize=1)
+    def default(cls) -> "TickerUniverse":
+        """The universe of the bundled symbol list, loaded on first use"""
+        return cls.load()
+
+    def __contains__(self, symbol: str) -> bool:
+        return self.canonical(symbol) in self.symbols
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def find(self, text: str) -> List[str]:
+        """Every known symbol mentioned in the text, in order and with repeats"""
+        # In shouted text every short word would look like a symbol, only cashtags count
+        shouted = text.isupper()
+        found = []
+        for cashtag, word in _CANDIDATE.findall(text):
+            if not cashtag and (shouted or not word.isupper()):
+                continue
+            symbol = self.canonical(word)
+            if symbol in self.symbols and (cashtag or symbol not in self.stoplist):
+                found.append(symbol)
+        return found
+
+    def rank(self, texts: Iterable[str], limit: Optional[int] = None) -> List[str]:
+        """
+        Distinct known symbols mentioned in the texts, most mentioned first.
+
+        Args:
+            texts: Texts to extract symbols from
+            limit: Maximum number of symbols returned, all of them if None
+
+        Returns:
+            The symbols, ties in order of first mention
+        """
+        counts = Counter(symbol for text in texts for symbol in self.find(text))
+        return [symbol for symbol, _ in counts.most_common(limit)]
+
+    @staticmethod
+    def canonical(symbol: str) -> str:
+        """Upper-case symbol with share classes written with a dash, as the finance-query API expects"""
+        symbol = symbol.strip().lstrip("$").upper().replace("/", ".")
+        base, dot, suffix = symbol.rpartition(".")
+        if dot and suffix in SHARE_CLASSES:
+            return f"{base}-{suffix}"
+        return symbol
+
+
+class InvalidTickerError(ValueError):
+    """Raised for a ticker that is malformed or unknown to the finance data sources"""
+    pass
+
+
+def normalize_ticker(symbol: str) -> str:
+    """
+    Canonical form of a ticker symbol: upper case, without a cashtag, share classes with a dash (BRK.B and BRK/B
+    become BRK-B) and exchange suffixes kept (SHOP.TO).
+
+    Raises:
+        InvalidTickerError: If the symbol cannot be a ticker
+    """
+    ticker = TickerUniverse.canonical(symbol)
+    if not _SYMBOL.match(ticker):
+        raise InvalidTickerError(f"Invalid ticker symbol: {symbol!r}")
+    return ticker
+
+
+class Popularity:
+    """
+    Request counts per ticker that decay exponentially with time, so the top tickers follow what is asked
+    about now rather than what was popular yesterday.
+    """
+
+    def __init__(self, half_life: float = 60 * 60, max_entries: int = 1024):
+        """
+        Args:
+            half_life: Seconds for a request to count half as much
+            max_entries: Maximum number of tracked tickers, the least popular are dropped beyond it
+        """
+        self.half_life = half_life
+        self.max_entries = max_entries
+        self._scores: Dict[str, Tuple[float, float]] = {}
+
+    def record(self, ticker: str, weight: float = 1.0) -> None:
+        """Count a request for a ticker"""
+        now = time.monotonic()
+        self._scores[ticker] = (self._score(ticker, now) + weight, now)
+        if len(self._scores) > self.max_entries:
+            for dropped in sorted(self._scores, key=lambda t: self._score(t, now))[:self.max_entries // 10 + 1]:
+                del self._scores[dropped]
+
+    def top(self, n: int) -> List[str]:
+        """The n most requested tickers, most requested first"""
+        now = time.monotonic()
+        return sorted(self._scores, key=lambda t: self._score(t, now), reverse=True)[:n]
+
+    def _score(self, ticker: str, now: float) -> float:
+        score, updated = self._scores.get(ticker, (0.0, now))
+        return score * 0.5 ** ((now - updated) / self.half_life)
+
+
+class TickerValidator:
+    """
+    Validates tickers before any expensive work is done for them.
+
+    Malformed symbols are rejected outright and symbols of the local universe are accepted outright. Others are
+    looked up once with a quote request: symbols without a quote are cached negatively, so repeated requests for
+    them are rejected without any I/O, and symbols with one are cached positively. Lookups that fail for another
+    reason let the symbol through uncached.
+
+    Usage:
+        tickers = TickerValidator(finance.get_quotes)
+        ticker = await tickers.validate("brk.b")  # "BRK-B"
+    """
+
+    def __init__(
+            self,
+            lookup: Callable[[str], Awaitable[Dict]],
+            universe: Optional[TickerUniverse] = None,
+            popularity: Optional[Popularity] = None,
+            negative_ttl: int = 60 * 60,
+            positive_ttl: int = 24 * 60 * 60,
+            max_entries: int = 4096,
+    ):
+        """
+        Args:
+            lookup: Fetches the quotes of a symbol, as FinanceQuery.get_quotes
+            universe: Symbols known to be valid, the bundled list by default
+            popularity: Counts the requests for each valid ticker, for the cache warmer
+            negative_ttl: Seconds an unknown symbol stays rejected
+            positive_ttl: Seconds a looked up symbol stays accepted
+            max_entries: Maximum number of cached symbols, of each kind
+        """
+        self.lookup = lookup
+        self.universe = universe or TickerUniverse.default()
+        self.popularity = popularity
+        self.negative_ttl = negative_ttl
+        self.positive_ttl = positive_ttl
+        self.max_entries = max_entries
+        self._unknown: Dict[str, float] = {}
+        self._known: Dict[str, float] = {}
+        metrics.gauge("tickers", self.stats)
+
+    async def validate(self, symbol: str, track: bool = True) -> str:
+        """
+        Normalize a ticker and check that it exists.
+
+        Args:
+            symbol: The ticker as given by the user
+            track: Count the request towards the ticker's popularity; off for internal checks
+
+        Returns:
+            The normalized ticker
+
+        Raises:
+            InvalidTickerError: If the ticker is malformed or has no quote
+        """
+        ticker = await self._validate(symbol)
+        if track and self.popularity is not None:
+            self.popularity.record(ticker)
+        return ticker
+
+    def stats(self) -> Dict[str, int]:
+        return {"universe": len(self.universe), "known": len(self._known), "unknown": len(self._unknown)}
+
+    async def _validate(self, symbol: str) -> str:
+        ticker = normalize_ticker(symbol)
+        if ticker in self.universe or self._fresh(self._known, ticker):
+            return ticker
+        if self._fresh(self._unknown, ticker):
+            metrics.counter("tickers.rejected_cached").inc()
+            raise InvalidTickerError(f"Unknown ticker symbol: {ticker}")
+
+        try:
+            data = await self.lookup(ticker)
+            exists = bool(data.get("quotes"))
+        except LookupError:
+            exists = False
+        except httpx.HTTPStatusError as e:
+            if not 400 <= e.response.status_code < 500:
+                return ticker
+            exists = False
+        except (httpx.HTTPError, TimeoutError):
+            # The data source is unhealthy, not the ticker
+            return ticker
+
+        if not exists:
+            self._remember(self._unknown, ticker, self.negative_ttl)
+            metrics.counter("tickers.rejected").inc()
+            raise InvalidTickerError(f"Unknown ticker symbol: {ticker}")
+        self._remember(self._known, ticker, self.positive_ttl)
+        return ticker
+
+    @staticmethod
+    def _fresh(entries: Dict[str, float], ticker: str) -> bool:
+        expires = entries.get(ticker)
+        if expires is None:
+            return False
+        if expires > time.monotonic():
+            return True
+        del entries[ticker]
+        return False
+
+    def _remember(self, entries: Dict[str, float], ticker: str, ttl: int) -> None:
+        if len(entries) >= self.max_entries:
+            # Dicts keep insertion order, drop the oldest tenth
+            for key in list(entries)[:self.max_entries // 10 + 1]:
+                del entries[key]
+        entries[ticker] = time.monotonic() + ttl
@@ -0,0 +1,19 @@
+import json
+from typing import Any
+
+# Gemini averages about four characters of English text per token
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(value: Any) -> int:
+    """
+    Rough token count of a prompt fragment, without a tokenizer round trip.
+
+    Args:
+        value: Text, or any JSON serializable value counted by its JSON form
+
+    Returns:
+        The estimated number of tokens
+    """
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Awaitable, Callable, List, Optional
+
+from models.historical import Period
+from utils import metrics
+from utils.llm import GEMINI_LIMITER
+from utils.tickers import Popularity
+
+if TYPE_CHECKING:
+    from agents.sentiment_agent import SentimentAgent
+    from finance_query import FinanceQuery
+    from price_history import PriceHistory
+
+
+def under_load() -> bool:
+    """Whether user requests or Gemini calls are queueing, the signal for background work to back off"""
+    admission = metrics.read("admission") or {}
+    return admission.get("queued", 0) > 0 or GEMINI_LIMITER.queued > 0
+
+
+class CacheWarmer:
+    """
+    Background refresh of the cached data of the most requested tickers, so the first user asking about a
+    trending ticker does not pay for cold caches.
+
+    Every interval seconds, the top_n tickers by decayed request count get their quotes, technicals, news, price
+    windows and sentiment refreshed. Cached entries are refreshed ahead of expiry, once they would not outlive
+    the next two cycles, and served as they are otherwise, so each entry is fetched about once per TTL. The
+    interval defaults to the shortest TTL of the warmed caches, so even quotes never go cold. At most
+    max_concurrency tickers are refreshed at once, to stay well within upstream rate limits, sentiment is scored
+    at the lowest Gemini priority, and the warmer pauses while the app is under load or when paused explicitly.
+
+    Usage:
+        warmer = CacheWarmer(popularity, finance, prices, sentiment)
+        warmer.start()
+        ...
+        await warmer.stop()
+    """
+
+    def __init__(
+            self,
+            popularity: Popularity,
+            finance: "FinanceQuery",
+            prices: "PriceHistory",
+            sentiment: "SentimentAgent",
+            interval: Optional[float] = None,
+            top_n: int = 10,
+            max_concurrency: int = 2,
+            busy: Callable[[], bool] = under_load,
+    ):
+        """
+        Args:
+            popularity: Request counts per ticker
+            finance: finance-query client whose quotes, technicals and news are refreshed
+            prices: Price history whose chart windows are refreshed
+            sentiment: Agent whose cached sentiment scores are refreshed
+            interval: Seconds between refresh cycles, the shortest TTL of the warmed caches by default
+            top_n: Number of most requested tickers refreshed per cycle
+            max_concurrency: Tickers refreshed at once
+            busy: Whether the app is under load, checked before each ticker
+        """
+        self.popularity = popularity
+        self.finance = finance
+        self.prices = prices
+        self.sentiment = sentiment
+        if interval is None:
+            ttls = [finance.ttls.get(endpoint, 0) for endpoint in ("quotes", "indicators", "news")]
+            interval = min(ttl for ttl in [*ttls, *prices.ttls.values()] if ttl > 0)
+        self.interval = interval
+        # Entries that would expire before the cycle after next are refreshed now
+        self.lead = 2 * self.interval
+        self.top_n = top_n
+        self.busy = busy
+        self.paused = False
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._task: Optional[asyncio.Task] = None
+        self.logger = logging.getLogger(__name__)
+
+    def start(self) -> None:
+        """Start refreshing in the background"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop refreshing, cancelling the cycle in progress"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def pause(self) -> None:
+        self.paused = True
+
+    def resume(self) -> None:
+        self.paused = False
+
+    async def refresh(self) -> List[str]:
+        """
+        Run one refresh cycle.
+
+        Returns:
+            The tickers refreshed, fewer than the top ones when the warmer paused midway
+        """
+        tickers = self.popularity.top(self.top_n)
+        if not tickers or self._should_wait():
+            return []
+
+        # One batched request for every quote
+        await self._step("quotes", self.finance.get_quotes(",".join(tickers), min_ttl=self.lead))
+        results = await asyncio.gather(*(self._refresh_ticker(ticker) for ticker in tickers))
+        return [ticker for ticker, refreshed in zip(tickers, results) if refreshed]
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.logger.warning(f"Cache warmer cycle failed: {e}")
+
+    async def _refresh_ticker(self, ticker: str) -> bool:
+        async with self._semaphore:
+            if self._should_wait():
+                return False
+            await self._step("technicals", self.finance.get_technicals(ticker, min_ttl=self.lead))
+            await self._step("news", self.finance.get_news(ticker, min_ttl=self.lead))
+            for period in Period:
+                await self._step("prices", self.prices.get(ticker, period, min_ttl=self.lead))
+            # Only scores again when the headlines changed, but that is a Gemini call: yield to user traffic
+            if self._should_wait():
+                return False
+            await self._step("sentiment", self.sentiment.score(ticker, call_site="warmer"))
+            metrics.counter("warmer.tickers").inc()
+            return True
+
+    def _should_wait(self) -> bool:
+        if self.paused or self.busy():
+            metrics.counter("warmer.paused").inc()
+            return True
+        return False
+
+    async def _step(self, name: str, refresh: Awaitable) -> None:
+        try:
+            await refresh
+        except Exception as e:
+            metrics.counter(f"warmer.{name}.errors").inc()
+            self.logger.warning(f"Cache warmer could not refresh {name}: {e}")